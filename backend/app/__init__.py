@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The common package at the repository root is shared with the OPC UA server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
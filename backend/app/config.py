@@ -5,6 +5,33 @@ class Settings(BaseSettings):
     PORT: int = 8000
     OPCUA_URL: str = "opc.tcp://localhost:4841"
     NAMESPACE_URI: str = "http://example.com/opcua/server"
+    OPCUA_POOL_SIZE: int = 2
+    OPCUA_RECONNECT_MIN_DELAY: float = 1.0
+    OPCUA_RECONNECT_MAX_DELAY: float = 30.0
+    OPCUA_WATCHDOG_INTERVAL: float = 5.0
+    OPCUA_SERVER_NAME: str = "local"  # Name of OPCUA_URL in the fleet API
+    OPCUA_SERVERS: dict[str, str] = {}  # Further fleet servers, name -> endpoint URL
+    FLEET_POOL_SIZE: int = 1  # Sessions per OPCUA_SERVERS entry
+    FLEET_MAX_CONCURRENCY: int = 4  # Fleet requests in flight per server
+    FLEET_REQUEST_TIMEOUT: float = 5.0
+    WS_PUBLISHING_INTERVAL: int = 500
+    WS_CLIENT_QUEUE_SIZE: int = 100
+    WS_SLOW_CLIENT_TIMEOUT: float = 10.0
+    SUBSCRIPTION_SETTINGS_FILE: str = "subscription_settings.json"
+    LONG_POLL_MAX_WAIT: float = 60.0  # Longest ?wait= of GET /api/data?since=
+    HISTORY_DEFAULT_BUCKETS: int = 500
+    HISTORY_MAX_BUCKETS: int = 10000
+    HISTORY_TAGS_PER_READ: int = 10
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: dict[str, str] = {"asyncua": "WARNING"}  # Per-subsystem overrides by logger name prefix
+    LOG_DIR: str = "../logs"
+    LOG_FILE: str = "backend.log"
+    LOG_MAX_BYTES: int = 5 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 3
+    LOG_CONSOLE: bool = True
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_SAMPLE_LIMIT: int = 20  # Records per message template and interval; 0 disables sampling
+    LOG_SAMPLE_INTERVAL: float = 10.0
 
     class Config:
         env_file = ".env"
@@ -2,12 +2,15 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.config import router as config_router
 from app.routes.data import router as data_router
+from app.routes.fleet import router as fleet_router
+from app.routes.metrics import router as metrics_router
 from app.routes.websocket import router as websocket_router
-from app.utils.opcua_client import OPCUAClient
+from app.utils.connection_manager import opcua_lifespan
 from app.utils.logger import get_logger
 from app.config import settings
 
-app = FastAPI(title="OPCUA Backend API")
+# The lifespan owns the shared OPC UA connection pool (app.state.opcua)
+app = FastAPI(title="OPCUA Backend API", lifespan=opcua_lifespan)
 logger = get_logger(__name__)
 
 # Add CORS middleware
@@ -19,43 +22,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize OPCUA client
-opcua_client = OPCUAClient(settings.OPCUA_URL, settings.NAMESPACE_URI)
-
 # Include routers
 app.include_router(data_router, prefix="/api/data", tags=["data"])
 app.include_router(config_router, prefix="/api/config", tags=["config"])
+app.include_router(fleet_router, prefix="/api/fleet", tags=["fleet"])
 app.include_router(websocket_router)
-
-@app.on_event("startup")
-async def startup_event():
-    try:
-        await opcua_client.connect()
-        logger.info("Successfully connected to OPCUA server")
-    except Exception as e:
-        logger.error(f"Failed to connect to OPCUA server: {e}")
-        # Don't raise here, let the application start even if OPCUA server is not available
-        # Individual routes will handle connection errors
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    try:
-        await opcua_client.disconnect()
-        logger.info("Successfully disconnected from OPCUA server")
-    except Exception as e:
-        logger.error(f"Error during shutdown: {e}")
+app.include_router(metrics_router)
 
 @app.get("/")
 async def root():
     try:
-        connected = opcua_client.client.uaclient._uasocket is not None and opcua_client.client.uaclient._uasocket.connected
+        manager = app.state.opcua
         return {
             "status": "healthy",
-            "opcua_connected": connected,
-            "message": "OPCUA Backend Server"
+            "opcua_connected": manager.connected,
+            "message": "OPCUA Backend Server",
+            "pool": manager.stats(),
+            "hub": app.state.hub.stats()
         }
     except Exception as e:
-        logger.error(f"Health check failed: {e}")
+        logger.error("Health check failed: %s", e)
         return {
             "status": "unhealthy",
             "opcua_connected": False,
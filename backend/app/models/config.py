@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Literal, Optional
 
 class VariableConfig(BaseModel):
     name: str
@@ -22,4 +22,17 @@ class NamespaceConfig(BaseModel):
 
     class Config:
         allow_population_by_field_name = True
-        arbitrary_types_allowed = True
\ No newline at end of file
+        arbitrary_types_allowed = True
+
+class SubscriptionSettings(BaseModel):
+    """Monitored item parameters applied to a tag's data change subscription."""
+    sampling_interval: float = 0.0
+    deadband_type: Literal["none", "absolute", "percent"] = "none"
+    deadband_value: float = 0.0
+    queue_size: int = 0
+    discard_oldest: bool = True
+
+class SubscriptionConfig(BaseModel):
+    publishing_interval: Optional[int] = None
+    default: Optional[SubscriptionSettings] = None
+    tags: Dict[str, SubscriptionSettings] = {}
@@ -1,13 +1,58 @@
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from datetime import datetime
 
 class DataUpdate(BaseModel):
     variable: str
     value: Any
 
+class NodeStatus(BaseModel):
+    status_code: str
+    source_timestamp: Optional[datetime] = None
+    server_timestamp: Optional[datetime] = None
+    age: Optional[float] = None  # Seconds since a cached value was received; 0 while the cache is live
+
 class DataResponse(BaseModel):
     status: str
     data: Dict[str, Any]
+    meta: Dict[str, NodeStatus] = {}
+    source: str = "server"  # "cache" or "server"
+    seq: Optional[int] = None  # Change sequence of the cached values, for ?since=
+    epoch: Optional[str] = None
+    full: bool = False  # With ?since=: every tag was returned because since was from another epoch
+
+class FleetDataResponse(BaseModel):
+    status: str  # "partial" when some servers failed
+    data: Dict[str, Any]  # Keyed "server/tag"
+    meta: Dict[str, NodeStatus] = {}
+    errors: Dict[str, str] = {}  # Servers that could not be read, with the reason
+
+class FleetWriteRequest(BaseModel):
+    values: Dict[str, Any]  # Keyed "server/tag"
+
+class HistoryBucket(BaseModel):
+    start: datetime
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    avg: Optional[float] = None
+    last: Any = None
+
+class HistoryResponse(BaseModel):
+    status: str
+    start: datetime
+    end: datetime
+    bucket: float
+    data: Dict[str, List[HistoryBucket]]
+
+class BatchWriteRequest(BaseModel):
+    values: Dict[str, Any]
+    atomic: bool = False
+
+class BatchWriteResponse(BaseModel):
+    status: str
+    results: Dict[str, str]
+    rolled_back: bool = False
 
 class UpdateResponse(BaseModel):
     status: str
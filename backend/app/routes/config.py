@@ -1,14 +1,21 @@
-from fastapi import APIRouter, HTTPException, FastAPI, status, Depends
+from fastapi import APIRouter, HTTPException, FastAPI, status, Depends, Request, Response
 from asyncua import ua
 from app.config import settings
 from app.utils.opcua_client import OPCUAClient
+from app.utils.connection_manager import (
+    ConnectionManager, connected_client, get_connected_client, get_connection_manager, get_subscription_hub,
+    get_value_cache, opcua_lifespan
+)
+from app.utils.value_cache import ValueCache
+from app.utils.http_cache import etag_matches, not_modified
+from app.utils.subscription_hub import SubscriptionHub
 from app.utils.logger import get_logger
-from app.models.config import ConfigRequest, ConfigResponse, NamespaceConfig, VariableConfig
+from app.models.config import (
+    ConfigRequest, ConfigResponse, NamespaceConfig, VariableConfig, SubscriptionSettings, SubscriptionConfig
+)
 from typing import Union, Dict, Any, Optional
 from pydantic import BaseModel
 from asyncua.common.node import Node
-import json
-from pathlib import Path
 
 # Initialize logger and router
 logger = get_logger(__name__)
@@ -20,52 +27,49 @@ class HealthCheckResponse(BaseModel):
     opcua_connected: bool
     message: str
 
-# Initialize OPC UA client with settings
-opcua_client = OPCUAClient(settings.OPCUA_URL, settings.NAMESPACE_URI)
-
-# Dependency to get OPC UA client and handle connection
-async def get_connected_client() -> OPCUAClient:
-    """Ensure OPC UA client is connected before processing request."""
-    if opcua_client.client is None:
-        try:
-            await opcua_client.connect()
-        except Exception as e:
-            logger.error(f"Failed to connect to OPC UA server: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="OPC UA client is not connected."
-            )
-    return opcua_client
-
 # API Routes
 @router.get("", response_model=ConfigResponse)
-async def get_config(client: OPCUAClient = Depends(get_connected_client)):
-    """Retrieve the current configuration from the OPC UA server."""
+async def get_config(
+    request: Request,
+    response: Response,
+    cache: ValueCache = Depends(get_value_cache),
+    manager: ConnectionManager = Depends(get_connection_manager),
+):
+    """Retrieve the stored variable configuration from the OPC UA server's tag store.
+
+    Once the stored names are known, their current values come from the live
+    value cache; the tag store is only asked again after a model change.
+    """
+    etag = cache.config_etag()
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if cache.stored_names is not None:
+        cached = cache.read(cache.stored_names)
+        if cached is not None:
+            if etag is not None:
+                response.headers["ETag"] = etag
+            return ConfigResponse(status="success", config={name: value for name, (value, _, _) in cached.items()})
     try:
-        logger.info("Attempting to retrieve configuration from OPC UA server.")
-        
-        # Read directly from variables_store.json
-        variables_file = Path("/Users/vinod/Library/Mobile Documents/com~apple~CloudDocs/Coding/Rasberypi_opcua/opcua_server/variables_store.json")
-        if variables_file.exists():
-            with open(variables_file, 'r') as f:
-                stored_variables = json.load(f)
-                logger.info(f"Retrieved variables from store: {stored_variables}")
-                return ConfigResponse(status="success", config=stored_variables)
-        else:
-            return ConfigResponse(status="success", config={})
-            
+        async with connected_client(manager) as client:
+            stored_tags = await client.get_stored_variables()
+        stored_variables = {name: value for variables in stored_tags.values() for name, value in variables.items()}
+        cache.stored_names = list(stored_variables)
+        logger.info("Retrieved %s variables from store", len(stored_variables))
+        return ConfigResponse(status="success", config=stored_variables)
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error retrieving configuration: {str(e)}")
+        logger.error("Error retrieving configuration: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
-# Add this at the top level with other constants
-VARIABLES_STORE_PATH = Path("/Users/vinod/Library/Mobile Documents/com~apple~CloudDocs/Coding/Rasberypi_opcua/opcua_server/variables_store.json")
 
-# Update the add_config function
 @router.post("", response_model=ConfigResponse)
-async def add_config(request: ConfigRequest, client: OPCUAClient = Depends(get_connected_client)):
+async def add_config(request: ConfigRequest, client: OPCUAClient = Depends(get_connected_client),
+                     cache: ValueCache = Depends(get_value_cache)):
     """Add or update a namespace and its variables on the OPC UA server."""
+    # The model change event would do the same, but only after this response
+    cache.stored_names = None
     try:
-        logger.info(f"Received config request: namespace_uri={request.namespace_uri}, variables={request.variables}")
+        logger.info("Received config request: namespace_uri=%s, variables=%s", request.namespace_uri, request.variables)
         
         if not request.namespace_uri:
             raise HTTPException(
@@ -79,36 +83,22 @@ async def add_config(request: ConfigRequest, client: OPCUAClient = Depends(get_c
                 detail="variables must be a dictionary"
             )
         
-        # Update OPC UA server
-        await client.add_namespace_and_variables(request.namespace_uri, request.variables)
-        
-        # Update variables_store.json
+        # The server creates the variables and persists them in its tag store
         try:
-            # Read existing variables
-            if VARIABLES_STORE_PATH.exists():
-                with open(VARIABLES_STORE_PATH, 'r') as f:
-                    stored_variables = json.load(f)
-            else:
-                stored_variables = {}
-            
-            # Update with new variables
-            stored_variables.update(request.variables)
-            
-            # Write back to file
-            with open(VARIABLES_STORE_PATH, 'w') as f:
-                json.dump(stored_variables, f)
-            
-            logger.info(f"Updated variables store with: {request.variables}")
-        except Exception as e:
-            logger.error(f"Error updating variables store: {str(e)}")
-            # Continue execution even if file operation fails
+            await client.add_stored_variables(request.namespace_uri, request.variables)
+        except ua.UaStatusCodeError as e:
+            if e.code != ua.StatusCodes.BadNoMatch:
+                raise
+            # Servers without a TagStore object: create the nodes over the wire
+            logger.warning("Server has no tag store, adding variables with AddNodes")
+            await client.add_namespace_and_variables(request.namespace_uri, request.variables)
         
         return ConfigResponse(status="success", config=request.variables)
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error adding configuration: {str(e)}")
+        logger.error("Error adding configuration: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.get("/namespaces", response_model=Dict[str, Any])
@@ -118,76 +108,100 @@ async def get_namespaces(client: OPCUAClient = Depends(get_connected_client)):
         namespaces = await client.client.get_namespace_array()
         return {"namespaces": namespaces}
     except Exception as e:
-        logger.error(f"Error getting namespaces: {str(e)}")
+        logger.error("Error getting namespaces: %s", e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.post("/refresh", response_model=Dict[str, Any])
+async def refresh_node_index(client: OPCUAClient = Depends(get_connected_client)):
+    """Invalidate the cached browse-path index and rebuild it from the server."""
+    try:
+        count = await client.refresh_index()
+        logger.info("Node index refreshed with %s variables", count)
+        return {"status": "success", "variables": count}
+    except Exception as e:
+        logger.error("Error refreshing node index: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.get("/health", response_model=HealthCheckResponse)
-async def health_check():
-    """Check the health of the OPC UA connection."""
+async def health_check(manager: ConnectionManager = Depends(get_connection_manager)):
+    """Check the health of the OPC UA connection pool."""
     try:
-        if opcua_client.client is None:
-            try:
-                # Attempt to connect if not connected
-                await opcua_client.connect()
-                # Test connection by fetching namespace index
-                await opcua_client.get_namespace_index()
-                return HealthCheckResponse(
-                    status="healthy",
-                    opcua_connected=True,
-                    message="OPC UA client is connected and operational."
-                )
-            except Exception as e:
-                logger.error(f"Failed to connect during health check: {str(e)}")
-                return HealthCheckResponse(
-                    status="unhealthy",
-                    opcua_connected=False,
-                    message=f"OPC UA connection failed: {str(e)}"
-                )
-        else:
-            # Test existing connection
-            await opcua_client.get_namespace_index()
-            return HealthCheckResponse(
-                status="healthy",
-                opcua_connected=True,
-                message="OPC UA client is connected and operational."
-            )
+        async with manager.acquire() as client:
+            # Test connection by fetching the namespace array (never cached)
+            await client.client.get_namespace_array()
+        return HealthCheckResponse(
+            status="healthy",
+            opcua_connected=True,
+            message="OPC UA client is connected and operational."
+        )
     except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
+        logger.error("Health check failed: %s", e)
         return HealthCheckResponse(
             status="unhealthy",
             opcua_connected=False,
             message=str(e)
         )
 
+@router.get("/pool", response_model=Dict[str, Any])
+async def pool_stats(manager: ConnectionManager = Depends(get_connection_manager)):
+    """Report connection pool statistics."""
+    return manager.stats()
+
+async def apply_subscription_settings(hub: SubscriptionHub):
+    """Persist the subscription settings and recreate live subscriptions with them."""
+    hub.tag_settings.save()
+    await hub.refresh()
+    return hub.tag_settings.as_config()
+
+@router.get("/subscriptions", response_model=SubscriptionConfig)
+async def get_subscription_settings(hub: SubscriptionHub = Depends(get_subscription_hub)):
+    """Get the publishing interval and per-tag sampling, deadband and queue settings."""
+    return hub.tag_settings.as_config()
+
+@router.put("/subscriptions", response_model=SubscriptionConfig)
+async def update_subscription_settings(request: SubscriptionConfig, hub: SubscriptionHub = Depends(get_subscription_hub)):
+    """Merge new subscription settings and apply them to live subscriptions."""
+    try:
+        hub.tag_settings.apply(request)
+        logger.info("Updated subscription settings: %s", request)
+        return await apply_subscription_settings(hub)
+    except Exception as e:
+        logger.error("Error updating subscription settings: %s", e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.put("/subscriptions/{tag}", response_model=SubscriptionConfig)
+async def update_tag_subscription_settings(tag: str, request: SubscriptionSettings,
+                                           hub: SubscriptionHub = Depends(get_subscription_hub)):
+    """Set the subscription settings of a single tag."""
+    try:
+        hub.tag_settings.set(tag, request)
+        logger.info("Updated subscription settings for %s: %s", tag, request)
+        return await apply_subscription_settings(hub)
+    except Exception as e:
+        logger.error("Error updating subscription settings for %s: %s", tag, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+@router.delete("/subscriptions/{tag}", response_model=SubscriptionConfig)
+async def reset_tag_subscription_settings(tag: str, hub: SubscriptionHub = Depends(get_subscription_hub)):
+    """Drop a tag's own settings so it falls back to the defaults."""
+    if not hub.tag_settings.remove(tag):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No subscription settings for {tag}")
+    try:
+        return await apply_subscription_settings(hub)
+    except Exception as e:
+        logger.error("Error resetting subscription settings for %s: %s", tag, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
 # FastAPI Application Setup
 app = FastAPI(
     title="OPC UA Config API",
     description="API for configuring OPC UA server variables",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=opcua_lifespan
 )
 
-@app.on_event("startup")
-async def startup_event():
-    """Connect to the OPC UA server on application startup."""
-    try:
-        await opcua_client.connect()
-        logger.info("OPC UA client connected during startup.")
-    except Exception as e:
-        logger.error(f"Failed to connect OPC UA client on startup: {str(e)}")
-        # Don't raise here; let health check reflect the failure
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Disconnect from the OPC UA server on application shutdown."""
-    if opcua_client.client:
-        try:
-            await opcua_client.disconnect()
-            logger.info("OPC UA client disconnected during shutdown.")
-        except Exception as e:
-            logger.error(f"Failed to disconnect OPC UA client on shutdown: {str(e)}")
-
 # Add route for explicit debug validation check
 @app.post("/validation_check", status_code=status.HTTP_200_OK)
 async def validation_check(request: ConfigRequest):
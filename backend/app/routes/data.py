@@ -1,77 +1,320 @@
-from fastapi import APIRouter, HTTPException
-from typing import Any
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from asyncua import ua
+from typing import Literal, Optional
 from app.config import settings
-from app.utils.opcua_client import OPCUAClient
+from app.utils.opcua_client import OPCUAClient, MY_OBJECT_PATH
+from app.utils.connection_manager import (
+    ConnectionManager, connected_client, get_connected_client, get_connection_manager, get_value_cache
+)
+from app.utils.value_cache import ValueCache
+from app.utils.http_cache import etag_matches, not_modified
+from app.utils.aggregation import samples_to_arrays
+from common.aggregation import bucket_aggregates
 from app.utils.logger import get_logger
+from app.models.data import DataUpdate, DataResponse, NodeStatus, HistoryResponse, BatchWriteRequest, BatchWriteResponse
+from app.utils.validators import to_variant
 
 router = APIRouter()
 logger = get_logger(__name__)
-opcua_client = OPCUAClient(settings.OPCUA_URL, settings.NAMESPACE_URI)
 
-async def ensure_client_connected():
-    """Ensure the OPCUA client is connected."""
-    if not opcua_client.client or not opcua_client.client.uaclient:
-        await opcua_client.connect()
+def node_status(data_value, age: float = None) -> NodeStatus:
+    """Build the per-node status entry returned next to each value."""
+    return NodeStatus(
+        status_code=data_value.StatusCode.name,
+        source_timestamp=data_value.SourceTimestamp,
+        server_timestamp=data_value.ServerTimestamp,
+        age=age,
+    )
 
-@router.get("/", response_description="Retrieve real-time data from OPCUA server ")
-async def get_data():
+@router.get("/", response_model=DataResponse, response_description="Retrieve real-time data from OPCUA server ")
+async def get_data(
+    request: Request,
+    response: Response,
+    max_age: Optional[float] = Query(
+        None, ge=0, description="Accept cached values up to this many seconds old while the cache is not live; "
+                                "0 always reads the server"
+    ),
+    since: Optional[int] = Query(None, ge=0, description="Only return tags changed after this sequence number"),
+    epoch: Optional[str] = Query(None, description="Epoch of the response since came from"),
+    wait: float = Query(0.0, ge=0, le=settings.LONG_POLL_MAX_WAIT,
+                        description="With since: seconds to wait for a change before answering"),
+    cache: ValueCache = Depends(get_value_cache),
+    manager: ConnectionManager = Depends(get_connection_manager),
+):
+    if since is not None:
+        changes, full = await cache.changes(since, epoch, wait)
+        return DataResponse(
+            status="success",
+            data={name: value for name, (value, _) in changes.items()},
+            meta={name: node_status(data_value) for name, (_, data_value) in changes.items() if data_value is not None},
+            source="cache",
+            seq=cache.journal.seq,
+            epoch=cache.journal.epoch,
+            full=full,
+        )
+
+    etag = cache.etag()
+    # max_age=0 asks for a server read, which a 304 for the cached values would skip
+    if max_age != 0 and etag_matches(request, etag):
+        return not_modified(etag)
+    cached = cache.read(max_age=max_age)
+    if cached is not None:
+        if etag is not None:
+            response.headers["ETag"] = etag
+        return DataResponse(
+            status="success",
+            data={name: value for name, (value, _, _) in cached.items()},
+            meta={
+                name: node_status(data_value, age)
+                for name, (_, data_value, age) in cached.items() if data_value is not None
+            },
+            source="cache",
+            seq=cache.journal.seq,
+            epoch=cache.journal.epoch,
+        )
+    async with connected_client(manager) as opcua_client:
+        return await read_data(opcua_client)
+
+async def read_data(opcua_client: OPCUAClient) -> DataResponse:
+    """Read every MyObject value from the server with one batched Read."""
     try:
-        await ensure_client_connected()  # Ensure client is connected
-        namespace_idx = await opcua_client.get_namespace_index()
-        objects_node = await opcua_client.get_objects_node()  # Await the coroutine
-        
-        # Check if MyObject exists
+        # Node ids come from the client's node index; only a cold index browses the server
         try:
-            myobj = await objects_node.get_child([f"{namespace_idx}:MyObject"])
+            variables = await opcua_client.get_variables()
         except Exception as e:
-            logger.error(f"MyObject node not found: {str(e)}")
+            logger.error("MyObject node not found: %s", e)
             raise HTTPException(status_code=404, detail="MyObject node not found")
         
+        # One batched Read for all values
+        data_values = await opcua_client.read_data_values([node for _, node in variables])
+        
         data = {}
-        for node in await myobj.get_children():
-            name = (await node.read_browse_name()).Name
-            value = await node.read_value()
-            data[name] = value
-        logger.info(f"Retrieved data: {data}")
-        return {"status": "success", "data": data}
+        meta = {}
+        for (name, _), data_value in zip(variables, data_values):
+            data[name] = data_value.Value.Value if data_value.Value is not None else None
+            meta[name] = node_status(data_value)
+        logger.debug("Retrieved data: %s", data)
+        return DataResponse(status="success", data=data, meta=meta)
     except HTTPException as http_exc:
         raise http_exc
     except Exception as e:
-        logger.error(f"Error retrieving data: {str(e)}")
+        logger.error("Error retrieving data: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve data: {str(e)}")
 
+def columns_to_buckets(columns: dict) -> list:
+    """Turn columnar aggregates (start, count, min, max, avg, last) into JSON-ready bucket dicts."""
+    columns = {name: column for name, column in columns.items() if column is not None and name != "bucket"}
+    columns["start"] = [datetime.fromtimestamp(t, timezone.utc).isoformat() for t in columns["start"]]
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
+
+def aggregate_raw_history(data_values, start: float, bucket: float) -> list:
+    """Aggregate one tag's raw history locally with NumPy."""
+    timestamps, values = samples_to_arrays(data_values)
+    aggregates = bucket_aggregates(timestamps, values, start, bucket)
+    return columns_to_buckets({
+        name: column.tolist() if hasattr(column, "tolist") else column
+        for name, column in aggregates.items()
+    })
+
+async def iter_history(opcua_client: OPCUAClient, variables: list, start: datetime, end: datetime, bucket: float):
+    """Yield (tag, bucket, buckets) per tag, aggregating a few tags at a time.
+
+    Aggregation runs next to the data in the server's historian, which may
+    round the bucket width to its rollup intervals. Servers without a
+    historian fall back to a raw HistoryRead aggregated here.
+    """
+    step = settings.HISTORY_TAGS_PER_READ
+    server_side = True
+    for offset in range(0, len(variables), step):
+        chunk = variables[offset:offset + step]
+        if server_side:
+            try:
+                result = await opcua_client.read_aggregates([name for name, _ in chunk], start, end, bucket)
+                for name, _ in chunk:
+                    yield name, result[name]["bucket"], columns_to_buckets(result[name])
+                continue
+            except ua.UaStatusCodeError as e:
+                if e.code != ua.StatusCodes.BadNoMatch:
+                    raise
+                logger.warning("Server has no historian object, aggregating raw history in the backend")
+                server_side = False
+        history = await opcua_client.read_history([node for _, node in chunk], start, end)
+        for (name, _), data_values in zip(chunk, history):
+            # Conversion and aggregation of large histories run off the event loop
+            yield name, bucket, await asyncio.to_thread(aggregate_raw_history, data_values, start.timestamp(), bucket)
+
+@router.get("/history", response_model=HistoryResponse,
+            response_description="Aggregated history (min/max/avg/last per time bucket)")
+async def get_history(
+    tags: Optional[str] = Query(None, description="Comma-separated tag names; all tags when omitted"),
+    start: Optional[datetime] = Query(None, description="Start time; defaults to one hour before end"),
+    end: Optional[datetime] = Query(None, description="End time; defaults to now"),
+    bucket: Optional[float] = Query(None, gt=0, description="Bucket width in seconds"),
+    format: Literal["json", "ndjson"] = Query("json", description="ndjson streams one line per tag"),
+    opcua_client: OPCUAClient = Depends(get_connected_client),
+):
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    start = start or end - timedelta(hours=1)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    span = (end - start).total_seconds()
+    if span <= 0:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    bucket = bucket or span / settings.HISTORY_DEFAULT_BUCKETS
+    if span / bucket > settings.HISTORY_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many buckets; use a bucket of at least {span / settings.HISTORY_MAX_BUCKETS:.3f} seconds"
+        )
+
+    try:
+        variables = await opcua_client.get_variables()
+    except Exception as e:
+        logger.error("MyObject node not found: %s", e)
+        raise HTTPException(status_code=404, detail="MyObject node not found")
+    if tags:
+        requested = [tag.strip() for tag in tags.split(",") if tag.strip()]
+        nodes = dict(variables)
+        missing = [tag for tag in requested if tag not in nodes]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Unknown tags: {', '.join(missing)}")
+        variables = [(tag, nodes[tag]) for tag in requested]
+
+    if format == "ndjson":
+        async def stream():
+            try:
+                async for name, tag_bucket, buckets in iter_history(opcua_client, variables, start, end, bucket):
+                    yield json.dumps({"tag": name, "bucket": tag_bucket, "buckets": buckets}, default=str) + "\n"
+            except Exception as e:
+                logger.error("Error streaming history: %s", e)
+                yield json.dumps({"error": str(e)}) + "\n"
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    try:
+        data = {}
+        async for name, tag_bucket, buckets in iter_history(opcua_client, variables, start, end, bucket):
+            data[name] = buckets
+            bucket = tag_bucket
+        # Buckets are already JSON-ready; skip re-validating thousands of them
+        return JSONResponse({
+            "status": "success", "start": start.isoformat(), "end": end.isoformat(), "bucket": bucket, "data": data
+        })
+    except Exception as e:
+        logger.error("Error retrieving history: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve history: {str(e)}")
+
+@router.post("/batch", response_model=BatchWriteResponse, response_description="Write many tags with one Write call")
+async def batch_update(request: BatchWriteRequest, opcua_client: OPCUAClient = Depends(get_connected_client)):
+    """Write a map of tag -> value with a single Write service call.
+
+    Returns a status code per tag. With atomic=true nothing is written unless
+    every value converts, and if any write fails the tags that were written
+    are restored to the values read beforehand and reported as
+    BadRequestCancelledByClient. rolled_back is false when a restore fails;
+    those tags carry the rollback Write's status code.
+    """
+    try:
+        try:
+            nodes = dict(await opcua_client.get_variables())
+        except Exception as e:
+            logger.error("MyObject node not found: %s", e)
+            raise HTTPException(status_code=404, detail="MyObject node not found")
+
+        results = {}
+        targets = [(name, nodes[name]) for name in request.values if name in nodes]
+        for name in request.values:
+            if name not in nodes:
+                results[name] = ua.StatusCodes.BadNodeIdUnknown
+
+        # DataType/ValueRank come from the node index cache; only atomic
+        # batches need a Read, for the rollback snapshot
+        types = await opcua_client.get_variable_types([node for _, node in targets])
+        previous = await opcua_client.read_data_values([node for _, node in targets]) if request.atomic else None
+        writes = []
+        for i, ((name, node), (variant_type, value_rank)) in enumerate(zip(targets, types)):
+            if previous is not None and not previous[i].StatusCode.is_good():
+                results[name] = previous[i].StatusCode.value
+                continue
+            try:
+                writes.append((name, node, to_variant(request.values[name], variant_type, value_rank)))
+            except (ValueError, TypeError) as e:
+                logger.warning("Cannot convert value for %s: %s", name, e)
+                results[name] = ua.StatusCodes.BadTypeMismatch
+
+        rolled_back = False
+        if request.atomic and results:
+            # Reject the whole batch before writing anything
+            results.update({name: ua.StatusCodes.BadRequestCancelledByClient for name, _, _ in writes})
+        elif writes:
+            statuses = await opcua_client.write_data_values([node for _, node, _ in writes],
+                                                            [variant for _, _, variant in writes])
+            for (name, _, _), status_code in zip(writes, statuses):
+                results[name] = status_code.value
+            failed = [name for name, _, _ in writes if results[name] != ua.StatusCodes.Good]
+            if request.atomic and failed:
+                snapshot = dict(zip((name for name, _ in targets), previous))
+                restore = [(name, node, snapshot[name].Value) for name, node, _ in writes if name not in failed]
+                statuses = await opcua_client.write_data_values([node for _, node, _ in restore],
+                                                                [value for _, _, value in restore])
+                # Restored tags report the cancel code; tags that could not be
+                # restored report the rollback Write's status
+                for (name, _, _), status_code in zip(restore, statuses):
+                    results[name] = ua.StatusCodes.BadRequestCancelledByClient if status_code.is_good() else status_code.value
+                rolled_back = all(status_code.is_good() for status_code in statuses)
+                if rolled_back:
+                    logger.warning("Batch write rolled back after %s failures", len(failed))
+                else:
+                    logger.error("Batch write rollback failed for %s of %s tags",
+                                 sum(not status_code.is_good() for status_code in statuses), len(restore))
+
+        response = BatchWriteResponse(
+            status="success" if all(code == ua.StatusCodes.Good for code in results.values()) else "error",
+            results={name: ua.StatusCode(results[name]).name for name in request.values},
+            rolled_back=rolled_back,
+        )
+        logger.info("Batch wrote %s of %s tags", len(writes), len(request.values))
+        return response
+    except HTTPException as http_exc:
+        raise http_exc
+    except Exception as e:
+        logger.error("Error writing batch: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to write batch: {str(e)}")
+
 @router.post("/", response_description="Update data on OPCUA server")
-async def update_data(variable: str, value: Any):
+async def update_data(update: DataUpdate, opcua_client: OPCUAClient = Depends(get_connected_client)):
+    variable, value = update.variable, update.value
     try:
-        await ensure_client_connected()
-        namespace_idx = await opcua_client.get_namespace_index()
-        objects_node = await opcua_client.get_objects_node()
-        
         try:
-            myobj = await objects_node.get_child([f"{namespace_idx}:MyObject"])
-            var_node = await myobj.get_child([f"{namespace_idx}:{variable}"])
-            
-            # Get current value to determine the correct type
-            current_value = await var_node.read_value()
+            var_node = await opcua_client.get_node_by_path(f"{MY_OBJECT_PATH}/{variable}")
             
-            # Convert the input value to match the node's data type
+            # Encode the input for the node's cached DataType/ValueRank, so the write is one round trip
+            [(variant_type, value_rank)] = await opcua_client.get_variable_types([var_node])
             try:
-                converted_value = type(current_value)(value)
-            except (ValueError, TypeError):
+                variant = to_variant(value, variant_type, value_rank)
+            except (ValueError, TypeError) as e:
                 raise HTTPException(
                     status_code=400,
-                    detail=f"Invalid value type. Expected {type(current_value).__name__}, got {type(value).__name__}"
+                    detail=f"Invalid value for {variant_type.name}: {str(e)}"
                 )
             
             # Write the converted value
-            await var_node.write_value(converted_value)
-            logger.info(f"Updated {variable} to value: {converted_value}")
+            [status_code] = await opcua_client.write_data_values([var_node], [variant])
+            status_code.check()
+            logger.debug("Updated %s to value: %s", variable, variant.Value)
             return {"status": "success", "message": f"Updated {variable} successfully"}
         except HTTPException as he:
             raise he
         except Exception as e:
-            logger.error(f"Node not found or access denied: {str(e)}")
+            logger.error("Node not found or access denied: %s", e)
             raise HTTPException(status_code=404, detail=f"Node not found or access denied: {str(e)}")
+    except HTTPException as http_exc:
+        raise http_exc
     except Exception as e:
-        logger.error(f"Error updating data: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to update data: {str(e)}")
\ No newline at end of file
+        logger.error("Error updating data: %s", e)
+        raise HTTPException(status_code=500, detail=f"Failed to update data: {str(e)}")
@@ -0,0 +1,50 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from asyncua import ua
+from app.utils.connection_manager import get_fleet
+from app.utils.fleet import Fleet
+from app.utils.logger import get_logger
+from app.models.data import BatchWriteResponse, FleetDataResponse, FleetWriteRequest
+from app.routes.data import node_status
+
+router = APIRouter()
+logger = get_logger(__name__)
+
+@router.get("/", response_description="Connection state of every server in the fleet")
+async def get_fleet_status(fleet: Fleet = Depends(get_fleet)):
+    return {"status": "success", "servers": fleet.stats()}
+
+@router.get("/data", response_model=FleetDataResponse, response_description="Live values of every server's tags")
+async def get_fleet_data(
+    servers: Optional[str] = Query(None, description="Comma-separated server names; every server when omitted"),
+    fleet: Fleet = Depends(get_fleet),
+):
+    """Read every MyObject variable of the fleet, one batched Read per server, concurrently.
+
+    Tags are keyed "server/tag". Servers that are unreachable or time out are
+    listed in errors and the others are still returned.
+    """
+    names = [name.strip() for name in servers.split(",") if name.strip()] if servers else None
+    data_values, errors = await fleet.read(names)
+    return FleetDataResponse(
+        status="partial" if errors else "success",
+        data={name: data_value.Value.Value if data_value.Value is not None else None
+              for name, data_value in data_values.items()},
+        meta={name: node_status(data_value) for name, data_value in data_values.items()},
+        errors=errors,
+    )
+
+@router.post("/data/batch", response_model=BatchWriteResponse, response_description="Write tags across the fleet")
+async def fleet_batch_update(request: FleetWriteRequest, fleet: Fleet = Depends(get_fleet)):
+    """Write a map of "server/tag" -> value with one Write call per server, concurrently.
+
+    Returns a status code per tag. Servers are written independently: tags of
+    a server that is down get BadServerNotConnected (or BadTimeout) while the
+    other servers' tags are written.
+    """
+    results = await fleet.write(request.values)
+    logger.info("Fleet batch wrote %s tags", len(results))
+    return BatchWriteResponse(
+        status="success" if all(code == ua.StatusCodes.Good for code in results.values()) else "error",
+        results={name: ua.StatusCode(results[name]).name for name in request.values},
+    )
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from app.utils.connection_manager import ConnectionManager, get_connection_manager, get_subscription_hub
+from app.utils.metrics import REGISTRY
+from common.metrics import CONTENT_TYPE
+from app.utils.subscription_hub import SubscriptionHub
+
+router = APIRouter()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(manager: ConnectionManager = Depends(get_connection_manager),
+                  hub: SubscriptionHub = Depends(get_subscription_hub)):
+    """Backend metrics in the Prometheus text format."""
+    manager.update_metrics()
+    hub.update_metrics()
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
@@ -1,111 +1,187 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from starlette.websockets import WebSocketState  # Import the correct WebSocketState
-from app.utils.opcua_client import OPCUAClient
+from app.utils.connection_manager import get_subscription_hub
+from app.utils.frame_encoding import ENCODERS, negotiate
 from app.utils.logger import get_logger
-from app.config import settings
+from app.utils.metrics import REGISTRY
 import asyncio
 import json
 
 router = APIRouter()
 logger = get_logger(__name__)
-opcua_client = OPCUAClient(settings.OPCUA_URL, settings.NAMESPACE_URI)
 
-class DataChangeHandler:
-    def __init__(self, websocket: WebSocket):
+# Seconds without updates after which a heartbeat is sent
+HEARTBEAT_INTERVAL = 30
+# Seconds to wait for the first subscribe message before streaming every tag
+SUBSCRIBE_TIMEOUT = 1.0
+
+SEND_SECONDS = REGISTRY.histogram("ws_send_seconds", "Time to encode and send one update frame to a WebSocket client")
+
+def parse_subscribe(text: str):
+    """Return (tags, since, epoch) of a subscribe message; raises ValueError for anything else."""
+    try:
+        message = json.loads(text)
+    except json.JSONDecodeError:
+        raise ValueError("Messages must be JSON objects")
+    if not isinstance(message, dict) or message.get("action") != "subscribe":
+        raise ValueError("Unknown action, expected {\"action\": \"subscribe\"}")
+    tags = message.get("tags")
+    if tags is not None and (not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags)):
+        raise ValueError("tags must be a list of tag names")
+    since = message.get("since")
+    if since is not None and (not isinstance(since, int) or isinstance(since, bool)):
+        raise ValueError("since must be an integer sequence number")
+    return tags or None, since, message.get("epoch")
+
+class TagStream:
+    """One WebSocket client: its hub client, tag filter and the last sequence it was sent.
+
+    A subscribe answers with a snapshot of the requested tags, or with only the
+    changes after since when the client resumes within the same epoch. After
+    that the client receives deltas; frames the snapshot already covered are
+    skipped. All sends go through one lock so frames never interleave.
+    Outgoing frames use the encoder negotiated at connect time; client
+    messages are always JSON text.
+    """
+    def __init__(self, websocket: WebSocket, hub, encoder=None):
         self.websocket = websocket
+        self.hub = hub
+        self.encoder = encoder or ENCODERS[None]
+        self.hub_client = None
+        self.tags = None
+        self.seq = 0
+        self._send_lock = asyncio.Lock()
 
-    async def datachange_notification(self, node, val, data):
-        try:
-            if self.websocket.application_state == WebSocketState.CONNECTED:
-                browse_name = await node.read_browse_name()
-                data_dict = {browse_name.Name: val}
-                await self.websocket.send_text(json.dumps({"event": "update", "data": data_dict}))
-                logger.info(f"Sent WebSocket update: {data_dict}")
+    async def send(self, message: dict):
+        async with self._send_lock:
+            await self._send(message)
+
+    async def _send(self, message: dict):
+        with SEND_SECONDS.time():
+            await self._send_payload(self.encoder.encode(message))
+
+    async def _send_payload(self, payload):
+        if self.encoder.binary:
+            await self.websocket.send_bytes(payload)
+        else:
+            await self.websocket.send_text(payload)
+
+    async def subscribe(self, tags=None, since=None, epoch=None):
+        """Switch to the tag group for tags and bring the client up to date."""
+        # Hold the send lock so no delta overtakes the snapshot
+        async with self._send_lock:
+            previous = self.hub_client
+            self.hub_client = await self.hub.register(tags)
+            self.tags = tags
+            if previous is not None:
+                await self.hub.unregister(previous)
+            journal = self.hub.journal
+            changes = None
+            if since is not None and epoch == journal.epoch:
+                changes = journal.changes_since(since, tags)
+            message = {"event": "update", "epoch": journal.epoch, "seq": journal.seq}
+            if changes is None:
+                message.update(type="snapshot", data=journal.snapshot(tags))
             else:
-                logger.warning("WebSocket is not connected. Skipping send.")
-        except Exception as e:
-            logger.error(f"Error in datachange_notification: {str(e)}")
+                message.update(type="delta", resumed=True, data=changes)
+                logger.info("WebSocket client resumed from sequence %s with %s changed tags", since, len(changes))
+            self.seq = journal.seq
+            await self._send(message)
+
+    async def handle(self, text: str):
+        try:
+            tags, since, epoch = parse_subscribe(text)
+        except ValueError as e:
+            await self.send({"event": "error", "data": {"message": str(e)}})
+            return
+        await self.subscribe(tags, since, epoch)
+
+    async def forward_updates(self):
+        """Send hub frames as deltas; send a heartbeat when nothing arrived for a while."""
+        while self.websocket.application_state == WebSocketState.CONNECTED:
+            hub_client = self.hub_client
+            try:
+                frame = await asyncio.wait_for(hub_client.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                await self.send({"event": "heartbeat", "seq": self.seq})
+                continue
+            if frame is None:
+                if hub_client is not self.hub_client:
+                    # Resubscribed to another tag set; continue with the new hub client
+                    continue
+                # The hub dropped this client for falling too far behind
+                logger.warning("Closing WebSocket of a client that fell too far behind")
+                await self.websocket.close(code=1013)
+                return
+            seq, update = frame
+            async with self._send_lock:
+                if seq <= self.seq:
+                    # Already contained in the snapshot or resume frame
+                    continue
+                self.seq = seq
+                with SEND_SECONDS.time():
+                    await self._send_payload(self.encoder.encode_delta(seq, update))
+
+    async def receive_messages(self):
+        """Handle (re)subscribe messages; returns by raising WebSocketDisconnect when the client goes away."""
+        while True:
+            await self.handle(await self.websocket.receive_text())
+
+    async def close(self):
+        if self.hub_client is not None:
+            await self.hub.unregister(self.hub_client)
 
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    logger.info("WebSocket connection established")
-    
+    encoder = negotiate(websocket.scope.get("subprotocols"))
+    await websocket.accept(subprotocol=encoder.subprotocol)
+    logger.info("WebSocket connection established (%s)", encoder.subprotocol or "json")
+    stream = TagStream(websocket, get_subscription_hub(websocket), encoder)
+
     try:
-        # Ensure client is connected before proceeding
-        if not opcua_client.client or not opcua_client.client.uaclient:
-            try:
-                # Get authentication parameters from settings
-                await opcua_client.connect()
-                logger.info("Successfully authenticated with OPC UA server")
-            except Exception as auth_error:
-                error_msg = str(auth_error)
-                if "BadIdentityTokenRejected" in error_msg:
-                    error_msg = "Invalid credentials or authentication failed"
-                logger.error(f"Authentication failed: {error_msg}")
-                await websocket.send_text(json.dumps({
-                    "event": "error",
-                    "data": {
-                        "message": "Authentication failed",
-                        "details": error_msg
-                    }
-                }))
-                await websocket.close(code=4001)  # Custom code for auth failure
-                return
-            
-        namespace_idx = await opcua_client.get_namespace_index()
-        objects_node = await opcua_client.get_objects_node()
-        
-        # Ensure MyObject exists
+        # Clients send {"action": "subscribe", "tags": [...]} first; older ones
+        # that never do get every MyObject variable
         try:
-            myobj = await objects_node.get_child([f"{namespace_idx}:MyObject"])
-        except Exception as e:
-            logger.error(f"Failed to get MyObject: {str(e)}")
-            await websocket.send_text(json.dumps({
-                "event": "error",
-                "data": {"message": "Failed to access OPC UA node"}
-            }))
-            await websocket.close(code=1011)  # Internal error
-            return
-        
-        handler = DataChangeHandler(websocket)
-        subscription = await opcua_client.create_subscription(500, handler)
-        nodes = await myobj.get_children()
-        
-        # Subscribe to all child nodes
-        for node in nodes:
-            try:
-                await subscription.subscribe_data_change(node)
-                logger.info(f"Subscribed to node: {await node.read_browse_name()}")
-            except Exception as sub_error:
-                logger.error(f"Failed to subscribe to node: {str(sub_error)}")
-        
-        # Keep the connection alive
-        while websocket.application_state == WebSocketState.CONNECTED:
-            try:
-                # Send heartbeat to check connection
-                await websocket.send_text(json.dumps({"event": "heartbeat"}))
-                await asyncio.sleep(30)  # Heartbeat every 30 seconds
-            except Exception as e:
-                logger.error(f"Connection error: {str(e)}")
-                break
-            
+            first = await asyncio.wait_for(websocket.receive_text(), timeout=SUBSCRIBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            first = None
+        if first is None:
+            await stream.subscribe()
+        else:
+            await stream.handle(first)
+            while stream.hub_client is None:
+                await stream.handle(await websocket.receive_text())
+
+        # Forward updates while watching the socket so disconnects are noticed at once
+        sender = asyncio.create_task(stream.forward_updates())
+        receiver = asyncio.create_task(stream.receive_messages())
+        done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            task.result()
+
     except WebSocketDisconnect:
         logger.info("WebSocket connection closed by client")
+    except ConnectionError as e:
+        logger.error("No connected OPC UA session available: %s", e)
+        await stream.send({
+            "event": "error",
+            "data": {
+                "message": "OPC UA server unavailable",
+                "details": str(e)
+            }
+        })
+        await websocket.close(code=1013)  # Try again later
     except Exception as e:
-        logger.error(f"WebSocket error: {str(e)}")
+        logger.error("WebSocket error: %s", e)
         try:
-            await websocket.send_text(json.dumps({
+            await stream.send({
                 "event": "error",
                 "data": {"message": "Internal server error"}
-            }))
+            })
             await websocket.close(code=1011)
         except:
             pass
     finally:
-        if 'subscription' in locals():
-            try:
-                await subscription.delete()
-                logger.info("Subscription deleted")
-            except Exception as e:
-                logger.error(f"Error deleting subscription: {str(e)}")
\ No newline at end of file
+        await stream.close()
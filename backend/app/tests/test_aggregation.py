@@ -0,0 +1,27 @@
+import numpy as np
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from common.aggregation import bucket_aggregates
+
+def test_numeric_buckets():
+    """Samples are grouped into fixed-width buckets with min/max/avg/last per bucket."""
+    timestamps = np.array([0.0, 1.0, 2.0, 10.0, 11.0, 25.0])
+    values = np.array([5.0, 1.0, 3.0, 2.0, 4.0, 7.0])
+    result = bucket_aggregates(timestamps, values, start=0.0, bucket=10.0)
+    assert result["start"].tolist() == [0.0, 10.0, 20.0]
+    assert result["count"].tolist() == [3, 2, 1]
+    assert result["min"].tolist() == [1.0, 2.0, 7.0]
+    assert result["max"].tolist() == [5.0, 4.0, 7.0]
+    assert result["avg"].tolist() == [3.0, 3.0, 7.0]
+    assert result["last"].tolist() == [3.0, 4.0, 7.0]
+
+def test_non_numeric_values_only_get_last():
+    timestamps = np.array([1.0, 0.0, 12.0])
+    values = np.array(["b", "a", "c"])
+    result = bucket_aggregates(timestamps, values, start=0.0, bucket=10.0)
+    assert result["min"] is None
+    assert result["count"].tolist() == [2, 1]
+    assert result["last"].tolist() == ["b", "c"]
@@ -9,6 +9,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 # Import after adding to path
 from app.main import app
+from app.models.data import BatchWriteRequest
+from app.routes.data import batch_update
+from app.utils.connection_manager import get_connected_client
+from asyncua import ua
 
 client = TestClient(app)
 
@@ -26,4 +30,79 @@ async def test_update_data():
     response = client.post("/data/", json={"variable": "variable1", "value": 42})
     assert response.status_code == 200
     assert response.json()["status"] == "success"
-    assert response.json()["message"] == "Updated variable1 successfully"
\ No newline at end of file
+    assert response.json()["message"] == "Updated variable1 successfully"
+class RollbackClient:
+    """Fake OPCUAClient whose first Write rejects setpoint2 and whose rollback rejects `stuck` tags."""
+    def __init__(self, stuck=()):
+        self.values = {"setpoint1": 1.0, "setpoint2": 2.0, "setpoint3": 3.0}
+        self.stuck = set(stuck)
+        self.writes = 0
+
+    async def get_variables(self):
+        return [(name, name) for name in self.values]
+
+    async def get_variable_types(self, nodes):
+        return [(ua.VariantType.Double, -1) for _ in nodes]
+
+    async def read_data_values(self, nodes):
+        return [ua.DataValue(ua.Variant(self.values[node], ua.VariantType.Double)) for node in nodes]
+
+    async def write_data_values(self, nodes, values):
+        self.writes += 1
+        bad = {"setpoint2"} if self.writes == 1 else self.stuck
+        statuses = []
+        for node, value in zip(nodes, values):
+            if node in bad:
+                statuses.append(ua.StatusCode(ua.StatusCodes.BadNotWritable))
+            else:
+                self.values[node] = value.Value
+                statuses.append(ua.StatusCode(ua.StatusCodes.Good))
+        return statuses
+
+@pytest.mark.asyncio
+async def test_atomic_batch_reports_rolled_back_tags():
+    """Tags restored after a failed atomic batch are not reported as Good."""
+    fake = RollbackClient()
+    request = BatchWriteRequest(values={"setpoint1": 10, "setpoint2": 20, "setpoint3": 30}, atomic=True)
+    response = await batch_update(request, fake)
+    assert response.rolled_back is True
+    assert response.results == {
+        "setpoint1": "BadRequestCancelledByClient",
+        "setpoint2": "BadNotWritable",
+        "setpoint3": "BadRequestCancelledByClient",
+    }
+    assert fake.values == {"setpoint1": 1.0, "setpoint2": 2.0, "setpoint3": 3.0}
+
+    fake = RollbackClient(stuck={"setpoint3"})
+    response = await batch_update(request, fake)
+    assert response.rolled_back is False
+    assert response.status == "error"
+    assert response.results["setpoint1"] == "BadRequestCancelledByClient"
+    assert response.results["setpoint3"] == "BadNotWritable"
+
+class SingleWriteClient:
+    """Fake OPCUAClient with one Int32 array tag, recording the written variants."""
+    def __init__(self):
+        self.written = []
+
+    async def get_node_by_path(self, path):
+        return path
+
+    async def get_variable_types(self, nodes):
+        return [(ua.VariantType.Int32, 1) for _ in nodes]
+
+    async def write_data_values(self, nodes, values):
+        self.written.extend(values)
+        return [ua.StatusCode(ua.StatusCodes.Good) for _ in nodes]
+
+def test_update_data_takes_a_json_body():
+    """Arrays arrive as JSON lists instead of query strings."""
+    fake = SingleWriteClient()
+    app.dependency_overrides[get_connected_client] = lambda: fake
+    try:
+        response = client.post("/api/data/", json={"variable": "MyArrayVar", "value": [1, 2, 3]})
+    finally:
+        app.dependency_overrides.pop(get_connected_client)
+    assert response.status_code == 200
+    assert fake.written[0].Value == [1, 2, 3]
+    assert fake.written[0].VariantType == ua.VariantType.Int32
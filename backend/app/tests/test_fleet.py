@@ -0,0 +1,184 @@
+import asyncio
+import sys
+import os
+import time
+import pytest
+from contextlib import asynccontextmanager
+from asyncua import ua
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from app.utils import fleet as fleet_module
+from app.utils.fleet import Fleet, split_name, shard_of, reachable_url
+
+class FakeClient:
+    def __init__(self, values, delay=0.0):
+        self.values = values
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def read_variables(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            return {name: ua.DataValue(ua.Variant(value)) for name, value in self.values.items()}
+        finally:
+            self.in_flight -= 1
+
+    async def write_variables(self, values):
+        await asyncio.sleep(self.delay)
+        results = {}
+        for name, value in values.items():
+            if name in self.values:
+                self.values[name] = value
+                results[name] = ua.StatusCodes.Good
+            else:
+                results[name] = ua.StatusCodes.BadNodeIdUnknown
+        return results
+
+class FakeManager:
+    def __init__(self, client=None):
+        self.client = client
+        self.connected = client is not None
+
+    @asynccontextmanager
+    async def acquire(self):
+        if not self.connected:
+            raise ConnectionError("No OPC UA session is connected")
+        yield self.client
+
+    def stats(self):
+        return {"connected": int(self.connected)}
+
+class PoolManager(FakeManager):
+    """FakeManager with the lifecycle and reconnect listeners of a ConnectionManager."""
+    def __init__(self, url, client=None):
+        super().__init__(client)
+        self.url = url
+        self.running = False
+        self.listeners = []
+
+    async def start(self):
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+
+    def add_reconnect_listener(self, callback):
+        self.listeners.append(callback)
+
+    async def reconnected(self):
+        for callback in self.listeners:
+            await callback(0)
+
+def test_fleet_tag_names():
+    assert split_name("pi1/tag0") == ("pi1", "tag0")
+    assert split_name("pi1/a/b") == ("pi1", "a/b")
+    for name in ("tag0", "/tag0", "pi1/"):
+        with pytest.raises(ValueError):
+            split_name(name)
+
+@pytest.mark.asyncio
+async def test_reads_and_writes_fan_out_and_isolate_failing_servers():
+    slow = FakeClient({"t": 3.0}, delay=10.0)
+    fleet = Fleet({
+        "pi1": FakeManager(FakeClient({"t": 1.0}, delay=0.05)),
+        "pi2": FakeManager(FakeClient({"t": 2.0}, delay=0.05)),
+        "down": FakeManager(),
+        "slow": FakeManager(slow),
+    }, timeout=0.2)
+
+    start = time.perf_counter()
+    data_values, errors = await fleet.read()
+    # Servers are read concurrently and the slow one only costs the timeout
+    assert time.perf_counter() - start < 0.5
+    assert {name: dv.Value.Value for name, dv in data_values.items()} == {"pi1/t": 1.0, "pi2/t": 2.0}
+    assert set(errors) == {"down", "slow"}
+    assert errors["slow"] == "Timed out"
+
+    _, errors = await fleet.read(["pi2", "nope"])
+    assert errors == {"nope": "Unknown server"}
+
+    results = await fleet.write({"pi1/t": 5.0, "pi2/x": 1, "down/t": 1, "slow/t": 1, "nope/t": 1, "bad": 1})
+    assert results == {
+        "pi1/t": ua.StatusCodes.Good,
+        "pi2/x": ua.StatusCodes.BadNodeIdUnknown,
+        "down/t": ua.StatusCodes.BadServerNotConnected,
+        "slow/t": ua.StatusCodes.BadTimeout,
+        "nope/t": ua.StatusCodes.BadServerNameMissing,
+        "bad": ua.StatusCodes.BadNodeIdInvalid,
+    }
+    assert fleet.managers["pi1"].client.values["t"] == 5.0
+
+@pytest.mark.asyncio
+async def test_requests_per_server_are_limited():
+    client = FakeClient({"t": 1.0}, delay=0.02)
+    fleet = Fleet({"pi1": FakeManager(client)}, max_concurrency=2)
+    await asyncio.gather(*(fleet.read() for _ in range(6)))
+    assert client.max_in_flight == 2
+
+@pytest.mark.asyncio
+async def test_sharded_servers_are_one_namespace():
+    names = [f"tag{i}" for i in range(10)]
+    shards = [FakeClient({name: 0.0 for name in names if shard_of(name, 2) == index}) for index in range(2)]
+    fleet = Fleet({"pi1": FakeManager()})
+    fleet.shards["pi1"] = [FakeManager(client) for client in shards]
+
+    data_values, errors = await fleet.read()
+    assert errors == {}
+    assert sorted(data_values) == sorted(f"pi1/{name}" for name in names)
+
+    results = await fleet.write({f"pi1/{name}": 1.0 for name in names})
+    assert set(results.values()) == {ua.StatusCodes.Good}
+    assert all(value == 1.0 for client in shards for value in client.values.values())
+
+    fleet.shards["pi1"][1].connected = False
+    _, errors = await fleet.read()
+    assert list(errors) == ["pi1#1"]
+
+def test_wildcard_shard_endpoints_use_the_supervisor_host():
+    assert reachable_url("opc.tcp://0.0.0.0:4843", "opc.tcp://pi1.local:4841") == "opc.tcp://pi1.local:4843"
+    assert reachable_url("opc.tcp://10.0.0.5:4843", "opc.tcp://pi1.local:4841") == "opc.tcp://10.0.0.5:4843"
+
+@pytest.mark.asyncio
+async def test_shards_are_rediscovered_when_a_session_reconnects(monkeypatch):
+    discovered = []  # Successive find_shards answers; an exception is raised
+
+    async def find_shards(url, timeout):
+        answer = discovered.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(fleet_module, "find_shards", find_shards)
+    supervisor = PoolManager("opc.tcp://pi1:4840")
+    fleet = Fleet({"pi1": supervisor}, manager_factory=PoolManager)
+
+    # The Pi is down at start, so it is used as one server until it reconnects
+    discovered.append(OSError("Connection refused"))
+    await fleet.start()
+    assert fleet.endpoints("pi1") == [("pi1", supervisor)]
+    assert supervisor.running
+
+    discovered.append(["opc.tcp://pi1:4843", "opc.tcp://pi1:4844"])
+    await supervisor.reconnected()
+    shards = fleet.shards["pi1"]
+    assert [manager.url for manager in shards] == ["opc.tcp://pi1:4843", "opc.tcp://pi1:4844"]
+    assert all(manager.running for manager in shards)
+
+    # Same workers after a restart: the managers are kept
+    discovered.append(["opc.tcp://pi1:4843", "opc.tcp://pi1:4844"])
+    await shards[0].reconnected()
+    assert fleet.shards["pi1"] is shards
+
+    # Restarted with another worker count: writes are routed over the new shards
+    discovered.append(["opc.tcp://pi1:4843", "opc.tcp://pi1:4844", "opc.tcp://pi1:4845"])
+    await shards[1].reconnected()
+    assert len(fleet.endpoints("pi1")) == 3
+    assert not any(manager.running for manager in shards)
+
+    await fleet.stop()
+    assert not supervisor.running
+    assert not any(manager.running for manager in fleet.shards["pi1"])
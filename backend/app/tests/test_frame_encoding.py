@@ -0,0 +1,45 @@
+import sys
+import os
+from array import array
+import msgpack
+import pytest
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from app.utils.frame_encoding import MSGPACK_SUBPROTOCOL, FrameEncoder, JsonEncoder, MsgpackEncoder, negotiate
+
+def test_msgpack_frames_put_numbers_in_columns():
+    """Floats and ints become float64 and int64 columns; other values stay MessagePack."""
+    update = {
+        "temperature": 21.5, "count": 7, "running": True, "MyArrayVar": [1.0, 2.0, 3.0],
+        "counts": [1, 2, 2 ** 60], "label": "ok", "mixed": [1, 2.5],
+    }
+    frame = msgpack.unpackb(MsgpackEncoder().encode({"event": "update", "type": "delta", "seq": 4, "data": update}))
+
+    assert frame["seq"] == 4
+    assert frame["names"] == ["temperature"]
+    assert array("d", frame["values"]).tolist() == [21.5]
+    assert frame["int_names"] == ["count"]
+    assert array("q", frame["ints"]).tolist() == [7]
+    assert array("d", frame["arrays"]["MyArrayVar"]).tolist() == [1.0, 2.0, 3.0]
+    assert array("q", frame["int_arrays"]["counts"]).tolist() == [1, 2, 2 ** 60]
+    assert frame["data"] == {"running": True, "label": "ok", "mixed": [1, 2.5]}
+
+def test_delta_encoding_is_shared_between_clients():
+    encoder = JsonEncoder()
+    update = {"a": 1.5}
+    payload = encoder.encode_delta(3, update)
+    assert encoder.encode_delta(3, update) is payload
+    assert encoder.encode_delta(3, {"a": 1.5}) is not payload
+    assert payload == '{"event": "update", "type": "delta", "seq": 3, "data": {"a": 1.5}}'
+
+def test_negotiation_falls_back_to_json():
+    assert negotiate(["other", MSGPACK_SUBPROTOCOL]).binary
+    assert negotiate(["other"]).subprotocol is None
+    assert negotiate(None).subprotocol is None
+
+def test_encoders_must_implement_encode():
+    class Incomplete(FrameEncoder):
+        pass
+    with pytest.raises(TypeError):
+        Incomplete()
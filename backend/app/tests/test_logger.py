@@ -0,0 +1,25 @@
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from common.logger import configure_logging, stop_logging
+from app.config import settings
+from app.utils.logger import get_logger, logging_options
+
+def test_backend_logs_to_its_configured_file(tmp_path, monkeypatch):
+    """The backend's LOG_* settings decide where the shared logging setup writes."""
+    monkeypatch.setattr(settings, "LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LOG_CONSOLE", False)
+    monkeypatch.setattr(settings, "LOG_LEVELS", {"app.tests.quiet": "ERROR"})
+    stop_logging()
+    try:
+        get_logger("app.tests").info("Backend %s", "started")
+        get_logger("app.tests.quiet").warning("Not written")
+        stop_logging()
+        log = (tmp_path / settings.LOG_FILE).read_text()
+        assert "app.tests - INFO - Backend started" in log
+        assert "Not written" not in log
+    finally:
+        monkeypatch.undo()
+        configure_logging(**logging_options())
@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+import pytest
+from app.utils.metrics import REGISTRY
+from common.metrics import MetricsRegistry
+from app.utils.connection_manager import ConnectionManager
+
+def test_histogram_renders_cumulative_buckets():
+    """Observations land in fixed buckets and render as cumulative Prometheus series."""
+    registry = MetricsRegistry()
+    latency = registry.histogram("opcua_client_request_seconds", "Request latency", ["operation"], buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.05, 3.0):
+        latency.labels("read").observe(value)
+
+    assert registry.render().splitlines() == [
+        "# HELP opcua_client_request_seconds Request latency",
+        "# TYPE opcua_client_request_seconds histogram",
+        'opcua_client_request_seconds_bucket{operation="read",le="0.01"} 1',
+        'opcua_client_request_seconds_bucket{operation="read",le="0.1"} 3',
+        'opcua_client_request_seconds_bucket{operation="read",le="+Inf"} 4',
+        'opcua_client_request_seconds_sum{operation="read"} 3.105',
+        'opcua_client_request_seconds_count{operation="read"} 4',
+    ]
+
+def test_counters_and_gauges():
+    registry = MetricsRegistry()
+    notifications = registry.counter("ws_hub_notifications_total", "Notifications")
+    backlog = registry.gauge("ws_client_backlog", "Backlog", ["client"])
+    notifications.inc()
+    notifications.inc(2)
+    backlog.labels(1).set(5)
+
+    assert registry.counter("ws_hub_notifications_total", "Notifications") is notifications
+    lines = registry.render().splitlines()
+    assert "ws_hub_notifications_total 3" in lines
+    assert 'ws_client_backlog{client="1"} 5' in lines
+
+def test_reregistering_a_name_as_another_metric_fails():
+    registry = MetricsRegistry()
+    registry.counter("ws_hub_notifications_total", "Notifications")
+    with pytest.raises(ValueError):
+        registry.gauge("ws_hub_notifications_total", "Notifications")
+    with pytest.raises(ValueError):
+        registry.counter("ws_hub_notifications_total", "Notifications", ["client"])
+
+@pytest.mark.asyncio
+async def test_pool_events_are_counters():
+    manager = ConnectionManager("opc.tcp://pool-events.test:4841", "urn:test", pool_size=1)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            async with manager.acquire():
+                pass
+    lines = REGISTRY.render().splitlines()
+    assert "# TYPE opcua_pool_events_total counter" in lines
+    assert 'opcua_pool_events_total{url="opc.tcp://pool-events.test:4841",event="rejected"} 2' in lines
+    assert manager.stats()["rejected"] == 2
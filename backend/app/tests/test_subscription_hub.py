@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from asyncua import ua
+from app.utils.subscription_hub import HubClient, SubscriptionHub, TagGroup, TagJournal
+from app.utils.tag_settings import SubscriptionSettingsStore
+
+@pytest.mark.asyncio
+async def test_full_queue_conflates_updates():
+    """A full client queue merges new updates into the newest frame instead of growing."""
+    client = HubClient(group=None, maxsize=2, slow_timeout=60)
+    client.put({"a": 1}, 1)
+    client.put({"b": 1}, 2)
+    client.put({"b": 2, "c": 3}, 3)
+    assert client.backlog == 2
+    assert client.conflated == 1
+    assert await client.get() == (1, {"a": 1})
+    assert await client.get() == (3, {"b": 2, "c": 3})
+
+@pytest.mark.asyncio
+async def test_slow_client_is_dropped():
+    """A client that stays backlogged past its timeout is dropped and get() returns None."""
+    client = HubClient(group=None, maxsize=1, slow_timeout=0)
+    client.put({"a": 1})
+    client.put({"a": 2})
+    await asyncio.sleep(0.01)
+    client.put({"a": 3})
+    assert client.dropped
+    assert await client.get() is None
+
+class FakeNotification:
+    def __init__(self, client_handle):
+        self.monitored_item = type("MonitoredItem", (), {"ClientHandle": client_handle, "Value": ua.DataValue()})()
+
+@pytest.mark.asyncio
+async def test_publish_cycle_is_sent_as_one_frame():
+    """Changes delivered together are fanned out as one frame keyed by tag name."""
+    group = TagGroup(None, TagJournal())
+    group.names = {1: "variable1", 2: "variable2"}
+    client = HubClient(group, maxsize=10, slow_timeout=60)
+    group.clients.add(client)
+    group.datachange_notification(None, 1, FakeNotification(1))
+    group.datachange_notification(None, "on", FakeNotification(2))
+    group.datachange_notification(None, 2, FakeNotification(1))
+    await asyncio.sleep(0)
+    assert client.backlog == 1
+    assert await client.get() == (1, {"variable1": 2, "variable2": "on"})
+    assert group.journal.snapshot() == {"variable1": 2, "variable2": "on"}
+
+def test_journal_resumes_from_sequence():
+    """Only tags changed after the client's sequence are resent; unknown sequences need a snapshot."""
+    journal = TagJournal()
+    journal.record({"a": 1, "b": 1, "c": 1})
+    seen = journal.record({"a": 2})
+    journal.record({"b": 2})
+    journal.record({"c": 2})
+
+    assert journal.changes_since(seen, ["a", "b"]) == {"b": 2}
+    assert journal.changes_since(seen) == {"b": 2, "c": 2}
+    assert journal.changes_since(journal.seq) == {}
+    assert journal.changes_since(journal.seq + 1) is None
+    assert journal.snapshot(["a", "missing"]) == {"a": 2}
+    journal.forget(["c"])
+    assert journal.snapshot() == {"a": 2, "b": 2}
+
+class FakeNode:
+    def __init__(self, name):
+        self.nodeid = ua.NodeId(name, 2)
+
+class FakeSubscription:
+    def __init__(self):
+        self.handles = []
+
+    async def create_monitored_items(self, requests):
+        self.handles.extend(request.RequestedParameters.ClientHandle for request in requests)
+        return [1] * len(requests)
+
+class FakeSession:
+    """Primary session whose MyObject gained variables since the group subscribed."""
+    client = object()
+
+    def __init__(self, names):
+        self.nodes = {name: FakeNode(name) for name in names}
+
+    async def get_variables(self):
+        return list(self.nodes.items())
+
+    async def read_data_values(self, nodes):
+        return [ua.DataValue(ua.Variant(node.nodeid.Identifier.upper())) for node in nodes]
+
+class FakeManager:
+    def __init__(self, primary):
+        self.primary = primary
+
+    def add_reconnect_listener(self, callback):
+        pass
+
+    def add_model_change_listener(self, callback):
+        pass
+
+@pytest.mark.asyncio
+async def test_model_change_monitors_and_pushes_only_new_variables(tmp_path):
+    """New variables get monitored items in matching groups and their values are sent as one delta."""
+    hub = SubscriptionHub(FakeManager(FakeSession(["a", "b", "c"])), SubscriptionSettingsStore(tmp_path / "settings.json"))
+    everything = TagGroup(None, hub.journal)
+    filtered = TagGroup(frozenset(["a", "x"]), hub.journal)
+    for group in (everything, filtered):
+        group.names = {1: "a"}
+        group.subscription = FakeSubscription()
+        hub.groups[group.tags] = group
+    client = HubClient(everything)
+    everything.clients.add(client)
+
+    await hub._on_model_change([])
+    await asyncio.sleep(0)
+
+    assert everything.names == {1: "a", 2: "b", 3: "c"}
+    assert everything.subscription.handles == [2, 3]
+    assert filtered.subscription.handles == []
+    assert await client.get() == (1, {"b": "B", "c": "C"})
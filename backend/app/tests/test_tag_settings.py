@@ -0,0 +1,35 @@
+import sys
+import os
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from app.models.config import SubscriptionSettings, SubscriptionConfig
+from app.utils.tag_settings import SubscriptionSettingsStore
+from common.monitoring import monitored_item_request
+from asyncua import ua
+
+def test_settings_persist_and_fall_back_to_default(tmp_path):
+    """Per-tag settings survive a reload and other tags use the defaults."""
+    path = tmp_path / "subscriptions.json"
+    store = SubscriptionSettingsStore(str(path))
+    store.apply(SubscriptionConfig(publishing_interval=250, tags={
+        "temperature": SubscriptionSettings(sampling_interval=100, deadband_type="absolute", deadband_value=0.5),
+    }))
+    store.save()
+
+    reloaded = SubscriptionSettingsStore(str(path))
+    assert reloaded.publishing_interval == 250
+    assert reloaded.get("temperature").deadband_value == 0.5
+    assert reloaded.get("pressure") == SubscriptionSettings()
+
+def test_deadband_adds_data_change_filter():
+    """A deadband turns into a DataChangeFilter on the monitored item request."""
+    tag_settings = SubscriptionSettings(deadband_type="percent", deadband_value=2.0, queue_size=5, discard_oldest=False)
+    request = monitored_item_request(ua.NodeId(1, 2), 7, **tag_settings.model_dump())
+    params = request.RequestedParameters
+    assert params.ClientHandle == 7
+    assert params.QueueSize == 5
+    assert params.DiscardOldest is False
+    assert params.Filter.DeadbandType == 2
+    assert params.Filter.DeadbandValue == 2.0
+    assert not isinstance(monitored_item_request(ua.NodeId(1, 2), 1).RequestedParameters.Filter, ua.DataChangeFilter)
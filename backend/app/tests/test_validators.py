@@ -0,0 +1,31 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timezone
+from asyncua import ua
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from app.utils.validators import to_variant
+
+def test_values_are_encoded_for_the_node_type():
+    """JSON values become Variants of the node's own type, not the Python type."""
+    assert to_variant(42, ua.VariantType.Int32) == ua.Variant(42, ua.VariantType.Int32)
+    assert to_variant("7", ua.VariantType.Int64).VariantType == ua.VariantType.Int64
+    assert to_variant(1, ua.VariantType.Double) == ua.Variant(1.0, ua.VariantType.Double)
+    assert to_variant("true", ua.VariantType.Boolean).Value is True
+    assert to_variant("2024-01-01T00:00:00Z", ua.VariantType.DateTime).Value == datetime(2024, 1, 1, tzinfo=timezone.utc)
+    array = to_variant([1, 2], ua.VariantType.Float, ua.ValueRank.OneDimension)
+    assert array.is_array and array.Value == [1.0, 2.0]
+
+@pytest.mark.parametrize("value, variant_type, value_rank", [
+    (300, ua.VariantType.Byte, -1),
+    (2.5, ua.VariantType.Int32, -1),
+    (True, ua.VariantType.Int16, -1),
+    ("maybe", ua.VariantType.Boolean, -1),
+    ([1, 2], ua.VariantType.Int32, -1),
+    (1, ua.VariantType.Int32, 1),
+])
+def test_invalid_values_are_rejected(value, variant_type, value_rank):
+    with pytest.raises((ValueError, TypeError)):
+        to_variant(value, variant_type, value_rank)
@@ -0,0 +1,113 @@
+import asyncio
+import sys
+import os
+import pytest
+from contextlib import asynccontextmanager
+from asyncua import ua
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+from app.utils.subscription_hub import TagGroup, TagJournal
+from app.utils.value_cache import ValueCache
+from app.routes import data
+
+class FakeClient:
+    """OPC UA session whose server holds a = 5."""
+    async def get_variables(self):
+        return [("a", "a")]
+
+    async def read_data_values(self, nodes):
+        return [ua.DataValue(ua.Variant(5)) for _ in nodes]
+
+class FakeManager:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self, slot):
+        return self.connected
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield FakeClient()
+
+    def add_model_change_listener(self, callback):
+        pass
+
+class FakeHub:
+    def __init__(self):
+        self.manager = FakeManager()
+        self.journal = TagJournal()
+        self.groups = {None: TagGroup(None, self.journal)}
+
+def test_reads_are_served_while_live_and_within_max_age_otherwise():
+    hub = FakeHub()
+    group = hub.groups[None]
+    group.names = {1: "a", 2: "b"}
+    cache = ValueCache(hub)
+    hub.journal.record({"a": 1}, {"a": ua.DataValue(ua.Variant(1))})
+    group._mark_reported(["a"])
+    assert not cache.live
+    assert cache.read() is None
+
+    hub.journal.record({"b": 2}, {"b": ua.DataValue(ua.Variant(2))})
+    group._mark_reported(["b"])
+    cached = cache.read()
+    assert cache.live
+    assert {name: (value, age) for name, (value, _, age) in cached.items()} == {"a": (1, 0.0), "b": (2, 0.0)}
+    assert cache.read(max_age=0) is None
+    assert cache.read(["a", "missing"]) is None
+
+    # Session lost: values are served only as long as they are young enough
+    hub.manager.connected = False
+    assert cache.read() is None
+    assert cache.read(max_age=60)["a"][2] < 60
+    hub.journal.received["a"] -= 120
+    assert cache.read(max_age=60) is None
+    assert cache.read(["b"], max_age=60) is not None
+
+def live_cache():
+    hub = FakeHub()
+    group = hub.groups[None]
+    group.names = {1: "a", 2: "b"}
+    hub.journal.record({"a": 1, "b": 1}, {"a": ua.DataValue(ua.Variant(1)), "b": ua.DataValue(ua.Variant(1))})
+    group._mark_reported(["a", "b"])
+    return ValueCache(hub)
+
+@pytest.mark.asyncio
+async def test_long_poll_returns_only_changes_after_sequence():
+    cache = live_cache()
+    journal = cache.journal
+    assert await cache.changes(journal.seq) == ({}, False)
+
+    poll = asyncio.create_task(cache.changes(journal.seq, wait=5))
+    await asyncio.sleep(0.01)
+    assert not poll.done()
+    journal.record({"b": 2})
+    changes, full = await asyncio.wait_for(poll, 1)
+    assert (changes["b"][0], full) == (2, False)
+    changes, full = await cache.changes(1, epoch="from-another-run")
+    assert (sorted(changes), full) == (["a", "b"], True)
+
+def test_etag_answers_304_until_values_change():
+    cache = live_cache()
+    app = FastAPI()
+    app.include_router(data.router, prefix="/api/data")
+    app.state.values = cache
+    app.state.opcua = cache.hub.manager
+    client = TestClient(app)
+
+    response = client.get("/api/data/")
+    etag = response.headers["ETag"]
+    assert response.json()["source"] == "cache"
+    assert client.get("/api/data/", headers={"If-None-Match": etag}).status_code == 304
+    # max_age=0 always reads the server, even when the ETag matches
+    response = client.get("/api/data/", params={"max_age": 0}, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["source"] == "server"
+    assert response.json()["data"] == {"a": 5}
+    cache.journal.record({"a": 3})
+    response = client.get("/api/data/", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["data"]["a"] == 3
+    delta = client.get("/api/data/", params={"since": response.json()["seq"] - 1}).json()
+    assert delta["data"] == {"a": 3}
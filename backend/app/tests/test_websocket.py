@@ -1,4 +1,5 @@
 import asyncio
+import json
 import websockets
 import pytest
 import sys
@@ -7,6 +8,64 @@ import os
 # Add the project root to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from app.main import app
+from app.routes.websocket import TagStream
+from app.utils.subscription_hub import HubClient, TagGroup, TagJournal
+from starlette.websockets import WebSocketState
+
+class FakeWebSocket:
+    application_state = WebSocketState.CONNECTED
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+class FakeHub:
+    """Hands out hub clients of in-memory tag groups sharing one journal."""
+    def __init__(self):
+        self.journal = TagJournal()
+        self.groups = {}
+
+    async def register(self, tags=None):
+        key = frozenset(tags) if tags else None
+        group = self.groups.setdefault(key, TagGroup(key, self.journal))
+        client = HubClient(group)
+        group.clients.add(client)
+        return client
+
+    async def unregister(self, client):
+        client.close()
+        client.group.clients.discard(client)
+
+@pytest.mark.asyncio
+async def test_snapshot_then_deltas_then_resume():
+    """A subscriber gets a snapshot of its tags, then numbered deltas; a resume only gets what it missed."""
+    hub = FakeHub()
+    hub.journal.record({"a": 1, "b": 1})
+    websocket = FakeWebSocket()
+    stream = TagStream(websocket, hub)
+    await stream.subscribe(["a"])
+    snapshot = websocket.sent[0]
+    assert (snapshot["type"], snapshot["seq"], snapshot["data"]) == ("snapshot", 1, {"a": 1})
+
+    sender = asyncio.create_task(stream.forward_updates())
+    group = stream.hub_client.group
+    group.pending = {"a": 2}
+    group.flush()
+    await asyncio.sleep(0.01)
+    sender.cancel()
+    assert websocket.sent[1] == {"event": "update", "type": "delta", "seq": 2, "data": {"a": 2}}
+    await stream.close()
+
+    hub.journal.record({"b": 2})
+    hub.journal.record({"a": 3})
+    resumed = FakeWebSocket()
+    await TagStream(resumed, hub).subscribe(["a"], since=2, epoch=snapshot["epoch"])
+    assert resumed.sent[0]["type"] == "delta" and resumed.sent[0]["data"] == {"a": 3}
+    other_run = FakeWebSocket()
+    await TagStream(other_run, hub).subscribe(["a"], since=2, epoch="elsewhere")
+    assert other_run.sent[0]["type"] == "snapshot"
 
 @pytest.mark.asyncio
 async def test_websocket_connection():
@@ -0,0 +1,13 @@
+import numpy as np
+
+def samples_to_arrays(data_values) -> tuple:
+    """Convert DataValues into (epoch seconds, values) arrays, skipping samples without a value."""
+    samples = [
+        ((dv.SourceTimestamp or dv.ServerTimestamp).timestamp(), dv.Value.Value)
+        for dv in data_values
+        if dv.Value is not None and dv.Value.Value is not None
+    ]
+    if not samples:
+        return np.empty(0), np.empty(0)
+    timestamps, values = zip(*samples)
+    return np.fromiter(timestamps, dtype=np.float64, count=len(timestamps)), np.asarray(values)
@@ -0,0 +1,262 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, status
+from starlette.requests import HTTPConnection
+from app.config import settings
+from .opcua_client import OPCUAClient, NodeIndex
+from .subscription_hub import SubscriptionHub
+from .value_cache import ValueCache
+from .fleet import Fleet, SEPARATOR
+from .tag_settings import SubscriptionSettingsStore
+from .logger import get_logger
+from .metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+POOL_SESSIONS = REGISTRY.gauge("opcua_pool_sessions", "OPC UA sessions in the pool by state", ["state"])
+POOL_EVENTS = REGISTRY.counter("opcua_pool_events_total", "Connection pool events by pool URL", ["url", "event"])
+
+class ConnectionManager:
+    """App-scoped pool of OPC UA sessions shared by every router.
+
+    All sessions share one NodeIndex, and only the first session watches
+    ModelChangeEvents. A watchdog pings each session and reconnects lost ones
+    with exponential backoff. Requests get the least busy connected session.
+    """
+    def __init__(self, url: str, namespace_uri: str, pool_size: int = 2,
+                 reconnect_min_delay: float = 1.0, reconnect_max_delay: float = 30.0,
+                 watchdog_interval: float = 5.0):
+        self.url = url
+        self.node_index = NodeIndex()
+        self.clients = [
+            OPCUAClient(url, namespace_uri, node_index=self.node_index, track_model_changes=(i == 0))
+            for i in range(max(1, pool_size))
+        ]
+        self.reconnect_min_delay = reconnect_min_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.watchdog_interval = watchdog_interval
+        self._busy = [0] * len(self.clients)
+        self._reconnect_tasks = {}
+        self._watchdog_task = None
+        self._stats = {"acquired": 0, "rejected": 0, "reconnects": 0, "connect_failures": 0}
+        self._started_at = None
+        self._reconnect_listeners = []
+
+    def is_connected(self, slot: int) -> bool:
+        return self.clients[slot].client is not None and slot not in self._reconnect_tasks
+
+    @property
+    def connected(self) -> bool:
+        return any(self.is_connected(slot) for slot in range(len(self.clients)))
+
+    @property
+    def primary(self) -> OPCUAClient:
+        """The first session, which also carries the model change subscription."""
+        return self.clients[0]
+
+    async def start(self):
+        """Connect all sessions concurrently; failed ones keep retrying in the background."""
+        self._started_at = time.monotonic()
+        results = await asyncio.gather(*(client.connect() for client in self.clients), return_exceptions=True)
+        for slot, result in enumerate(results):
+            if isinstance(result, Exception):
+                self._count("connect_failures")
+                self._schedule_reconnect(slot)
+        self._watchdog_task = asyncio.create_task(self._watchdog())
+        logger.info("OPC UA connection pool started with %s sessions to %s", len(self.clients), self.url)
+
+    async def stop(self):
+        """Stop the watchdog and reconnect loops and close every session."""
+        tasks = list(self._reconnect_tasks.values())
+        if self._watchdog_task:
+            tasks.append(self._watchdog_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._reconnect_tasks.clear()
+        self._watchdog_task = None
+        await asyncio.gather(*(client.disconnect() for client in self.clients if client.client is not None),
+                             return_exceptions=True)
+        logger.info("OPC UA connection pool stopped")
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Lend the least busy connected session for the duration of the block."""
+        candidates = [slot for slot in range(len(self.clients)) if self.is_connected(slot)]
+        if not candidates:
+            self._count("rejected")
+            raise ConnectionError("No OPC UA session is connected")
+        slot = min(candidates, key=lambda s: self._busy[s])
+        self._busy[slot] += 1
+        self._count("acquired")
+        try:
+            yield self.clients[slot]
+        finally:
+            self._busy[slot] -= 1
+
+    def stats(self) -> dict:
+        """Pool statistics for health and monitoring endpoints."""
+        return {
+            "url": self.url,
+            "size": len(self.clients),
+            "connected": sum(1 for slot in range(len(self.clients)) if self.is_connected(slot)),
+            "reconnecting": len(self._reconnect_tasks),
+            "in_use": sum(self._busy),
+            "uptime": round(time.monotonic() - self._started_at, 1) if self._started_at else 0.0,
+            **self._stats,
+        }
+
+    def update_metrics(self):
+        """Refresh the pool gauges, called before the metrics are rendered."""
+        stats = self.stats()
+        for state in ("size", "connected", "reconnecting", "in_use"):
+            POOL_SESSIONS.labels(state).set(stats[state])
+
+    def _count(self, event: str):
+        self._stats[event] += 1
+        POOL_EVENTS.labels(self.url, event).inc()
+
+    def add_reconnect_listener(self, callback):
+        """Register an async callback(slot) run after a session has reconnected."""
+        self._reconnect_listeners.append(callback)
+
+    def add_model_change_listener(self, callback):
+        """Register an async callback(changes) run when the server reports an address space change."""
+        self.primary.model_change_listeners.append(callback)
+
+    def _schedule_reconnect(self, slot: int):
+        if slot not in self._reconnect_tasks:
+            self._reconnect_tasks[slot] = asyncio.create_task(self._reconnect(slot))
+
+    async def _reconnect(self, slot: int):
+        """Reconnect one session with exponential backoff and jitter."""
+        client = self.clients[slot]
+        delay = self.reconnect_min_delay
+        try:
+            while True:
+                if client.client is not None:
+                    await client.disconnect()
+                    client.client = None
+                await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                try:
+                    await client.connect()
+                    self._count("reconnects")
+                    logger.info("OPC UA session %s reconnected", slot)
+                    break
+                except Exception as e:
+                    self._count("connect_failures")
+                    logger.warning("OPC UA session %s reconnect failed, retrying in %.1fs: %s", slot, delay * 2, e)
+                    delay = min(delay * 2, self.reconnect_max_delay)
+        finally:
+            self._reconnect_tasks.pop(slot, None)
+        for callback in self._reconnect_listeners:
+            try:
+                await callback(slot)
+            except Exception as e:
+                logger.error("Reconnect listener failed: %s", e)
+
+    async def _watchdog(self):
+        """Ping every connected session and hand broken ones to the reconnect loop."""
+        while True:
+            await asyncio.sleep(self.watchdog_interval)
+            for slot, client in enumerate(self.clients):
+                if not self.is_connected(slot):
+                    continue
+                try:
+                    await asyncio.wait_for(client.client.get_namespace_array(), self.watchdog_interval)
+                except Exception as e:
+                    logger.warning("OPC UA session %s lost: %s", slot, e)
+                    self._schedule_reconnect(slot)
+
+def create_connection_manager() -> ConnectionManager:
+    return ConnectionManager(
+        settings.OPCUA_URL,
+        settings.NAMESPACE_URI,
+        pool_size=settings.OPCUA_POOL_SIZE,
+        reconnect_min_delay=settings.OPCUA_RECONNECT_MIN_DELAY,
+        reconnect_max_delay=settings.OPCUA_RECONNECT_MAX_DELAY,
+        watchdog_interval=settings.OPCUA_WATCHDOG_INTERVAL,
+    )
+
+def create_fleet_manager(url: str) -> ConnectionManager:
+    """Session pool for one fleet server or shard."""
+    return ConnectionManager(
+        url,
+        settings.NAMESPACE_URI,
+        pool_size=settings.FLEET_POOL_SIZE,
+        reconnect_min_delay=settings.OPCUA_RECONNECT_MIN_DELAY,
+        reconnect_max_delay=settings.OPCUA_RECONNECT_MAX_DELAY,
+        watchdog_interval=settings.OPCUA_WATCHDOG_INTERVAL,
+    )
+
+def create_fleet(primary: ConnectionManager) -> Fleet:
+    """Fleet of the app's own pool, named OPCUA_SERVER_NAME, plus a pool per OPCUA_SERVERS entry."""
+    managers = {settings.OPCUA_SERVER_NAME: primary}
+    for name, url in settings.OPCUA_SERVERS.items():
+        if SEPARATOR in name or name in managers:
+            raise ValueError(f"Invalid or duplicate fleet server name {name!r}")
+        managers[name] = create_fleet_manager(url)
+    return Fleet(
+        managers,
+        max_concurrency=settings.FLEET_MAX_CONCURRENCY,
+        timeout=settings.FLEET_REQUEST_TIMEOUT,
+        owned=[name for name in managers if name != settings.OPCUA_SERVER_NAME],
+        manager_factory=create_fleet_manager,
+    )
+
+@asynccontextmanager
+async def opcua_lifespan(app: FastAPI):
+    """FastAPI lifespan owning the connection manager (app.state.opcua), subscription hub (app.state.hub),
+    value cache (app.state.values) and fleet of OPC UA servers (app.state.fleet)."""
+    manager = create_connection_manager()
+    app.state.opcua = manager
+    app.state.hub = SubscriptionHub(
+        manager,
+        SubscriptionSettingsStore(settings.SUBSCRIPTION_SETTINGS_FILE, settings.WS_PUBLISHING_INTERVAL),
+        client_queue_size=settings.WS_CLIENT_QUEUE_SIZE,
+        slow_client_timeout=settings.WS_SLOW_CLIENT_TIMEOUT,
+    )
+    app.state.values = ValueCache(app.state.hub)
+    app.state.fleet = create_fleet(manager)
+    await asyncio.gather(manager.start(), app.state.fleet.start())
+    await app.state.values.start()
+    try:
+        yield
+    finally:
+        await app.state.hub.close()
+        await asyncio.gather(app.state.fleet.stop(), manager.stop())
+
+def get_connection_manager(connection: HTTPConnection) -> ConnectionManager:
+    """Dependency returning the app's connection manager."""
+    return connection.app.state.opcua
+
+def get_subscription_hub(connection: HTTPConnection) -> SubscriptionHub:
+    """Dependency returning the app's WebSocket subscription hub."""
+    return connection.app.state.hub
+
+def get_value_cache(connection: HTTPConnection) -> ValueCache:
+    """Dependency returning the app's live value cache."""
+    return connection.app.state.values
+
+def get_fleet(connection: HTTPConnection) -> Fleet:
+    """Dependency returning the app's fleet of OPC UA servers."""
+    return connection.app.state.fleet
+
+@asynccontextmanager
+async def connected_client(manager: ConnectionManager):
+    """Lend a connected OPC UA session from the pool; fails the request with 503 when none is connected."""
+    if not manager.connected:
+        logger.error("No connected OPC UA session available")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="OPC UA client is not connected."
+        )
+    async with manager.acquire() as client:
+        yield client
+
+async def get_connected_client(connection: HTTPConnection):
+    """Dependency lending a connected OPC UA session from the pool for one request."""
+    async with connected_client(get_connection_manager(connection)) as client:
+        yield client
@@ -0,0 +1,232 @@
+import asyncio
+from urllib.parse import urlsplit
+from asyncua import Client, ua
+from common.shards import SHARD_URI_MARK, shard_of
+from .logger import get_logger
+from .metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+FLEET_REQUESTS = REGISTRY.counter("fleet_requests_total", "Fleet fan-out requests by server and result", ["server", "result"])
+FLEET_REQUEST_SECONDS = REGISTRY.histogram("fleet_request_seconds", "Fleet fan-out request latency by server", ["server"])
+
+# Separates the server name from the tag name in fleet tag names
+SEPARATOR = "/"
+
+def split_name(name: str):
+    """Split "server/tag" into (server, tag); the tag may contain the separator itself."""
+    server, sep, tag = name.partition(SEPARATOR)
+    if not sep or not server or not tag:
+        raise ValueError(f"Fleet tag {name!r} is not of the form server{SEPARATOR}tag")
+    return server, tag
+
+def reachable_url(url: str, via: str) -> str:
+    """url with a wildcard or missing host replaced by the host of via, the URL it was discovered through."""
+    parts = urlsplit(url)
+    if parts.hostname not in (None, "", "0.0.0.0", "::"):
+        return url
+    return f"{parts.scheme}://{urlsplit(via).hostname}:{parts.port}{parts.path}"
+
+async def find_shards(url: str, timeout: float) -> list:
+    """Endpoint URLs of the shard workers behind the supervisor at url, by shard index; [] if not sharded."""
+    servers = await asyncio.wait_for(Client(url, timeout=timeout).connect_and_find_servers(), timeout)
+    shards = {}
+    for server in servers:
+        _, mark, index = server.ApplicationUri.rpartition(SHARD_URI_MARK)
+        if mark and index.isdigit() and server.DiscoveryUrls:
+            shards[int(index)] = reachable_url(server.DiscoveryUrls[0], url)
+    if sorted(shards) != list(range(len(shards))):
+        logger.warning("Ignoring incomplete shard list from %s: %s", url, sorted(shards))
+        return []
+    return [shards[index] for index in range(len(shards))]
+
+class Fleet:
+    """Named OPC UA servers read and written through one API.
+
+    Every server has its own ConnectionManager, so sessions, watchdogs and
+    reconnect backoff are independent: a Pi that is down only fails its own
+    share of a request. Tags are exposed as "server/tag". Reads and writes
+    are fanned out to the servers concurrently; each endpoint allows at most
+    max_concurrency requests in flight and each request is bounded by
+    timeout seconds.
+
+    A server URL may point at the supervisor of a sharded OPC UA server. The
+    shard workers found with FindServers get a ConnectionManager each from
+    manager_factory(url), and the server's tags are the union of theirs:
+    reads merge the shards and writes go to the shard each tag hashes to.
+    Discovery runs at start and again whenever a session to the server or
+    one of its shards reconnects, so a Pi that was down at start, or came
+    back with a different number of workers, gets its shard managers
+    rebuilt.
+    """
+    def __init__(self, managers: dict, max_concurrency: int = 4, timeout: float = 5.0, owned=None,
+                 manager_factory=None):
+        self.managers = managers
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.manager_factory = manager_factory
+        self.shards = {}  # Server name -> ConnectionManager per shard, for sharded servers
+        self._limits = {}  # Endpoint label -> semaphore
+        self._discovery_locks = {}  # Server name -> lock serializing its discovery runs
+        self._started = False
+        # Managers started and stopped by the fleet; the others belong to the app
+        self._owned = set(managers if owned is None else owned)
+
+    async def start(self):
+        """Discover sharded servers, then connect every endpoint concurrently.
+
+        Unreachable endpoints keep retrying in the background. A sharded
+        server's own session is kept too: its reconnects trigger discovery.
+        """
+        if self.manager_factory is not None:
+            await asyncio.gather(*(self._discover(name) for name in self._owned))
+            for name in self._owned:
+                self._watch(name, self.managers[name])
+        self._started = True
+        await asyncio.gather(*(manager.start() for name in self._owned for manager in self._run_by_fleet(name)))
+        logger.info("OPC UA fleet started with %d servers (%d sharded)", len(self.managers), len(self.shards))
+
+    async def stop(self):
+        self._started = False
+        await asyncio.gather(*(manager.stop() for name in self._owned for manager in self._run_by_fleet(name)),
+                             return_exceptions=True)
+
+    def _run_by_fleet(self, server: str) -> list:
+        """The server's own manager and those of its shards."""
+        return [self.managers[server]] + self.shards.get(server, [])
+
+    def _watch(self, server: str, manager):
+        """Rediscover the shards of server whenever a session of manager reconnects."""
+        async def rediscover(slot):
+            await self._discover(server)
+        manager.add_reconnect_listener(rediscover)
+
+    async def _discover(self, server: str):
+        """Look up the shards behind server and replace its shard managers if they changed.
+
+        A failed lookup keeps the current shards, or none.
+        """
+        async with self._discovery_locks.setdefault(server, asyncio.Lock()):
+            url = self.managers[server].url
+            try:
+                urls = await find_shards(url, self.timeout)
+            except Exception as e:
+                logger.warning("Shard discovery at %s failed, keeping %d shards: %s",
+                               url, len(self.shards.get(server, [])), e)
+                return
+            old = self.shards.get(server, [])
+            if urls == [manager.url for manager in old]:
+                return
+            shards = [self.manager_factory(shard_url) for shard_url in urls]
+            for manager in shards:
+                self._watch(server, manager)
+            if self._started:
+                await asyncio.gather(*(manager.start() for manager in shards))
+            if shards:
+                self.shards[server] = shards
+            else:
+                self.shards.pop(server, None)
+            for label in [label for label in self._limits if label.startswith(f"{server}#")]:
+                del self._limits[label]
+            if old and self._started:
+                await asyncio.gather(*(manager.stop() for manager in old), return_exceptions=True)
+            logger.info("Server %s has %d shards (had %d)", server, len(shards), len(old))
+
+    def endpoints(self, server: str) -> list:
+        """(label, manager) of every endpoint serving server: its shards, or the server itself."""
+        shards = self.shards.get(server)
+        if shards:
+            return [(f"{server}#{index}", manager) for index, manager in enumerate(shards)]
+        return [(server, self.managers[server])]
+
+    async def call(self, label: str, manager, operation):
+        """Run async operation(client) on a session of manager under its concurrency limit and timeout."""
+        limit = self._limits.get(label)
+        if limit is None:
+            limit = self._limits[label] = asyncio.Semaphore(self.max_concurrency)
+        async with limit:
+            with FLEET_REQUEST_SECONDS.labels(label).time():
+                try:
+                    async with manager.acquire() as client:
+                        result = await asyncio.wait_for(operation(client), self.timeout)
+                except Exception:
+                    FLEET_REQUESTS.labels(label, "error").inc()
+                    raise
+        FLEET_REQUESTS.labels(label, "ok").inc()
+        return result
+
+    async def read(self, servers=None):
+        """Read every MyObject variable of servers (all for None).
+
+        Returns ({"server/tag": ua.DataValue}, {endpoint: error message}) for
+        the servers, or shards ("server#index"), that failed or are unknown.
+        """
+        names = list(self.managers) if servers is None else list(servers)
+        errors = {name: "Unknown server" for name in names if name not in self.managers}
+        jobs = [(server, label, manager) for server in names if server in self.managers
+                for label, manager in self.endpoints(server)]
+        results = await asyncio.gather(
+            *(self.call(label, manager, lambda client: client.read_variables()) for _, label, manager in jobs),
+            return_exceptions=True,
+        )
+        data_values = {}
+        for (server, label, _), result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                logger.warning("Fleet read from %s failed: %s", label, describe(result))
+                errors[label] = describe(result)
+                continue
+            for tag, data_value in result.items():
+                data_values[f"{server}{SEPARATOR}{tag}"] = data_value
+        return data_values, errors
+
+    async def write(self, values: dict) -> dict:
+        """Write {"server/tag": value}, one batched Write per server (or shard), concurrently.
+
+        Returns {"server/tag": status code value}. Tags of unknown or failed
+        servers get a Bad code; the other servers' writes are unaffected.
+        """
+        results = {}
+        jobs = {}  # (server, label) -> (manager, {tag: value})
+        for name, value in values.items():
+            try:
+                server, tag = split_name(name)
+            except ValueError:
+                results[name] = ua.StatusCodes.BadNodeIdInvalid
+                continue
+            if server not in self.managers:
+                results[name] = ua.StatusCodes.BadServerNameMissing
+                continue
+            endpoints = self.endpoints(server)
+            label, manager = endpoints[shard_of(tag, len(endpoints))]
+            jobs.setdefault((server, label), (manager, {}))[1][tag] = value
+        keys = list(jobs)
+        outcomes = await asyncio.gather(
+            *(self.call(label, jobs[server, label][0],
+                        lambda client, tags=jobs[server, label][1]: client.write_variables(tags))
+              for server, label in keys),
+            return_exceptions=True,
+        )
+        for (server, label), outcome in zip(keys, outcomes):
+            if isinstance(outcome, BaseException):
+                logger.warning("Fleet write to %s failed: %s", label, describe(outcome))
+                code = ua.StatusCodes.BadTimeout if isinstance(outcome, asyncio.TimeoutError) \
+                    else ua.StatusCodes.BadServerNotConnected
+                outcome = dict.fromkeys(jobs[server, label][1], code)
+            for tag, code in outcome.items():
+                results[f"{server}{SEPARATOR}{tag}"] = code
+        return results
+
+    def stats(self) -> dict:
+        """Connection pool statistics of every server, per shard for sharded servers."""
+        stats = {}
+        for name, manager in self.managers.items():
+            if name in self.shards:
+                stats[name] = {"url": manager.url, "shards": [shard.stats() for shard in self.shards[name]]}
+            else:
+                stats[name] = manager.stats()
+        return stats
+
+def describe(error: BaseException) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "Timed out"
+    return str(error) or type(error).__name__
@@ -0,0 +1,129 @@
+import json
+import sys
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+import msgpack
+
+# WebSocket subprotocol a client requests for binary frames
+MSGPACK_SUBPROTOCOL = "opcua.msgpack.v1"
+
+# Integers an int64 column holds
+INT64_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+def column_bytes(typecode: str, values) -> bytes:
+    """Little-endian array of values ("d" float64, "q" int64)."""
+    column = array(typecode, values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tobytes()
+
+def is_float(value) -> bool:
+    return type(value) is float
+
+def is_int(value) -> bool:
+    return type(value) is int and INT64_RANGE[0] <= value <= INT64_RANGE[1]
+
+class FrameEncoder(ABC):
+    """Encodes outgoing WebSocket messages for one wire format.
+
+    Delta frames of a tag group are the same for every client in it, so their
+    encoding is kept for the most recent frames and reused for the other
+    clients instead of being serialized once per client.
+    """
+    subprotocol = None
+    binary = False
+
+    def __init__(self, cache_size: int = 32):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    @abstractmethod
+    def encode(self, message: dict):
+        """The wire frame (str for text frames, bytes for binary) of message."""
+
+    def encode_delta(self, seq: int, update: dict):
+        key = (id(update), seq)
+        cached = self._cache.get(key)
+        # The cache holds a reference to update, so its id cannot be reused meanwhile
+        if cached is not None and cached[0] is update:
+            self._cache.move_to_end(key)
+            return cached[1]
+        payload = self.encode({"event": "update", "type": "delta", "seq": seq, "data": update})
+        self._cache[key] = (update, payload)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return payload
+
+class JsonEncoder(FrameEncoder):
+    """Text frames of JSON objects, the default."""
+    def encode(self, message: dict) -> str:
+        return json.dumps(message, default=str)
+
+class MsgpackEncoder(FrameEncoder):
+    """Binary MessagePack frames with numeric values in columns.
+
+    The data of update frames is split by value type: floats go to "names"
+    plus "values", a little-endian float64 array; integers go to "int_names"
+    plus "ints", a little-endian int64 array; lists of floats or of integers
+    (array tags) go to "arrays" or "int_arrays" as one array per tag;
+    everything else stays in "data" as MessagePack values. The packer and its
+    buffer are reused.
+    """
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    def __init__(self, cache_size: int = 32):
+        super().__init__(cache_size)
+        self.packer = msgpack.Packer(default=str, autoreset=True)
+
+    def encode(self, message: dict) -> bytes:
+        data = message.get("data")
+        if message.get("event") == "update" and data:
+            message = {**message, **self.columns(data)}
+        return self.packer.pack(message)
+
+    @staticmethod
+    def columns(data: dict) -> dict:
+        names, values = [], []
+        int_names, ints = [], []
+        arrays = {}
+        int_arrays = {}
+        other = {}
+        for name, value in data.items():
+            if is_float(value):
+                names.append(name)
+                values.append(value)
+            elif is_int(value):
+                int_names.append(name)
+                ints.append(value)
+            elif type(value) is list and value and all(is_float(item) for item in value):
+                arrays[name] = column_bytes("d", value)
+            elif type(value) is list and value and all(is_int(item) for item in value):
+                int_arrays[name] = column_bytes("q", value)
+            else:
+                other[name] = value
+        columns = {"data": other}
+        if names:
+            columns["names"] = names
+            columns["values"] = column_bytes("d", values)
+        if int_names:
+            columns["int_names"] = int_names
+            columns["ints"] = column_bytes("q", ints)
+        if arrays:
+            columns["arrays"] = arrays
+        if int_arrays:
+            columns["int_arrays"] = int_arrays
+        return columns
+
+ENCODERS = {
+    None: JsonEncoder(),
+    MSGPACK_SUBPROTOCOL: MsgpackEncoder(),
+}
+
+def negotiate(subprotocols) -> FrameEncoder:
+    """Pick the first subprotocol the client offered that we support, else JSON."""
+    for subprotocol in subprotocols or ():
+        if subprotocol in ENCODERS:
+            return ENCODERS[subprotocol]
+    return ENCODERS[None]
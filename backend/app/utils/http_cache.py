@@ -0,0 +1,15 @@
+from fastapi import Request, Response
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match lists etag (weak comparison) or is *."""
+    header = request.headers.get("if-none-match")
+    if not header or etag is None:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
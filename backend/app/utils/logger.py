@@ -1,27 +1,23 @@
 import logging
-import sys
-from datetime import datetime
+import os
+from common.logger import configure_logging
+from app.config import settings
+
+def logging_options() -> dict:
+    """configure_logging arguments from the LOG_* settings."""
+    return {
+        "path": os.path.join(settings.LOG_DIR, settings.LOG_FILE),
+        "level": settings.LOG_LEVEL,
+        "levels": settings.LOG_LEVELS,
+        "max_bytes": settings.LOG_MAX_BYTES,
+        "backup_count": settings.LOG_BACKUP_COUNT,
+        "console": settings.LOG_CONSOLE,
+        "queue_size": settings.LOG_QUEUE_SIZE,
+        "sample_limit": settings.LOG_SAMPLE_LIMIT,
+        "sample_interval": settings.LOG_SAMPLE_INTERVAL,
+    }
 
 def get_logger(name):
-    """Create and return a logger instance with a specific format."""
-    logger = logging.getLogger(name)
-    if not logger.handlers:
-        # Set logging level
-        logger.setLevel(logging.INFO)
-        
-        # Create handlers
-        file_handler = logging.FileHandler(f"../logs/backend_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-        console_handler = logging.StreamHandler(sys.stdout)
-        
-        # Create formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        
-        # Add formatter to handlers
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-        
-        # Add handlers to logger
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+    """Return a logger whose records go through the shared queue."""
+    configure_logging(**logging_options())
+    return logging.getLogger(name)
@@ -0,0 +1,4 @@
+from common.metrics import MetricsRegistry
+
+# Metrics of this process, served by GET /metrics
+REGISTRY = MetricsRegistry()
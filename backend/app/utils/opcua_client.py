@@ -1,18 +1,101 @@
+import asyncio
+import json
 from asyncua import Client, ua
+from asyncua.common.ua_utils import data_type_to_variant_type
+from common.nodes import MY_OBJECT, build_variable_item
 from .logger import get_logger
+from .metrics import REGISTRY
+from .validators import to_variant
 
 logger = get_logger(__name__)
 
+# Upper bound on NodesToRead per Read request; larger tag sets are split into
+# consecutive requests of this size to stay under server operation limits.
+MAX_NODES_PER_REQUEST = 1000
+# AddNodesItems per AddNodes request. Servers do far more work per added node
+# than per read one, so requests are kept small enough to finish well within
+# the client's request timeout.
+ADD_NODES_PER_REQUEST = 250
+# Variables per TagStore.AddVariables call; the server also subscribes and
+# historizes each new variable before the call returns
+STORE_VARIABLES_PER_CALL = 500
+
+# Browse path of the object holding all tags, relative to the Objects folder
+MY_OBJECT_PATH = MY_OBJECT
+# Server object whose methods give access to the server's tag store
+TAG_STORE_PATH = "TagStore"
+# Server object whose methods run historian queries on the server
+HISTORIAN_PATH = "Historian"
+# Publishing interval (ms) of the model change event subscription; events are
+# rare, so a short interval costs nothing and keeps new tags live at once
+MODEL_CHANGE_INTERVAL = 100
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "opcua_client_request_seconds", "Latency of OPC UA requests made by the backend", ["operation"]
+)
+REQUEST_ERRORS = REGISTRY.counter(
+    "opcua_client_request_errors_total", "Failed OPC UA requests made by the backend", ["operation"]
+)
+
+# Highest NodeId of the ns=0 built-in DataTypes, whose ids equal their VariantType
+MAX_BUILTIN_DATA_TYPE = 25
+
+class NodeIndex:
+    """Lazily filled browse-path -> NodeId index plus a cache of namespace indices.
+
+    Paths are slash separated browse names below the Objects folder in the
+    configured namespace, e.g. "MyObject" or "MyObject/variable1". types maps
+    a variable's NodeId to its (VariantType, ValueRank) for encoding writes.
+    """
+    def __init__(self):
+        self.namespaces = {}
+        self.node_ids = {}
+        self.children = {}
+        self.types = {}
+
+    def clear(self):
+        """Drop every cached entry; the next lookup browses the server again."""
+        self.namespaces.clear()
+        self.node_ids.clear()
+        self.children.clear()
+        self.types.clear()
+
+class ModelChangeHandler:
+    """Subscription handler invalidating a NodeIndex on address space changes.
+
+    Afterwards every listener, an async callback(changes) getting the
+    event's ModelChangeStructureDataType list, runs in its own task.
+    """
+    def __init__(self, node_index: NodeIndex, listeners: list):
+        self.node_index = node_index
+        self.listeners = listeners
+        self.tasks = set()
+
+    def event_notification(self, event):
+        changes = getattr(event, "Changes", None) or []
+        logger.info("Address space changed (%s nodes), invalidating node index", len(changes))
+        self.node_index.clear()
+        for callback in self.listeners:
+            task = asyncio.get_running_loop().create_task(callback(changes))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
 class OPCUAClient:
-    def __init__(self, url: str, namespace_uri: str):
+    def __init__(self, url: str, namespace_uri: str, max_nodes_per_request: int = MAX_NODES_PER_REQUEST,
+                 node_index: NodeIndex = None, track_model_changes: bool = True):
         self.url = url
         self.client = None
         self.namespace_uri = namespace_uri
+        self.max_nodes_per_request = max_nodes_per_request
+        self.node_index = node_index if node_index is not None else NodeIndex()
+        self.track_model_changes = track_model_changes
+        self.model_subscription = None
+        self.model_change_listeners = []
 
     async def connect(self):
         """Establish connection to the OPCUA server."""
         try:
-            logger.info(f"Connecting to OPCUA server at {self.url}")
+            logger.info("Connecting to OPCUA server at %s", self.url)
             self.client = Client(url=self.url)
             
             # Set up security policy for username/password authentication
@@ -23,106 +106,408 @@ class OPCUAClient:
             self.client.set_user("admin")
             self.client.set_password("admin123")
             
-            await self.client.connect()
-            logger.info(f"Connected to OPCUA server at {self.url}")
+            with REQUEST_SECONDS.labels("connect").time():
+                await self.client.connect()
+            logger.info("Connected to OPCUA server at %s", self.url)
         except Exception as e:
-            logger.error(f"Failed to connect to OPCUA server: {str(e)}")
+            REQUEST_ERRORS.labels("connect").inc()
+            logger.error("Failed to connect to OPCUA server: %s", e)
             self.client = None  # Ensure client is reset on failure
             raise
+        if self.track_model_changes:
+            await self.watch_model_changes()
 
     async def disconnect(self):
         """Disconnect from the OPCUA server."""
         try:
+            self.model_subscription = None
+            self.node_index.clear()
             await self.client.disconnect()
             logger.info("Disconnected from OPCUA server")
         except Exception as e:
-            logger.error(f"Error disconnecting from OPCUA server: {str(e)}")
+            logger.error("Error disconnecting from OPCUA server: %s", e)
+
+    async def watch_model_changes(self):
+        """Invalidate the node index whenever the server reports a ModelChangeEvent."""
+        try:
+            handler = ModelChangeHandler(self.node_index, self.model_change_listeners)
+            self.model_subscription = await self.client.create_subscription(MODEL_CHANGE_INTERVAL, handler)
+            await self.model_subscription.subscribe_events(
+                ua.ObjectIds.Server, [ua.ObjectIds.BaseModelChangeEventType, ua.ObjectIds.GeneralModelChangeEventType]
+            )
+            logger.info("Watching server for model changes")
+        except Exception as e:
+            # The index still works without it; POST /api/config/refresh invalidates explicitly
+            logger.warning("Could not subscribe to model change events: %s", e)
+
+    async def get_namespace_index(self, namespace_uri: str = None):
+        """Get the index of the namespace, cached after the first lookup."""
+        namespace_uri = namespace_uri or self.namespace_uri
+        try:
+            idx = self.node_index.namespaces.get(namespace_uri)
+            if idx is None:
+                with REQUEST_SECONDS.labels("read").time():
+                    idx = await self.client.get_namespace_index(namespace_uri)
+                self.node_index.namespaces[namespace_uri] = idx
+            return idx
+        except Exception as e:
+            REQUEST_ERRORS.labels("read").inc()
+            logger.error("Error getting namespace index: %s", e)
+            raise
 
-    async def get_namespace_index(self):
-        """Get the index of the namespace."""
+    async def get_node_by_path(self, path: str):
+        """Resolve a browse path below the Objects folder, browsing the server only on a cache miss."""
+        node_id = self.node_index.node_ids.get(path)
+        if node_id is not None:
+            return self.client.get_node(node_id)
         try:
-            return await self.client.get_namespace_index(self.namespace_uri)
+            idx = await self.get_namespace_index()
+            with REQUEST_SECONDS.labels("browse").time():
+                node = await self.client.get_objects_node().get_child([f"{idx}:{name}" for name in path.split("/")])
+            self.node_index.node_ids[path] = node.nodeid
+            return node
         except Exception as e:
-            logger.error(f"Error getting namespace index: {str(e)}")
+            REQUEST_ERRORS.labels("browse").inc()
+            logger.error("Error resolving browse path %s: %s", path, e)
             raise
 
+    async def get_variables(self, path: str = MY_OBJECT_PATH):
+        """Return cached (name, node) pairs for the variables below the object at path."""
+        children = self.node_index.children.get(path)
+        if children is None:
+            parent = await self.get_node_by_path(path)
+            children = [(name, node.nodeid) for name, node in await self.browse_variables(parent)]
+            self.node_index.children[path] = children
+            for name, node_id in children:
+                self.node_index.node_ids[f"{path}/{name}"] = node_id
+        return [(name, self.client.get_node(node_id)) for name, node_id in children]
+
+    async def refresh_index(self):
+        """Drop the node index and rebuild it for MyObject. Returns the number of indexed variables."""
+        self.node_index.clear()
+        return len(await self.get_variables())
+
     async def get_objects_node(self):
         """Get the objects node from the OPCUA server."""
         try:
             return self.client.get_objects_node()
         except Exception as e:
-            logger.error(f"Error getting objects node: {str(e)}")
+            logger.error("Error getting objects node: %s", e)
             raise
 
     async def write_value(self, node_id: str, value: any):
         """Write a value to a specific node in the OPCUA server."""
         try:
             node = self.client.get_node(node_id)
-            await node.set_value(value)
-            logger.info(f"Wrote value {value} to node {node_id}")
+            with REQUEST_SECONDS.labels("write").time():
+                await node.set_value(value)
+            logger.debug("Wrote value %s to node %s", value, node_id)
         except Exception as e:
-            logger.error(f"Error writing value to {node_id}: {str(e)}")
+            REQUEST_ERRORS.labels("write").inc()
+            logger.error("Error writing value to %s: %s", node_id, e)
             raise
 
     async def read_value(self, node_id: str):
         """Read a value from a specific node in the OPCUA server."""
         try:
             node = self.client.get_node(node_id)
-            value = await node.get_value()
-            logger.info(f"Read value {value} from node {node_id}")
+            with REQUEST_SECONDS.labels("read").time():
+                value = await node.get_value()
+            logger.debug("Read value %s from node %s", value, node_id)
             return value
         except Exception as e:
-            logger.error(f"Error reading value from {node_id}: {str(e)}")
+            REQUEST_ERRORS.labels("read").inc()
+            logger.error("Error reading value from %s: %s", node_id, e)
+            raise
+
+    async def browse_variables(self, parent):
+        """Return (name, node) pairs for the variables below parent using a single Browse call."""
+        try:
+            with REQUEST_SECONDS.labels("browse").time():
+                refs = await parent.get_children_descriptions(nodeclassmask=ua.NodeClass.Variable)
+            return [(ref.BrowseName.Name, self.client.get_node(ref.NodeId)) for ref in refs]
+        except Exception as e:
+            REQUEST_ERRORS.labels("browse").inc()
+            logger.error("Error browsing variables of %s: %s", parent, e)
+            raise
+
+    async def read_data_values(self, nodes: list):
+        """Read the Value attribute of many nodes with batched Read service calls.
+
+        Returns one ua.DataValue per node, in order, carrying the status code and
+        source/server timestamps alongside the value.
+        """
+        try:
+            results = []
+            step = self.max_nodes_per_request
+            for start in range(0, len(nodes), step):
+                with REQUEST_SECONDS.labels("read").time():
+                    results.extend(await self.client.read_attributes(nodes[start:start + step], ua.AttributeIds.Value))
+            return results
+        except Exception as e:
+            REQUEST_ERRORS.labels("read").inc()
+            logger.error("Error reading values of %s nodes: %s", len(nodes), e)
+            raise
+
+    async def get_variable_types(self, nodes: list) -> list:
+        """Return the (VariantType, ValueRank) of each variable node, in order.
+
+        DataType and ValueRank are read once per node, in batched Read calls,
+        and cached in the node index until the address space changes.
+        """
+        types = self.node_index.types
+        missing = list({node.nodeid: node for node in nodes if node.nodeid not in types}.values())
+        try:
+            step = max(1, self.max_nodes_per_request // 2)
+            for start in range(0, len(missing), step):
+                chunk = missing[start:start + step]
+                params = ua.ReadParameters()
+                for node in chunk:
+                    for attribute in (ua.AttributeIds.DataType, ua.AttributeIds.ValueRank):
+                        rv = ua.ReadValueId()
+                        rv.NodeId = node.nodeid
+                        rv.AttributeId = attribute
+                        params.NodesToRead.append(rv)
+                with REQUEST_SECONDS.labels("read").time():
+                    results = await self.client.uaclient.read(params)
+                for i, node in enumerate(chunk):
+                    data_type, value_rank = results[2 * i], results[2 * i + 1]
+                    data_type.StatusCode.check()
+                    types[node.nodeid] = (
+                        await self.variant_type_of(data_type.Value.Value),
+                        value_rank.Value.Value if value_rank.StatusCode.is_good() else ua.ValueRank.Any,
+                    )
+            return [types[node.nodeid] for node in nodes]
+        except Exception as e:
+            REQUEST_ERRORS.labels("read").inc()
+            logger.error("Error reading data types of %s nodes: %s", len(missing), e)
+            raise
+
+    async def variant_type_of(self, data_type: ua.NodeId) -> ua.VariantType:
+        """Map a DataType NodeId to the VariantType used to encode its values."""
+        if data_type.NamespaceIndex == 0 and isinstance(data_type.Identifier, int) \
+                and 0 < data_type.Identifier <= MAX_BUILTIN_DATA_TYPE:
+            return ua.VariantType(data_type.Identifier)
+        # Enumerations, structures and subtypes need the type hierarchy browsed
+        return await data_type_to_variant_type(self.client.get_node(data_type))
+
+    async def write_data_values(self, nodes: list, values: list) -> list:
+        """Write the Value attribute of many nodes with batched Write service calls.
+
+        values are ua.Variant or ua.DataValue objects. Returns one ua.StatusCode
+        per node, in order, without raising on per-node failures.
+        """
+        try:
+            results = []
+            step = self.max_nodes_per_request
+            for start in range(0, len(nodes), step):
+                with REQUEST_SECONDS.labels("write").time():
+                    results.extend(await self.client.write_values(
+                        nodes[start:start + step], values[start:start + step], raise_on_partial_error=False
+                    ))
+            return results
+        except Exception as e:
+            REQUEST_ERRORS.labels("write").inc()
+            logger.error("Error writing values of %s nodes: %s", len(nodes), e)
             raise
 
-    async def add_namespace_and_variables(self, namespace_uri: str, variables: dict):
-        """Add a namespace and its variables to the OPCUA server."""
+    async def read_variables(self) -> dict:
+        """{name: ua.DataValue} of every MyObject variable, with one batched Read."""
+        variables = await self.get_variables()
+        data_values = await self.read_data_values([node for _, node in variables])
+        return {name: data_value for (name, _), data_value in zip(variables, data_values)}
+
+    async def write_variables(self, values: dict) -> dict:
+        """Write {name: value} to MyObject variables with one batched Write.
+
+        Values are converted to each node's cached DataType/ValueRank. Returns
+        {name: status code value}; unknown tags and unconvertible values get a
+        Bad code and are not written.
+        """
+        nodes = dict(await self.get_variables())
+        results = {name: ua.StatusCodes.BadNodeIdUnknown for name in values if name not in nodes}
+        targets = [(name, nodes[name]) for name in values if name in nodes]
+        types = await self.get_variable_types([node for _, node in targets])
+        writes = []
+        for (name, node), (variant_type, value_rank) in zip(targets, types):
+            try:
+                writes.append((name, node, to_variant(values[name], variant_type, value_rank)))
+            except (ValueError, TypeError) as e:
+                logger.warning("Cannot convert value for %s: %s", name, e)
+                results[name] = ua.StatusCodes.BadTypeMismatch
+        if writes:
+            statuses = await self.write_data_values([node for _, node, _ in writes], [variant for _, _, variant in writes])
+            for (name, _, _), status_code in zip(writes, statuses):
+                results[name] = status_code.value
+        return results
+
+    async def add_namespace_and_variables(self, namespace_uri: str, variables: dict) -> int:
+        """Create variables below MyObject with batched AddNodes calls.
+
+        MyObject is browsed once; variables that already exist get their value
+        written, the others are created writable with the NodeIds the server
+        itself gives them (common.nodes), so no per-node set_writable() or
+        existence probe is needed. Returns the number of variables created.
+        """
         try:
             namespace_idx = await self.get_namespace_index()
-            objects = await self.get_objects_node()
-            logger.info(f"Namespace index: {namespace_idx}")
-            logger.info(f"Objects node: {objects}")
-            # Await the creation of the object
-            myobj = await objects.add_object(namespace_idx, "MyObject")
-            logger.info(f"Created object: {myobj}")
-
-            logger.info(f"Variables: {variables}")
-            for var_name, initial_value in variables.items():
-                logger.debug(f"Processing variable: {var_name} with value {initial_value}")
-
-                # Await the addition of the variable
-                node = await myobj.add_variable(namespace_idx, var_name, initial_value)
-                logger.debug(f"Added variable node: {node}")
-
-                # Set the variable to be writable
-                await node.set_writable(True)
-                logger.info(f"Added variable {var_name} with value {initial_value}")
-        except Exception as e:
-            logger.error(f"Error adding namespace and variables: {str(e)}")
+            try:
+                myobj = await self.get_node_by_path(MY_OBJECT_PATH)
+            except ua.UaError:
+                objects = await self.get_objects_node()
+                myobj = await objects.add_object(
+                    ua.NodeId(MY_OBJECT, namespace_idx), ua.QualifiedName(MY_OBJECT, namespace_idx)
+                )
+                logger.info("Created object: %s", myobj)
+
+            browsed = dict(await self.get_variables())
+            existing = [name for name in variables if name in browsed]
+            names = [name for name in variables if name not in browsed]
+            items = [build_variable_item(myobj.nodeid, namespace_idx, name, variables[name]) for name in names]
+            results = []
+            for start in range(0, len(items), ADD_NODES_PER_REQUEST):
+                with REQUEST_SECONDS.labels("add_nodes").time():
+                    results.extend(await self.client.uaclient.add_nodes(items[start:start + ADD_NODES_PER_REQUEST]))
+            if items:
+                self.node_index.clear()
+            for name, result in zip(names, results):
+                if not result.StatusCode.is_good():
+                    logger.error("Failed to add variable %s: %s", name, result.StatusCode)
+            if existing:
+                nodes = [browsed[name] for name in existing]
+                types = await self.get_variable_types(nodes)
+                values = [to_variant(variables[name], variant_type, value_rank)
+                          for name, (variant_type, value_rank) in zip(existing, types)]
+                for name, status_code in zip(existing, await self.write_data_values(nodes, values)):
+                    if not status_code.is_good():
+                        logger.error("Failed to update variable %s: %s", name, status_code)
+            added = sum(1 for result in results if result.StatusCode.is_good())
+            logger.info("Added %s and updated %s variables", added, len(existing))
+            return added
+        except Exception as e:
+            REQUEST_ERRORS.labels("add_nodes").inc()
+            logger.error("Error adding namespace and variables: %s", e)
             raise
 
     async def get_config(self):
         """Retrieve current namespace and variable configurations."""
         try:
-            namespace_idx = await self.get_namespace_index()
-            myobj = await self.get_objects_node().get_child([f"{namespace_idx}:MyObject"])
+            variables = await self.get_variables()
+            data_values = await self.read_data_values([node for _, node in variables])
             config = {}
-            for node in await myobj.get_children():
-                name = node.get_browse_name().Name
-                value = await node.get_value()
-                config[name] = value
-            logger.info(f"Retrieved config: {config}")
+            for (name, _), data_value in zip(variables, data_values):
+                config[name] = data_value.Value.Value if data_value.Value is not None else None
+            logger.info("Retrieved config: %s", config)
             return config
         except Exception as e:
-            logger.error(f"Error retrieving config: {str(e)}")
+            logger.error("Error retrieving config: %s", e)
+            raise
+
+    async def read_history(self, nodes: list, start, end) -> list:
+        """Read the raw history of many nodes between start and end.
+
+        All nodes go into one HistoryRead request; nodes whose results come back
+        with a continuation point are read again until complete. Returns one
+        list of DataValues per node, in order.
+        """
+        try:
+            details = ua.ReadRawModifiedDetails()
+            details.IsReadModified = False
+            details.StartTime = start
+            details.EndTime = end
+            details.NumValuesPerNode = 0
+            details.ReturnBounds = False
+            history = [[] for _ in nodes]
+            pending = {i: None for i in range(len(nodes))}
+            while pending:
+                items = list(pending.items())[:self.max_nodes_per_request]
+                params = ua.HistoryReadParameters()
+                params.HistoryReadDetails = details
+                params.TimestampsToReturn = ua.TimestampsToReturn.Both
+                params.ReleaseContinuationPoints = False
+                for i, continuation_point in items:
+                    value_id = ua.HistoryReadValueId()
+                    value_id.NodeId = nodes[i].nodeid
+                    value_id.ContinuationPoint = continuation_point
+                    params.NodesToRead.append(value_id)
+                with REQUEST_SECONDS.labels("history_read").time():
+                    results = await self.client.uaclient.history_read(params)
+                for (i, _), result in zip(items, results):
+                    result.StatusCode.check()
+                    if result.HistoryData is not None:
+                        history[i].extend(result.HistoryData.DataValues or [])
+                    if result.ContinuationPoint:
+                        pending[i] = result.ContinuationPoint
+                    else:
+                        del pending[i]
+            return history
+        except Exception as e:
+            REQUEST_ERRORS.labels("history_read").inc()
+            logger.error("Error reading history of %s nodes: %s", len(nodes), e)
+            raise
+
+    async def read_aggregates(self, tags: list, start, end, bucket: float) -> dict:
+        """Have the server's historian aggregate tags into buckets of bucket seconds.
+
+        Returns {tag: columns} with start (epoch seconds), count, min, max, avg
+        and last lists. Raises ua.UaError if the server has no historian.
+        """
+        historian = await self.get_node_by_path(HISTORIAN_PATH)
+        idx = await self.get_namespace_index()
+        with REQUEST_SECONDS.labels("call").time():
+            result = await historian.call_method(
+                f"{idx}:ReadAggregates",
+                json.dumps(tags),
+                ua.Variant(start, ua.VariantType.DateTime),
+                ua.Variant(end, ua.VariantType.DateTime),
+                ua.Variant(float(bucket), ua.VariantType.Double),
+            )
+        return json.loads(result)
+
+    async def add_stored_variables(self, namespace_uri: str, variables: dict) -> int:
+        """Create variables on the server and record them in its tag store.
+
+        The server provisions each call in bulk; large sets are split into
+        calls of STORE_VARIABLES_PER_CALL variables to stay within the request timeout.
+        """
+        try:
+            store = await self.get_node_by_path(TAG_STORE_PATH)
+            idx = await self.get_namespace_index()
+            names = list(variables)
+            count = 0
+            for start in range(0, len(names), STORE_VARIABLES_PER_CALL):
+                chunk = {name: variables[name] for name in names[start:start + STORE_VARIABLES_PER_CALL]}
+                with REQUEST_SECONDS.labels("call").time():
+                    count += await store.call_method(f"{idx}:AddVariables", namespace_uri, json.dumps(chunk))
+            self.node_index.clear()
+            logger.info("Stored %s variables in %s", count, namespace_uri)
+            return count
+        except Exception as e:
+            REQUEST_ERRORS.labels("call").inc()
+            logger.error("Error storing variables: %s", e)
+            raise
+
+    async def get_stored_variables(self) -> dict:
+        """Read the server's tag store as {namespace_uri: {name: value}}."""
+        try:
+            store = await self.get_node_by_path(TAG_STORE_PATH)
+            idx = await self.get_namespace_index()
+            with REQUEST_SECONDS.labels("call").time():
+                stored = await store.call_method(f"{idx}:GetVariables")
+            return json.loads(stored)
+        except Exception as e:
+            REQUEST_ERRORS.labels("call").inc()
+            logger.error("Error reading stored variables: %s", e)
             raise
 
     async def create_subscription(self, interval: int, callback):
         """Create a subscription for real-time updates."""
         try:
-            subscription = await self.client.create_subscription(interval, callback)
+            with REQUEST_SECONDS.labels("create_subscription").time():
+                subscription = await self.client.create_subscription(interval, callback)
             logger.info("Created OPCUA subscription")
             return subscription
         except Exception as e:
-            logger.error(f"Error creating subscription: {str(e)}")
+            REQUEST_ERRORS.labels("create_subscription").inc()
+            logger.error("Error creating subscription: %s", e)
             raise
\ No newline at end of file
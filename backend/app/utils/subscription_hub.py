@@ -0,0 +1,453 @@
+import asyncio
+import itertools
+import time
+import uuid
+from collections import deque
+from asyncua import ua
+from common.monitoring import monitored_item_request
+from .logger import get_logger
+from .metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+NOTIFICATIONS = REGISTRY.counter(
+    "ws_hub_notifications_total", "OPC UA data change notifications received by the WebSocket hub"
+)
+FRAMES = REGISTRY.counter("ws_hub_frames_total", "Update frames fanned out to WebSocket tag groups")
+CONFLATED = REGISTRY.counter("ws_hub_conflated_updates_total", "Updates merged into a full client queue")
+CLIENT_BACKLOG = REGISTRY.gauge("ws_client_backlog", "Frames queued for each WebSocket client", ["client"])
+SUBSCRIPTIONS = REGISTRY.gauge("ws_hub_subscriptions", "Shared OPC UA subscriptions held by the hub")
+CLIENTS = REGISTRY.gauge("ws_hub_clients", "Connected WebSocket clients")
+DROPPED_CLIENTS = REGISTRY.gauge("ws_hub_dropped_clients", "WebSocket clients dropped for falling behind")
+
+_client_ids = itertools.count(1)
+
+class TagJournal:
+    """Latest value and change sequence number of every tag the hub is subscribed to.
+
+    Every fanned-out frame gets the next sequence number, and each tag
+    remembers the sequence of its last change. That is enough to build a
+    snapshot for a new client or the changes since any earlier sequence for a
+    reconnecting one, without keeping a log of past frames. The epoch changes
+    with every backend start, so sequences from another run are rejected.
+    data_values keeps each tag's last ua.DataValue (status code and
+    timestamps) and received the wall clock time it arrived.
+    """
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.values = {}
+        self.versions = {}
+        self.data_values = {}
+        self.received = {}
+        self._changed = None
+
+    def record(self, update: dict, data_values: dict = None) -> int:
+        self.seq += 1
+        for name, value in update.items():
+            self.values[name] = value
+            self.versions[name] = self.seq
+        if data_values:
+            now = time.time()
+            for name, data_value in data_values.items():
+                self.data_values[name] = data_value
+                self.received[name] = now
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+        return self.seq
+
+    async def wait(self, seq: int, timeout: float) -> bool:
+        """Wait up to timeout seconds for a frame after seq; returns whether there is one."""
+        if self.seq > seq:
+            return True
+        # One event per wait round, shared by every waiter
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.seq > seq
+
+    def snapshot(self, tags=None) -> dict:
+        """Current values of tags (every known tag for None)."""
+        if tags is None:
+            return dict(self.values)
+        return {name: self.values[name] for name in tags if name in self.values}
+
+    def changes_since(self, seq: int, tags=None):
+        """Values of tags changed after seq, or None if seq is not from this journal."""
+        if seq < 0 or seq > self.seq:
+            return None
+        names = self.versions if tags is None else tags
+        versions = self.versions
+        return {name: self.values[name] for name in names if versions.get(name, 0) > seq}
+
+    def forget(self, names):
+        """Drop tags no subscription covers any more; their values would go stale.
+
+        A later subscription delivers their current values again with a new
+        sequence number, so resuming clients still receive them.
+        """
+        for name in names:
+            self.values.pop(name, None)
+            self.versions.pop(name, None)
+            self.data_values.pop(name, None)
+            self.received.pop(name, None)
+
+class HubClient:
+    """Bounded per-client update queue fed by the hub.
+
+    Frames are (seq, update) pairs. When the queue is full, new updates are
+    merged into the newest queued frame, which takes the newer sequence number,
+    so the client still converges to the latest values without stalling the
+    hub. A client that stays backlogged longer than slow_timeout is dropped.
+    """
+    def __init__(self, group, maxsize: int = 100, slow_timeout: float = 10.0):
+        self.id = next(_client_ids)
+        self.group = group
+        self.maxsize = maxsize
+        self.slow_timeout = slow_timeout
+        self.frames = deque()
+        self.ready = asyncio.Event()
+        self.dropped = False
+        self.closed = False
+        self.conflated = 0
+        self.backlogged_since = None
+
+    def put(self, update: dict, seq: int = 0):
+        """Queue an update without ever blocking the caller."""
+        if self.dropped or self.closed:
+            return
+        if len(self.frames) < self.maxsize:
+            # The update is shared with the group's other clients (and their
+            # encoded frame); it is only copied when conflated into
+            self.frames.append([seq, update, False])
+            self.backlogged_since = None
+        else:
+            # Conflate into the newest frame so the backlog stays bounded
+            frame = self.frames[-1]
+            if not frame[2]:
+                frame[1] = dict(frame[1])
+                frame[2] = True
+            frame[0] = seq
+            frame[1].update(update)
+            self.conflated += 1
+            CONFLATED.inc()
+            now = time.monotonic()
+            if self.backlogged_since is None:
+                self.backlogged_since = now
+            elif now - self.backlogged_since > self.slow_timeout:
+                logger.warning("Dropping slow WebSocket client after %ss of backlog", self.slow_timeout)
+                self.drop()
+        self.ready.set()
+
+    def drop(self):
+        self.dropped = True
+        self.frames.clear()
+        self.ready.set()
+
+    def close(self):
+        """Stop the client after it left its group, without counting it as dropped."""
+        self.closed = True
+        self.frames.clear()
+        self.ready.set()
+
+    async def get(self):
+        """Wait for the next (seq, update) frame; returns None once the client is dropped or closed."""
+        while not self.frames:
+            if self.dropped or self.closed:
+                return None
+            self.ready.clear()
+            await self.ready.wait()
+        seq, update, _ = self.frames.popleft()
+        return seq, update
+
+    @property
+    def backlog(self) -> int:
+        return len(self.frames)
+
+class TagGroup:
+    """One OPC UA subscription shared by all clients watching the same tag set.
+
+    Tag names are resolved once at subscribe time and keyed by the monitored
+    item's client handle. Changes delivered for one publish response are
+    collected and fanned out as a single frame on the next loop iteration,
+    numbered by the journal when there is one. The group is synced once every
+    monitored tag has reported a value since the subscription was created.
+    """
+    def __init__(self, tags, journal: TagJournal = None):
+        self.tags = tags
+        self.journal = journal
+        self.clients = set()
+        self.names = {}
+        self.subscription = None
+        self.pending = {}
+        self.pending_data_values = {}
+        self.synced = False
+        self._reported = set()
+        self._flush_scheduled = False
+
+    def datachange_notification(self, node, val, data):
+        name = self.names.get(data.monitored_item.ClientHandle)
+        if name is None:
+            return
+        NOTIFICATIONS.inc()
+        self.pending[name] = val
+        self.pending_data_values[name] = data.monitored_item.Value
+        if not self.synced:
+            self._mark_reported([name])
+        self._schedule_flush()
+
+    def push(self, update: dict, data_values: dict = None):
+        """Queue values obtained outside the subscription for the next frame."""
+        self.pending.update(update)
+        if data_values:
+            self.pending_data_values.update(data_values)
+        if not self.synced:
+            self._mark_reported(update)
+        self._schedule_flush()
+
+    def unsync(self):
+        """Forget which tags reported, e.g. after the subscription was (re)created or lost."""
+        self.synced = False
+        self._reported = set()
+
+    def _mark_reported(self, names):
+        self._reported.update(names)
+        if len(self._reported) >= len(self.names):
+            self.synced = True
+            self._reported = set()
+
+    def _schedule_flush(self):
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        """Hand everything collected for this publish cycle to the clients as one frame."""
+        self._flush_scheduled = False
+        update, self.pending = self.pending, {}
+        data_values, self.pending_data_values = self.pending_data_values, {}
+        if not update:
+            return
+        FRAMES.inc()
+        seq = self.journal.record(update, data_values) if self.journal is not None else 0
+        for client in self.clients:
+            client.put(update, seq)
+
+    def status_change_notification(self, status):
+        logger.warning("Subscription status changed: %s", status)
+        self.unsync()
+
+class SubscriptionHub:
+    """In-process fan-out of OPC UA data changes to WebSocket clients.
+
+    Keeps exactly one subscription on the pool's primary session per distinct
+    tag set (None meaning every variable of MyObject) and shares it between all
+    clients requesting that set. Publishing interval and per-tag monitored
+    item parameters come from a SubscriptionSettingsStore. Every frame is
+    recorded in a TagJournal so clients can get a snapshot of their tags and
+    resume from a sequence number after reconnecting. Pinned tag sets keep
+    their subscription without clients, e.g. for the REST value cache.
+    """
+    def __init__(self, manager, tag_settings, client_queue_size: int = 100, slow_client_timeout: float = 10.0):
+        self.manager = manager
+        self.tag_settings = tag_settings
+        self.client_queue_size = client_queue_size
+        self.slow_client_timeout = slow_client_timeout
+        self.groups = {}
+        self.journal = TagJournal()
+        self.pinned = set()
+        self._lock = asyncio.Lock()
+        self.dropped_clients = 0
+        manager.add_reconnect_listener(self._on_reconnect)
+        manager.add_model_change_listener(self._on_model_change)
+
+    async def register(self, tags=None) -> HubClient:
+        """Attach a new client to the subscription for tags, creating it on first use."""
+        key = frozenset(tags) if tags else None
+        async with self._lock:
+            group = await self._group(key)
+            client = HubClient(group, self.client_queue_size, self.slow_client_timeout)
+            group.clients.add(client)
+        logger.info("WebSocket client joined tag group with %s clients", len(group.clients))
+        return client
+
+    async def pin(self, tags=None) -> TagGroup:
+        """Keep the subscription for tags alive with or without clients.
+
+        If the session is down, the group is created once it reconnects.
+        """
+        key = frozenset(tags) if tags else None
+        async with self._lock:
+            self.pinned.add(key)
+            return await self._group(key)
+
+    async def _group(self, key) -> TagGroup:
+        group = self.groups.get(key)
+        if group is None:
+            group = TagGroup(key, self.journal)
+            await self._subscribe(group)
+            self.groups[key] = group
+        return group
+
+    async def unregister(self, client: HubClient):
+        """Detach a client and delete the subscription once its group is empty."""
+        if client.dropped:
+            self.dropped_clients += 1
+        client.close()
+        async with self._lock:
+            group = client.group
+            group.clients.discard(client)
+            if group.clients or group.tags in self.pinned or self.groups.get(group.tags) is not group:
+                return
+            del self.groups[group.tags]
+            await self._unsubscribe(group)
+            covered = set()
+            for other in self.groups.values():
+                covered.update(other.names.values())
+            self.journal.forget(set(group.names.values()) - covered)
+
+    async def refresh(self):
+        """Recreate every shared subscription, e.g. after subscription settings changed."""
+        async with self._lock:
+            for group in self.groups.values():
+                await self._unsubscribe(group)
+                try:
+                    await self._subscribe(group)
+                except Exception as e:
+                    logger.error("Failed to recreate shared subscription: %s", e)
+
+    async def close(self):
+        async with self._lock:
+            for group in self.groups.values():
+                for client in group.clients:
+                    client.drop()
+                await self._unsubscribe(group)
+            self.groups.clear()
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": len(self.groups),
+            "clients": sum(len(group.clients) for group in self.groups.values()),
+            "dropped_clients": self.dropped_clients,
+            "conflated_updates": sum(c.conflated for g in self.groups.values() for c in g.clients),
+            "seq": self.journal.seq,
+        }
+
+    def update_metrics(self):
+        """Refresh the hub's gauges, called before the metrics are rendered."""
+        SUBSCRIPTIONS.set(len(self.groups))
+        CLIENTS.set(sum(len(group.clients) for group in self.groups.values()))
+        DROPPED_CLIENTS.set(self.dropped_clients)
+        CLIENT_BACKLOG.clear()
+        for group in self.groups.values():
+            for client in group.clients:
+                CLIENT_BACKLOG.labels(client.id).set(client.backlog)
+
+    async def _subscribe(self, group: TagGroup):
+        client = self.manager.primary
+        if client.client is None:
+            raise ConnectionError("No OPC UA session is connected")
+        variables = await client.get_variables()
+        if group.tags is not None:
+            variables = [(name, node) for name, node in variables if name in group.tags]
+        group.names = {}
+        group.unsync()
+        group.subscription = await client.create_subscription(self.tag_settings.publishing_interval, group)
+        await self._monitor(group, variables)
+        logger.info("Created shared subscription for %s variables", len(variables))
+
+    async def _monitor(self, group: TagGroup, variables: list):
+        """Add monitored items for (name, node) pairs to the group's subscription."""
+        if not variables:
+            return
+        # Client handles are assigned here so notifications map straight to tag names
+        first = max(group.names, default=0) + 1
+        handles = range(first, first + len(variables))
+        requests = [
+            monitored_item_request(node.nodeid, handle, **self.tag_settings.get(name).model_dump())
+            for handle, (name, node) in zip(handles, variables)
+        ]
+        results = await group.subscription.create_monitored_items(requests)
+        for handle, (name, _), result in zip(handles, variables, results):
+            if isinstance(result, ua.StatusCode):
+                logger.error("Failed to subscribe to %s: %s", name, result)
+            else:
+                group.names[handle] = name
+
+    async def _unsubscribe(self, group: TagGroup):
+        if group.subscription is None:
+            return
+        try:
+            await group.subscription.delete()
+            logger.info("Shared subscription deleted")
+        except Exception as e:
+            logger.error("Error deleting subscription: %s", e)
+        group.subscription = None
+
+    async def _on_model_change(self, changes):
+        """Monitor variables added to MyObject in every group whose tag set includes them.
+
+        Only the new variables get monitored items. Their current values are
+        read at once and sent as an ordinary delta, instead of waiting for the
+        subscription's next publishing cycle.
+        """
+        client = self.manager.primary
+        async with self._lock:
+            if not self.groups or client.client is None:
+                return
+            try:
+                variables = await client.get_variables()
+            except Exception as e:
+                logger.error("Failed to browse variables after a model change: %s", e)
+                return
+            additions = {}
+            for group in self.groups.values():
+                if group.subscription is None:
+                    continue
+                known = set(group.names.values())
+                added = [
+                    (name, node) for name, node in variables
+                    if name not in known and (group.tags is None or name in group.tags)
+                ]
+                if not added:
+                    continue
+                try:
+                    await self._monitor(group, added)
+                except Exception as e:
+                    logger.error("Failed to monitor new variables: %s", e)
+                    continue
+                additions[group] = [name for name, _ in added]
+                logger.info("Added %s new variables to a shared subscription", len(added))
+            if not additions:
+                return
+            nodes = dict(variables)
+            names = sorted({name for added in additions.values() for name in added})
+            try:
+                values = await client.read_data_values([nodes[name] for name in names])
+            except Exception:
+                # The subscriptions' initial notifications deliver them anyway
+                return
+            current = {name: value for name, value in zip(names, values) if value.StatusCode.is_good()}
+            for group, added in additions.items():
+                added = [name for name in added if name in current]
+                group.push({name: current[name].Value.Value for name in added}, {name: current[name] for name in added})
+
+    async def _on_reconnect(self, slot: int):
+        """Recreate every shared subscription after the primary session came back."""
+        if slot != 0:
+            return
+        async with self._lock:
+            for group in self.groups.values():
+                try:
+                    await self._subscribe(group)
+                except Exception as e:
+                    logger.error("Failed to recreate shared subscription: %s", e)
+            for key in self.pinned - self.groups.keys():
+                try:
+                    await self._group(key)
+                except Exception as e:
+                    logger.error("Failed to create pinned subscription: %s", e)
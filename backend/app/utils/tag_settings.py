@@ -0,0 +1,63 @@
+import json
+import os
+from pathlib import Path
+from app.models.config import SubscriptionSettings, SubscriptionConfig
+from .logger import get_logger
+
+logger = get_logger(__name__)
+
+class SubscriptionSettingsStore:
+    """Publishing interval plus per-tag monitored item parameters, persisted as JSON.
+
+    Tags without an entry use the default settings.
+    """
+    def __init__(self, path: str, publishing_interval: int = 500):
+        self.path = Path(path)
+        self.publishing_interval = publishing_interval
+        self.default = SubscriptionSettings()
+        self.tags = {}
+        self.load()
+
+    def load(self):
+        """Load stored settings; missing or unreadable files leave the defaults in place."""
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, 'r') as f:
+                config = SubscriptionConfig(**json.load(f))
+            self.apply(config)
+        except Exception as e:
+            logger.error("Error loading subscription settings from %s: %s", self.path, e)
+
+    def save(self):
+        """Write the settings atomically so a crash never leaves a truncated file."""
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.as_config().model_dump(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def get(self, tag: str) -> SubscriptionSettings:
+        return self.tags.get(tag, self.default)
+
+    def apply(self, config: SubscriptionConfig):
+        """Merge a partial configuration into the current one."""
+        if config.publishing_interval is not None:
+            self.publishing_interval = config.publishing_interval
+        if config.default is not None:
+            self.default = config.default
+        self.tags.update(config.tags)
+
+    def set(self, tag: str, tag_settings: SubscriptionSettings):
+        self.tags[tag] = tag_settings
+
+    def remove(self, tag: str) -> bool:
+        return self.tags.pop(tag, None) is not None
+
+    def as_config(self) -> SubscriptionConfig:
+        return SubscriptionConfig(
+            publishing_interval=self.publishing_interval,
+            default=self.default,
+            tags=dict(self.tags),
+        )
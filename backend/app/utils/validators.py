@@ -0,0 +1,76 @@
+import base64
+from datetime import datetime, timezone
+from asyncua import ua
+
+# Inclusive value ranges of the OPC UA integer types
+INTEGER_RANGES = {
+    ua.VariantType.SByte: (-2**7, 2**7 - 1),
+    ua.VariantType.Byte: (0, 2**8 - 1),
+    ua.VariantType.Int16: (-2**15, 2**15 - 1),
+    ua.VariantType.UInt16: (0, 2**16 - 1),
+    ua.VariantType.Int32: (-2**31, 2**31 - 1),
+    ua.VariantType.UInt32: (0, 2**32 - 1),
+    ua.VariantType.Int64: (-2**63, 2**63 - 1),
+    ua.VariantType.UInt64: (0, 2**64 - 1),
+}
+
+FLOAT_TYPES = {ua.VariantType.Float, ua.VariantType.Double}
+
+def convert_scalar(value, variant_type: ua.VariantType):
+    """Convert a JSON value to the Python value expected for variant_type.
+
+    Raises ValueError or TypeError when the value cannot be represented.
+    """
+    if variant_type == ua.VariantType.Boolean:
+        if isinstance(value, str):
+            if value.lower() in ("true", "1"):
+                return True
+            if value.lower() in ("false", "0"):
+                return False
+            raise ValueError(f"Invalid boolean: {value}")
+        if isinstance(value, (bool, int)) and value in (0, 1):
+            return bool(value)
+        raise ValueError(f"Invalid boolean: {value}")
+    if variant_type in INTEGER_RANGES:
+        if isinstance(value, bool):
+            raise TypeError("Expected a number, got a boolean")
+        if isinstance(value, float):
+            if not value.is_integer():
+                raise ValueError(f"{value} is not an integer")
+        converted = int(value)
+        low, high = INTEGER_RANGES[variant_type]
+        if not low <= converted <= high:
+            raise ValueError(f"{converted} is out of range for {variant_type.name}")
+        return converted
+    if variant_type in FLOAT_TYPES:
+        if isinstance(value, bool):
+            raise TypeError("Expected a number, got a boolean")
+        return float(value)
+    if variant_type == ua.VariantType.String:
+        return str(value)
+    if variant_type == ua.VariantType.DateTime:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return datetime.fromtimestamp(value, timezone.utc)
+        converted = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        return converted if converted.tzinfo else converted.replace(tzinfo=timezone.utc)
+    if variant_type == ua.VariantType.ByteString:
+        return base64.b64decode(value)
+    return value
+
+def to_variant(value, variant_type: ua.VariantType, value_rank: int = -1) -> ua.Variant:
+    """Build a Variant of variant_type from a JSON value.
+
+    Lists are converted element-wise; a list for a scalar node (value_rank -1)
+    or a scalar for an array node (value_rank >= 1) is rejected. Nodes of an
+    abstract DataType (VariantType.Variant) get the type asyncua infers.
+    """
+    if variant_type == ua.VariantType.Variant:
+        # Abstract DataType (BaseDataType, Number, ...): let asyncua pick the encoding
+        return ua.Variant(value)
+    if isinstance(value, list):
+        if value_rank == ua.ValueRank.Scalar:
+            raise TypeError(f"Expected a scalar {variant_type.name}, got a list")
+        return ua.Variant([convert_scalar(item, variant_type) for item in value], variant_type, is_array=True)
+    if value_rank >= ua.ValueRank.OneDimension:
+        raise TypeError(f"Expected an array of {variant_type.name}")
+    return ua.Variant(convert_scalar(value, variant_type), variant_type)
@@ -0,0 +1,122 @@
+import time
+import zlib
+from .subscription_hub import SubscriptionHub
+from .logger import get_logger
+from .metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+CACHE_READS = REGISTRY.counter("value_cache_reads_total", "REST reads of live values by result", ["result"])
+
+class ValueCache:
+    """Live values of every MyObject variable for REST reads, fed by the subscription hub.
+
+    The hub's all-tags subscription is pinned for the lifetime of the app and
+    shared with WebSocket clients asking for every tag, so REST pollers add no
+    load on the server. Values, status codes and timestamps come from the
+    hub's journal. The cache is live while the primary session is connected
+    and every monitored tag has reported since the subscription was created;
+    live values are current up to one publishing interval. Stored variable
+    names for GET /api/config are kept until the server reports a model change.
+
+    The journal's sequence numbers version the cached values: they give the
+    ETags of live responses and let pollers ask for the changes since the
+    sequence they last saw.
+    """
+    def __init__(self, hub: SubscriptionHub):
+        self.hub = hub
+        self._stored_names = None
+        self._stored_names_crc = 0
+        hub.manager.add_model_change_listener(self._on_model_change)
+
+    @property
+    def journal(self):
+        return self.hub.journal
+
+    @property
+    def stored_names(self):
+        return self._stored_names
+
+    @stored_names.setter
+    def stored_names(self, names):
+        self._stored_names = names
+        self._stored_names_crc = zlib.crc32("\n".join(names).encode()) if names is not None else 0
+
+    async def start(self):
+        try:
+            await self.hub.pin()
+        except Exception as e:
+            # Pinned groups are created again once the session reconnects
+            logger.warning("Value cache subscription not created yet: %s", e)
+
+    @property
+    def live(self) -> bool:
+        group = self.hub.groups.get(None)
+        return group is not None and group.synced and self.hub.manager.is_connected(0)
+
+    def read(self, names=None, max_age: float = None):
+        """Cached {name: (value, data_value, age)} for names (every cached tag for None).
+
+        Returns None when the caller has to read the server instead: max_age is
+        0, a tag is missing, or the cache is not live and a value was received
+        longer than max_age seconds ago (or max_age is None). Ages of live
+        values are 0.
+        """
+        journal = self.hub.journal
+        if max_age == 0 or not journal.values:
+            CACHE_READS.labels("miss").inc()
+            return None
+        live = self.live
+        if not live and max_age is None:
+            CACHE_READS.labels("stale").inc()
+            return None
+        if names is None:
+            names = journal.values.keys()
+        now = time.time()
+        values = journal.values
+        data_values = journal.data_values
+        received = journal.received
+        result = {}
+        for name in names:
+            if name not in values:
+                CACHE_READS.labels("miss").inc()
+                return None
+            age = 0.0 if live else now - received.get(name, 0.0)
+            if age > (max_age or 0.0):
+                CACHE_READS.labels("stale").inc()
+                return None
+            result[name] = (values[name], data_values.get(name), age)
+        CACHE_READS.labels("hit").inc()
+        return result
+
+    def etag(self):
+        """ETag of the live values, or None when the cache is not live."""
+        if not self.live:
+            return None
+        return f'"{self.journal.epoch}-{self.journal.seq}"'
+
+    def config_etag(self):
+        """ETag of the stored configuration served from the cache, or None."""
+        if not self.live or self._stored_names is None:
+            return None
+        return f'"{self.journal.epoch}-{self.journal.seq}-{self._stored_names_crc:08x}"'
+
+    async def changes(self, since: int, epoch: str = None, wait: float = 0.0):
+        """Tags changed after sequence since as ({name: (value, data_value)}, full).
+
+        Waits up to wait seconds for a change when there is none yet. full is
+        True when since (or epoch) is not from this journal, e.g. after a
+        backend restart; then every cached tag is returned.
+        """
+        journal = self.journal
+        if (epoch is not None and epoch != journal.epoch) or since > journal.seq:
+            names, full = journal.values.keys(), True
+        else:
+            if wait > 0:
+                await journal.wait(since, wait)
+            names, full = journal.changes_since(since).keys(), False
+        CACHE_READS.labels("changes").inc()
+        return {name: (journal.values[name], journal.data_values.get(name)) for name in names}, full
+
+    async def _on_model_change(self, changes):
+        self.stored_names = None
@@ -0,0 +1,274 @@
+"""Hot path benchmarks: server startup, REST reads and writes, WebSocket fan-out.
+
+Seeds a tag store with --tags variables in a temporary directory and starts
+the OPC UA server in-process from it, then runs the backend app against it:
+
+- startup: OPCUAServer construction plus setup(), once cold (no address
+  space snapshot yet) and once warm (restored from the snapshot)
+- read: GET /api/data/ through an in-process ASGI client
+- write: POST /api/data/ for one tag per request, and POST /api/data/batch
+  writing every tag
+- fanout: --clients real WebSocket connections to the backend served by
+  uvicorn, while the server writes every tag --rate times per second for
+  --duration seconds. Reports tag updates delivered per second across all
+  clients and the write-to-receive latency of one probe tag. With --binary
+  the clients negotiate the MessagePack subprotocol instead of JSON.
+
+REST phases run --concurrency requests at a time and report requests/sec and
+p50/p99 latency. Server, backend and clients share one event loop, so the
+numbers are for comparing commits on the same machine, not absolute capacity.
+Prints one JSON object (also written to --output if given).
+
+    python benchmarks/hotpaths.py --tags 1000 --requests 500 --clients 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "opcua_server"))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+# The backend logger writes to ../logs relative to the working directory
+os.chdir(os.path.join(ROOT, "backend"))
+# The backend connects to the in-process server, over loopback
+os.environ.setdefault("OPCUA_URL", "opc.tcp://127.0.0.1:4841")
+
+import asyncua  # noqa: E402
+import httpx  # noqa: E402
+import msgpack  # noqa: E402
+import uvicorn  # noqa: E402
+import websockets  # noqa: E402
+from config.settings import NAMESPACE_URI, TAG_STORE_PATH  # noqa: E402
+from common.nodes import variable_node_id  # noqa: E402
+from storage import TagStore  # noqa: E402
+import server as opcua_server  # noqa: E402
+from app.main import app  # noqa: E402
+from app.utils.frame_encoding import MSGPACK_SUBPROTOCOL  # noqa: E402
+
+# Tag whose written value is the write time, for end-to-end latency
+PROBE_TAG = "tag0"
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def latency_summary(name, latencies, elapsed, errors=0):
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def seed_tag_store(count):
+    store = TagStore(TAG_STORE_PATH, NAMESPACE_URI)
+    store.open()
+    store.upsert({f"tag{i}": float(i) for i in range(count)}, NAMESPACE_URI)
+    store.close()
+
+async def start_server():
+    """Start the OPC UA server; returns (server, seconds)."""
+    start = time.perf_counter()
+    server = opcua_server.OPCUAServer()
+    await server.setup()
+    return server, time.perf_counter() - start
+
+async def bench_startup():
+    """Cold then warm start; returns (running server, result)."""
+    server, cold = await start_server()
+    await server.stop()
+    server, warm = await start_server()
+    return server, {"cold_seconds": round(cold, 3), "warm_seconds": round(warm, 3)}
+
+async def run_requests(name, count, concurrency, send):
+    """Issue count requests through send(i), concurrency at a time."""
+    latencies = []
+    errors = 0
+    next_index = iter(range(count))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            start = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latency_summary(name, latencies, time.perf_counter() - start, errors)
+
+async def bench_rest(client, args):
+    results = [
+        await run_requests("read", args.requests, args.concurrency, lambda i: client.get("/api/data/")),
+        await run_requests(
+            "write", args.requests, args.concurrency,
+            lambda i: client.post("/api/data/", json={"variable": f"tag{i % args.tags}", "value": i}),
+        ),
+    ]
+    batch = {f"tag{i}": 0.5 for i in range(args.tags)}
+    batch_result = await run_requests(
+        "batch_write", max(1, args.requests // 10), args.concurrency,
+        lambda i: client.post("/api/data/batch", json={"values": batch}),
+    )
+    batch_result["tags_per_sec"] = round(batch_result["requests_per_sec"] * args.tags, 1)
+    results.append(batch_result)
+    return results
+
+def decode_frame(message):
+    """JSON text or columnar MessagePack frame as a dict with the values in "data"."""
+    if isinstance(message, str):
+        return json.loads(message)
+    frame = msgpack.unpackb(message)
+    data = frame.get("data") or {}
+    if "names" in frame:
+        data.update(zip(frame["names"], array("d", frame["values"])))
+    if "int_names" in frame:
+        data.update(zip(frame["int_names"], array("q", frame["ints"])))
+    for name, raw in frame.get("arrays", {}).items():
+        data[name] = array("d", raw).tolist()
+    for name, raw in frame.get("int_arrays", {}).items():
+        data[name] = array("q", raw).tolist()
+    frame["data"] = data
+    return frame
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def bench_fanout(server, args):
+    """Write every tag at --rate Hz and count updates arriving on --clients WebSockets."""
+    port = free_port()
+    # The app's lifespan is already running; uvicorn only serves the sockets
+    web = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    web_task = asyncio.create_task(web.serve())
+    while not web.started:
+        await asyncio.sleep(0.01)
+
+    delivered = [0] * args.clients
+    latencies = []
+    measuring = False
+    ready = [asyncio.Event() for _ in range(args.clients)]
+
+    async def client(slot):
+        subprotocols = [MSGPACK_SUBPROTOCOL] if args.binary else None
+        async with websockets.connect(f"ws://127.0.0.1:{port}/ws", max_size=None, subprotocols=subprotocols) as ws:
+            await ws.send(json.dumps({"action": "subscribe"}))
+            async for message in ws:
+                frame = decode_frame(message)
+                if frame.get("event") != "update":
+                    continue
+                ready[slot].set()
+                if not measuring:
+                    continue
+                data = frame["data"]
+                delivered[slot] += len(data)
+                written = data.get(PROBE_TAG)
+                if isinstance(written, float) and written > 1e9:
+                    latencies.append(time.time() - written)
+
+    clients = [asyncio.create_task(client(slot)) for slot in range(args.clients)]
+    try:
+        # Every client has its initial values, so the shared subscription is live
+        await asyncio.wait_for(asyncio.gather(*(event.wait() for event in ready)), 30)
+        idx = server.namespace
+        node_ids = [variable_node_id(f"tag{i}", idx) for i in range(args.tags)]
+        measuring = True
+        rounds = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.duration:
+            rounds += 1
+            values = [(node_id, float(rounds)) for node_id in node_ids[1:]]
+            values.append((node_ids[0], time.time()))
+            await server.config_handler.write_values(values)
+            await asyncio.sleep(max(0.0, start + rounds / args.rate - time.perf_counter()))
+        # Let the last publish cycle arrive
+        await asyncio.sleep(1.0)
+        elapsed = time.perf_counter() - start
+    finally:
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        web.should_exit = True
+        await web_task
+
+    return {
+        "clients": args.clients,
+        "tags": args.tags,
+        "write_rounds": rounds,
+        "updates_written": rounds * args.tags,
+        "updates_delivered": sum(delivered),
+        "updates_per_sec": round(sum(delivered) / elapsed, 1),
+        "updates_per_client_per_sec": round(sum(delivered) / elapsed / args.clients, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+    }
+
+async def main(args):
+    # Per-request logging would dominate the timings
+    logging.disable(logging.WARNING)
+    os.chdir(tempfile.mkdtemp(prefix="bench-hotpaths-"))
+    seed_tag_store(args.tags)
+    server, startup = await bench_startup()
+    try:
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://backend") as client:
+                rest = await bench_rest(client, args)
+            fanout = await bench_fanout(server, args)
+    finally:
+        await server.stop()
+
+    report = {
+        "benchmark": "hotpaths",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "asyncua": asyncua.__version__,
+        "parameters": vars(args),
+        "startup": startup,
+        "rest": rest,
+        "fanout": fanout,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, default=1000, help="variables seeded into the tag store")
+    parser.add_argument("--requests", type=int, default=500, help="requests per REST phase")
+    parser.add_argument("--concurrency", type=int, default=4, help="REST requests in flight")
+    parser.add_argument("--clients", type=int, default=10, help="WebSocket clients in the fan-out phase")
+    parser.add_argument("--rate", type=float, default=10.0, help="full tag set writes per second during fan-out")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of fan-out measurement")
+    parser.add_argument("--binary", action="store_true", help="WebSocket clients use the MessagePack subprotocol")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    args.output = os.path.abspath(args.output) if args.output else None
+    asyncio.run(main(args))
@@ -0,0 +1,121 @@
+"""Tag provisioning throughput: bulk creation paths versus one node at a time.
+
+Starts the OPC UA server in-process (tag store and historian in a temporary
+directory) for each mode and creates --tags variables:
+
+- server: ConfigHandler.add_namespace_and_variables in-process, as used at startup
+- method: the backend's OPCUAClient.add_stored_variables, i.e. one
+  TagStore.AddVariables call over the wire (what POST /api/config does)
+- addnodes: the backend's OPCUAClient.add_namespace_and_variables, batched
+  AddNodes requests over the wire (fallback for servers without a tag store)
+- baseline: the previous path, an existence probe plus add_variable() and
+  set_writable() per node on asyncua's stock AddNodes service
+
+Every mode includes subscribing and historizing the new variables where the
+server does that. Prints one JSON object with tags/sec per mode.
+
+    python benchmarks/provisioning.py --tags 10000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "opcua_server"))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+# The backend logger writes to ../logs relative to the working directory
+os.chdir(os.path.join(ROOT, "backend"))
+
+from asyncua import ua  # noqa: E402
+from asyncua.server.address_space import NodeManagementService  # noqa: E402
+from common.nodes import variable_node_id  # noqa: E402
+from config.settings import NAMESPACE_URI  # noqa: E402
+import server as opcua_server  # noqa: E402
+from app.utils.opcua_client import OPCUAClient  # noqa: E402
+
+def result(mode, count, elapsed):
+    return {"mode": mode, "tags": count, "seconds": round(elapsed, 3), "tags_per_sec": round(count / elapsed, 1)}
+
+async def bench_server(server, count):
+    variables = {f"server_{i}": float(i) for i in range(count)}
+    start = time.perf_counter()
+    await server.config_handler.add_namespace_and_variables(NAMESPACE_URI, variables)
+    return result("server", count, time.perf_counter() - start)
+
+async def bench_method(url, count):
+    client = OPCUAClient(url, NAMESPACE_URI, track_model_changes=False)
+    await client.connect()
+    try:
+        variables = {f"method_{i}": float(i) for i in range(count)}
+        start = time.perf_counter()
+        await client.add_stored_variables(NAMESPACE_URI, variables)
+        return result("method", count, time.perf_counter() - start)
+    finally:
+        await client.disconnect()
+
+async def bench_addnodes(url, count):
+    client = OPCUAClient(url, NAMESPACE_URI, track_model_changes=False)
+    await client.connect()
+    try:
+        variables = {f"addnodes_{i}": float(i) for i in range(count)}
+        start = time.perf_counter()
+        await client.add_namespace_and_variables(NAMESPACE_URI, variables)
+        return result("addnodes", count, time.perf_counter() - start)
+    finally:
+        await client.disconnect()
+
+async def bench_baseline(server, count):
+    # The previous path: stock asyncua AddNodes, an existence probe, add_variable()
+    # and set_writable() per node, then monitoring/historizing like the other modes
+    iserver = server.server.iserver
+    iserver.node_mgt_service = NodeManagementService(iserver.aspace)
+    idx = server.namespace
+    myobj = await server.server.nodes.objects.get_child([f"{idx}:MyObject"])
+    start = time.perf_counter()
+    added = {}
+    for i in range(count):
+        name = f"baseline_{i}"
+        try:
+            await myobj.get_child([f"{idx}:{name}"])
+        except ua.UaError:
+            node = await myobj.add_variable(variable_node_id(name, idx), ua.QualifiedName(name, idx), float(i))
+            await node.set_writable()
+            added[name] = node
+    await server.monitor_variables(added)
+    return result("baseline", count, time.perf_counter() - start)
+
+async def run_mode(mode, count):
+    """Run one mode against a freshly started server, so every mode starts from the same address space."""
+    os.chdir(tempfile.mkdtemp(prefix="bench-provisioning-"))
+    server = opcua_server.OPCUAServer()
+    await server.setup()
+    try:
+        url = opcua_server.SERVER_URL.replace("0.0.0.0", "127.0.0.1")
+        modes = {
+            "server": lambda: bench_server(server, count),
+            "method": lambda: bench_method(url, count),
+            "addnodes": lambda: bench_addnodes(url, count),
+            "baseline": lambda: bench_baseline(server, count),
+        }
+        return await modes[mode]()
+    finally:
+        await server.stop()
+
+async def main(args):
+    # Per-node INFO logging would dominate the timings
+    logging.disable(logging.WARNING)
+    results = [await run_mode(mode, args.tags) for mode in args.modes.split(",")]
+    print(json.dumps({"benchmark": "provisioning", "results": results}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, default=10000, help="variables created per mode")
+    parser.add_argument("--modes", default="server,method,addnodes,baseline",
+                        help="comma-separated modes to run, in order")
+    asyncio.run(main(parser.parse_args()))
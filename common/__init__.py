@@ -0,0 +1,6 @@
+"""Code shared by the OPC UA server and the backend.
+
+Both put the repository root on sys.path to import this package, so it has
+to be deployed next to opcua_server/ and backend/. Nothing in here reads
+either side's settings; configuration is passed in.
+"""
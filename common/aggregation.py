@@ -0,0 +1,35 @@
+import numpy as np
+
+def bucket_aggregates(timestamps: np.ndarray, values: np.ndarray, start: float, bucket: float) -> dict:
+    """Aggregate time-ordered samples into fixed-width time buckets.
+
+    timestamps are epoch seconds (normally already in ascending order) and
+    values the matching samples. Used by the server's historian and by the
+    backend's raw HistoryRead fallback. Returns arrays with one entry per
+    non-empty bucket: the bucket start time, sample count, min, max, mean
+    and last value. min/max/avg are None when values is not numeric.
+    """
+    if len(timestamps) == 0:
+        empty = np.empty(0)
+        return {"start": empty, "count": empty.astype(np.int64), "min": None, "max": None, "avg": None, "last": []}
+    if np.any(np.diff(timestamps) < 0):
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, values = timestamps[order], values[order]
+    index = np.floor((timestamps - start) / bucket).astype(np.int64)
+    # Samples are sorted by time, so each bucket is one contiguous run
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(index)) + 1))
+    ends = np.append(starts[1:], len(index))
+    result = {
+        "start": start + index[starts] * bucket,
+        "count": ends - starts,
+        "min": None,
+        "max": None,
+        "avg": None,
+        "last": values[ends - 1],
+    }
+    if np.issubdtype(values.dtype, np.number) or values.dtype == np.bool_:
+        numeric = values.astype(np.float64)
+        result["min"] = np.minimum.reduceat(numeric, starts)
+        result["max"] = np.maximum.reduceat(numeric, starts)
+        result["avg"] = np.add.reduceat(numeric, starts) / result["count"]
+    return result
@@ -0,0 +1,111 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+class SamplingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller and samples repeated messages.
+
+    At most sample_limit records with the same logger, level and message
+    template are queued per sample_interval seconds; the rest are counted and
+    reported in one summary record when the interval ends. Records arriving
+    while the queue is full are dropped and counted instead of waiting.
+    """
+    def __init__(self, log_queue, sample_limit=0, sample_interval=10.0):
+        super().__init__(log_queue)
+        self.sample_limit = sample_limit
+        self.sample_interval = sample_interval
+        self.counts = {}  # (logger name, level, template) -> records seen this interval
+        self.interval_end = 0.0
+        self.dropped = 0
+        self.sample_lock = threading.Lock()
+
+    def emit(self, record):
+        if self.sample_limit:
+            with self.sample_lock:
+                summaries = self._end_interval(record.created) if record.created >= self.interval_end else []
+                key = (record.name, record.levelno, record.msg)
+                count = self.counts.get(key, 0) + 1
+                self.counts[key] = count
+            for summary in summaries:
+                self._put(summary)
+            if count > self.sample_limit:
+                return
+        try:
+            self._put(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def _end_interval(self, now):
+        summaries = [
+            logging.LogRecord(name, level, "", 0, "Suppressed %d more messages like: %s",
+                              (count - self.sample_limit, template), None)
+            for (name, level, template), count in self.counts.items() if count > self.sample_limit
+        ]
+        self.counts.clear()
+        self.interval_end = now + self.sample_interval
+        return summaries
+
+    def _put(self, record):
+        if self.dropped:
+            record.msg = f"({self.dropped} log records dropped, queue full) {record.msg}"
+        try:
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+def configure_logging(path, level="INFO", levels=None, max_bytes=5 * 1024 * 1024, backup_count=3,
+                      console=True, queue_size=10000, sample_limit=0, sample_interval=10.0):
+    """Route all logging through one queue to the rotating file at path and the console.
+
+    Safe to call repeatedly; only the first call installs the handlers. The
+    file and console handlers run on the QueueListener's thread, so callers
+    only pay for queueing a record. levels maps logger names to their own
+    level; sample_limit and sample_interval configure SamplingQueueHandler.
+    """
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        formatter = logging.Formatter(FORMAT)
+        handlers = [RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, delay=True)]
+        if console:
+            handlers.append(logging.StreamHandler(sys.stdout))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(queue_size)
+        root = logging.getLogger()
+        root.setLevel(level)
+        _handler = SamplingQueueHandler(log_queue, sample_limit, sample_interval)
+        root.addHandler(_handler)
+        for name, logger_level in (levels or {}).items():
+            logging.getLogger(name).setLevel(logger_level)
+
+        _listener = QueueListener(log_queue, *handlers)
+        _listener.start()
+        atexit.register(stop_logging)
+
+def stop_logging():
+    """Write out queued records and stop the listener thread."""
+    global _listener, _handler
+    with _lock:
+        if _listener is None:
+            return
+        logging.getLogger().removeHandler(_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = _handler = None
@@ -0,0 +1,183 @@
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, from sub-millisecond local calls to multi-second timeouts
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Timer:
+    """Context manager observing the elapsed time of its block in a histogram."""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+class GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+class HistogramValue:
+    """Fixed-bucket histogram; observe is one bisect and two additions."""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last slot counts values above every bound
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> Timer:
+        return Timer(self)
+
+class Metric:
+    """A named metric family with one child value per combination of label values."""
+    kind = None
+    value_class = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        if not self.labelnames:
+            self.children[()] = self._new_value()
+
+    def _new_value(self):
+        return self.value_class()
+
+    def labels(self, *values):
+        """Child value for the given label values, created on first use."""
+        values = tuple(str(value) for value in values)
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._new_value()
+        return child
+
+    def clear(self):
+        """Forget all labelled children, e.g. before re-collecting per-client gauges."""
+        if self.labelnames:
+            self.children.clear()
+
+    def _label_text(self, values, extra=()) -> str:
+        pairs = [*zip(self.labelnames, values), *extra]
+        if not pairs:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> list:
+        return [f"{self.name}{self._label_text(values)} {format_value(child.value)}"]
+
+class Counter(Metric):
+    kind = "counter"
+    value_class = CounterValue
+
+    def inc(self, amount: float = 1.0):
+        self.children[()].inc(amount)
+
+class Gauge(Metric):
+    kind = "gauge"
+    value_class = GaugeValue
+
+    def set(self, value: float):
+        self.children[()].set(value)
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.children[()].observe(value)
+
+    def time(self) -> Timer:
+        return self.children[()].time()
+
+    def _render_child(self, values, child) -> list:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, child.counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{self._label_text(values, [('le', format_value(bound))])} {cumulative}")
+        cumulative += child.counts[-1]
+        lines.append(f"{self.name}_bucket{self._label_text(values, [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {format_value(child.sum)}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Process-wide set of metrics rendered in the Prometheus text format."""
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, metric):
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            if existing.kind != metric.kind or existing.labelnames != metric.labelnames:
+                raise ValueError(
+                    f"Metric {metric.name} is already registered as a {existing.kind} "
+                    f"with labels {list(existing.labelnames)}"
+                )
+            # Modules may be imported more than once (tests); keep the first instance
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+def format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
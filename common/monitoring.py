@@ -0,0 +1,33 @@
+from asyncua import ua
+
+# DataChangeFilter DeadbandType values by name
+DEADBAND_TYPES = {"none": 0, "absolute": 1, "percent": 2}
+
+def monitored_item_request(node_id, client_handle: int, sampling_interval: float = 0.0, queue_size: int = 0,
+                           discard_oldest: bool = True, deadband_type: str = "none", deadband_value: float = 0.0):
+    """Build a Value MonitoredItemCreateRequest with a caller-chosen client handle.
+
+    Notifications carry the client handle back, so callers can map them to tag
+    names without any further service calls. A deadband other than "none"
+    attaches a DataChangeFilter so the server suppresses changes smaller than
+    deadband_value (absolute units, or percent of the variable's EURange).
+    """
+    item = ua.ReadValueId()
+    item.NodeId = node_id
+    item.AttributeId = ua.AttributeIds.Value
+    params = ua.MonitoringParameters()
+    params.ClientHandle = client_handle
+    params.SamplingInterval = sampling_interval
+    params.QueueSize = queue_size
+    params.DiscardOldest = discard_oldest
+    if deadband_type != "none":
+        mfilter = ua.DataChangeFilter()
+        mfilter.Trigger = ua.DataChangeTrigger.StatusValue
+        mfilter.DeadbandType = DEADBAND_TYPES[deadband_type]
+        mfilter.DeadbandValue = deadband_value
+        params.Filter = mfilter
+    request = ua.MonitoredItemCreateRequest()
+    request.ItemToMonitor = item
+    request.MonitoringMode = ua.MonitoringMode.Reporting
+    request.RequestedParameters = params
+    return request
@@ -0,0 +1,36 @@
+from asyncua import ua
+
+# Object below the Objects folder holding all tags
+MY_OBJECT = "MyObject"
+
+# Readable and writable by clients, set at creation instead of a set_writable() per node
+READ_WRITE_ACCESS = ua.AccessLevel.CurrentRead.mask | ua.AccessLevel.CurrentWrite.mask
+
+def as_variant(value) -> ua.Variant:
+    """value itself if it is a ua.Variant, else a Variant of its inferred VariantType."""
+    return value if isinstance(value, ua.Variant) else ua.Variant(value)
+
+def variable_node_id(name: str, namespace_index: int) -> ua.NodeId:
+    """Stable string NodeId of a MyObject variable, valid across restarts."""
+    return ua.NodeId(f"{MY_OBJECT}.{name}", namespace_index)
+
+def build_variable_item(parent_id, namespace_index: int, name: str, value) -> ua.AddNodesItem:
+    """AddNodesItem creating a writable BaseDataVariable name = value below parent_id."""
+    variant = as_variant(value)
+    attrs = ua.VariableAttributes()
+    attrs.DisplayName = ua.LocalizedText(name)
+    attrs.Description = ua.LocalizedText(name)
+    attrs.DataType = ua.NodeId(getattr(ua.ObjectIds, variant.VariantType.name))
+    attrs.Value = variant
+    attrs.ValueRank = ua.ValueRank.OneDimension if isinstance(variant.Value, (list, tuple)) else ua.ValueRank.Scalar
+    attrs.AccessLevel = READ_WRITE_ACCESS
+    attrs.UserAccessLevel = READ_WRITE_ACCESS
+    item = ua.AddNodesItem()
+    item.RequestedNewNodeId = variable_node_id(name, namespace_index)
+    item.BrowseName = ua.QualifiedName(name, namespace_index)
+    item.NodeClass = ua.NodeClass.Variable
+    item.ParentNodeId = parent_id
+    item.ReferenceTypeId = ua.NodeId(ua.ObjectIds.HasComponent)
+    item.TypeDefinition = ua.NodeId(ua.ObjectIds.BaseDataVariableType)
+    item.NodeAttributes = attrs
+    return item
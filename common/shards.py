@@ -0,0 +1,14 @@
+import zlib
+
+# Shard worker ApplicationUris end with this mark and the shard index
+SHARD_URI_MARK = ":shard:"
+
+def shard_of(name: str, count: int) -> int:
+    """Index of the shard serving tag name; stable across processes and restarts.
+
+    The supervisor partitions tags with it and the backend routes fleet tags
+    to shard workers with it, so both must use this one function.
+    """
+    if count <= 1:
+        return 0
+    return zlib.crc32(name.encode("utf-8")) % count
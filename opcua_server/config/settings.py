@@ -19,6 +19,106 @@ SERVER_CONFIG = {
     "security_policy": [ua.SecurityPolicyType.NoSecurity]  # Basic security policy for development
 }
 
+# Tag persistence
+TAG_STORE_PATH = "tag_store.db"  # SQLite database holding tag definitions and last values
+LEGACY_VARIABLES_FILE = "variables_store.json"  # Imported once into an empty tag store
+VALUE_FLUSH_INTERVAL = 1.0  # Seconds between flushes of changed tag values
+VALUE_FLUSH_MAX_PENDING = 5000  # Flush early once this many tags have unsaved values
+PROVISION_BATCH_SIZE = 1000  # AddNodes items created per batch when provisioning variables
+
+# Address space snapshot: MyObject variables are restored from this file at startup
+# instead of being created node by node; it is rebuilt when the tag configuration changes
+SNAPSHOT_CONFIG = {
+    "enabled": True,
+    "path": "address_space.snapshot",
+}
+
+# Sharded mode (`python server.py --workers N`): a supervisor process starts N
+# worker servers, each serving the tags whose name hashes to it on its own port
+# with its own tag store, historian and snapshot in <data_dir>/<index>/. The
+# supervisor serves discovery (FindServers) and a Shards directory at SERVER_URL.
+SHARD_CONFIG = {
+    "host": "0.0.0.0",  # Worker endpoints are opc.tcp://<host>:<base_port + index>
+    "base_port": 4842,
+    "data_dir": "shards",  # Relative to the supervisor's working directory
+    "restart_min_delay": 1.0,  # Seconds before restarting a worker that exited, doubled up to max
+    "restart_max_delay": 30.0,
+    "stop_timeout": 10.0,  # Seconds workers get to shut down before they are killed
+}
+# Environment variable carrying a worker's shard index, set by the supervisor
+SHARD_ENV = "OPCUA_SHARD"
+
+# Logging: records are queued and written by one background thread
+LOG_CONFIG = {
+    "level": "INFO",  # Default level of every logger
+    "levels": {  # Per-subsystem overrides, keyed by logger name prefix
+        "asyncua": "WARNING",
+        # "storage.historian": "DEBUG",
+    },
+    "directory": "logs",  # Relative to opcua_server/
+    "file": "opcua_server.log",
+    "max_bytes": 5 * 1024 * 1024,  # Rotate the log file at this size
+    "backup_count": 3,  # Rotated files kept
+    "console": True,
+    "queue_size": 10000,  # Records waiting to be written; more are dropped, never waited for
+    "sample_limit": 20,  # Records per message template and interval; 0 disables sampling
+    "sample_interval": 10.0,  # Seconds
+}
+
+# Prometheus text metrics served over HTTP at /metrics (shard workers use port + 1 + index)
+METRICS_CONFIG = {
+    "enabled": True,
+    "host": "0.0.0.0",
+    "port": 9101,
+}
+
+# Tag simulator for load testing (also enabled with `python server.py --simulate N`)
+# Each group adds count variables named <prefix>_<i>, written rate times per second
+SIMULATOR_CONFIG = {
+    "enabled": False,
+    "groups": [
+        {
+            "prefix": "sim",
+            "count": 100,
+            "waveform": "sine",  # sine, triangle, sawtooth, square, random or counter
+            "type": "Double",  # Double, Float, Int16, Int32, Int64, UInt16, UInt32, Boolean or String
+            "rate": 10.0,  # Updates per second of each tag
+            "period": 10.0,  # Seconds per waveform cycle
+            "amplitude": 100.0,
+            "offset": 0.0,
+        },
+    ],
+}
+
+# Historian (HistoryRead on MyObject variables)
+HISTORY_CONFIG = {
+    "enabled": True,
+    "path": "history.db",  # SQLite database holding the samples
+    "tags": None,  # Variable names to historize; None historizes every variable
+    "retention_days": 30,  # Samples older than this are deleted
+    "downsample_after_hours": 24,  # Older samples are thinned out; None disables downsampling
+    "downsample_interval_seconds": 60,  # Keep the last sample of each interval when downsampling
+    "flush_interval": 1.0,  # Seconds between batched writes
+    "max_buffer": 100000,  # Write early once this many samples are buffered
+    "maintenance_interval": 300.0,  # Seconds between retention/downsampling passes
+    "rollup_levels": [60, 300, 3600],  # Interval lengths (seconds) of precomputed aggregates
+}
+
+# Data change subscription settings
+SUBSCRIPTION_CONFIG = {
+    "publishing_interval": 500,  # Milliseconds between publish responses
+    "sampling_interval": 0.0,  # Milliseconds; 0 samples as fast as the server allows
+    "deadband_type": "none",  # "none", "absolute" or "percent" (percent needs an EURange)
+    "deadband_value": 0.0,  # Minimum change reported when a deadband is set
+    "queue_size": 0,  # Values kept between publishes; 0 keeps only the latest
+    "discard_oldest": True,  # Drop the oldest queued value when the queue overflows
+}
+
+# Per-tag overrides of SUBSCRIPTION_CONFIG, keyed by variable name
+TAG_SUBSCRIPTION_CONFIG = {
+    # "variable1": {"sampling_interval": 100.0, "deadband_type": "absolute", "deadband_value": 0.5},
+}
+
 # Optional security settings (uncomment and configure as needed)
 # SECURITY_POLICY = ua.SecurityPolicy.Basic256Sha256
 # CERTIFICATE_PATH = "/path/to/certificate.pem"
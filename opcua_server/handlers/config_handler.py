@@ -1,15 +1,27 @@
 from asyncua import ua
+from common.nodes import MY_OBJECT, as_variant, build_variable_item, variable_node_id
 from config.namespaces import NAMESPACE_URI
+from config.settings import PROVISION_BATCH_SIZE
+from storage.snapshot import capture_nodes, insert_nodes
 from utils.logger import get_logger
 import asyncio
+import json
+from datetime import datetime, timezone
 
 logger = get_logger(__name__)
 
+# Object exposing the tag store to OPC UA clients such as the backend
+TAG_STORE_OBJECT = "TagStore"
+
 class ConfigHandler:
-    def __init__(self):
+    def __init__(self, store=None, on_variables_added=None):
         self.namespace_index = None
         self.objects_node = None
         self.server = None
+        self.store = store
+        # Async callback({name: node}) run after new variable nodes were created
+        self.on_variables_added = on_variables_added
+        self.containers = {}  # Namespace URI -> NodeId of its MyObject
 
     async def setup(self, server):
         """Set up the configuration handler with the server instance."""
@@ -18,13 +30,17 @@ class ConfigHandler:
         self.objects_node = self.server.nodes.objects
         logger.info("Config handler initialized")
 
-    async def add_namespace_and_variables(self, namespace_uri, variables):
+    async def add_namespace_and_variables(self, namespace_uri, variables, persist=True):
         """
         Add a namespace and its variables to the OPCUA server.
         
         Args:
             namespace_uri (str): URI of the namespace.
             variables (dict): Dictionary of variable names and initial values.
+            persist (bool): Also record the variables in the tag store, if one is attached.
+
+        Returns:
+            dict: {name: node} of the variables that were created.
         """
         try:
             # Register namespace if not already registered
@@ -36,38 +52,133 @@ class ConfigHandler:
             # Create or update an object node
             # First check if MyObject exists
             try:
-                myobj = await self.objects_node.get_child([f"{namespace_index}:MyObject"])
+                myobj = await self.objects_node.get_child([f"{namespace_index}:{MY_OBJECT}"])
                 logger.info("Found existing MyObject")
             except ua.UaError:
                 # Object doesn't exist, create it
-                myobj = await self.objects_node.add_object(namespace_index, "MyObject")
+                myobj = await self.objects_node.add_object(
+                    ua.NodeId(MY_OBJECT, namespace_index), ua.QualifiedName(MY_OBJECT, namespace_index)
+                )
                 logger.info("Created new MyObject")
+            self.containers[namespace_uri] = myobj.nodeid
             
-            # Add or update variables
-            for var_name, initial_value in variables.items():
-                try:
-                    # Check if variable exists
-                    var_node = await myobj.get_child([f"{namespace_index}:{var_name}"])
-                    # Update existing variable
-                    await var_node.write_value(initial_value)
-                    logger.info(f"Updated variable {var_name} with value {initial_value}")
-                except ua.UaError:
-                    # Variable doesn't exist, create it
-                    var_node = await myobj.add_variable(namespace_index, var_name, initial_value)
-                    await var_node.set_writable()
-                    logger.info(f"Added new variable {var_name} with value {initial_value}")
+            # One Browse tells which variables exist; those get their value updated
+            refs = await myobj.get_children_descriptions(nodeclassmask=ua.NodeClass.Variable)
+            existing = {ref.BrowseName.Name: ref.NodeId for ref in refs}
+            updates = [(existing[name], value) for name, value in variables.items() if name in existing]
+            if updates:
+                await self.write_values(updates)
+                logger.info("Updated %s existing variables", len(updates))
+
+            # The rest are created with batched AddNodes, already writable
+            added = await self.add_variables(
+                myobj.nodeid, namespace_index,
+                {name: value for name, value in variables.items() if name not in existing}
+            )
             
-            return True
+            if added and self.on_variables_added is not None:
+                await self.on_variables_added(added)
+            if persist and self.store is not None:
+                # Only the changed tags are written, off the event loop
+                await asyncio.to_thread(self.store.upsert, variables, namespace_uri)
+            return added
         except Exception as e:
-            logger.error(f"Error adding namespace and variables: {str(e)}")
+            logger.error("Error adding namespace and variables: %s", e)
             raise
 
+    async def add_variables(self, parent_id, namespace_index, variables):
+        """Create variables below parent_id with AddNodes batches of PROVISION_BATCH_SIZE.
+
+        Returns {name: node} for the variables that were created.
+        """
+        session = self.server.iserver.isession
+        items = [build_variable_item(parent_id, namespace_index, name, value) for name, value in variables.items()]
+        added = {}
+        for start in range(0, len(items), PROVISION_BATCH_SIZE):
+            batch = items[start:start + PROVISION_BATCH_SIZE]
+            for item, result in zip(batch, await session.add_nodes(batch)):
+                if result.StatusCode.is_good():
+                    added[item.BrowseName.Name] = self.server.get_node(result.AddedNodeId)
+                else:
+                    logger.error("Failed to add variable %s: %s", item.BrowseName.Name, result.StatusCode)
+            # Let clients and subscriptions run between batches
+            await asyncio.sleep(0)
+        if added:
+            logger.info("Added %s new variables", len(added))
+        return added
+
+    async def write_values(self, values):
+        """Write [(node_id, value)] with batched Write calls, logging rejected values."""
+        session = self.server.iserver.isession
+        for start in range(0, len(values), PROVISION_BATCH_SIZE):
+            params = ua.WriteParameters()
+            for node_id, value in values[start:start + PROVISION_BATCH_SIZE]:
+                write = ua.WriteValue()
+                write.NodeId = node_id
+                write.AttributeId = ua.AttributeIds.Value
+                write.Value = ua.DataValue(as_variant(value))
+                params.NodesToWrite.append(write)
+            for write, status in zip(params.NodesToWrite, await session.write(params)):
+                if not status.is_good():
+                    logger.error("Failed to update variable %s: %s", write.NodeId.to_string(), status)
+
+    def snapshot_nodes(self):
+        """Copies of every MyObject and its variables, for AddressSpaceSnapshot.save."""
+        aspace = self.server.iserver.aspace
+        node_ids = []
+        for container_id in self.containers.values():
+            node_ids.append(container_id)
+            node_ids.extend(ref.NodeId for ref in aspace[container_id].references
+                            if ref.IsForward and ref.NodeClass == ua.NodeClass.Variable)
+        return capture_nodes(aspace, node_ids)
+
+    def restore_snapshot(self, nodes, tags):
+        """Insert snapshot nodes into the address space with the values stored in tags.
+
+        tags is {namespace_uri: {name: value}} from the tag store; the snapshot
+        must have been taken with the same namespace array. Returns {name: node}
+        of the restored variables.
+        """
+        aspace = self.server.iserver.aspace
+        namespaces = {idx: uri for uri, idx in self.namespace_indices().items()}
+        objects = aspace[ua.NodeId(ua.ObjectIds.ObjectsFolder)]
+        linked = {ref.NodeId for ref in objects.references if ref.IsForward}
+        now = datetime.now(timezone.utc)
+        insert_nodes(aspace, nodes)
+        restored = {}
+        for nodedata in nodes:
+            attributes = nodedata.attributes
+            browse_name = attributes[ua.AttributeIds.BrowseName].value.Value.Value
+            node_class = attributes[ua.AttributeIds.NodeClass].value.Value.Value
+            uri = namespaces[nodedata.nodeid.NamespaceIndex]
+            if node_class == ua.NodeClass.Object:
+                self.containers[uri] = nodedata.nodeid
+                if nodedata.nodeid not in linked:
+                    objects.references.append(ua.ReferenceDescription(
+                        ReferenceTypeId=ua.NodeId(ua.ObjectIds.HasComponent), IsForward=True,
+                        NodeId=nodedata.nodeid, BrowseName=browse_name,
+                        DisplayName=attributes[ua.AttributeIds.DisplayName].value.Value.Value,
+                        NodeClass=node_class, TypeDefinition=ua.NodeId(ua.ObjectIds.BaseObjectType),
+                    ))
+            else:
+                value = tags[uri][browse_name.Name]
+                attributes[ua.AttributeIds.Value].value = ua.DataValue(as_variant(value), SourceTimestamp=now)
+                restored[browse_name.Name] = self.server.get_node(nodedata.nodeid)
+        logger.info("Restored %s variables from the address space snapshot", len(restored))
+        return restored
+
+    def namespace_indices(self):
+        """Namespace URI -> index for the server's current namespace array."""
+        array = self.server.iserver.aspace[ua.NodeId(ua.ObjectIds.Server_NamespaceArray)] \
+            .attributes[ua.AttributeIds.Value].value.Value.Value
+        return {uri: idx for idx, uri in enumerate(array)}
+
     async def get_config(self):
         """Retrieve current namespace and variable configurations."""
         try:
             config = {}
             try:
-                myobj = await self.objects_node.get_child([f"{self.namespace_index}:MyObject"])
+                myobj = await self.objects_node.get_child([f"{self.namespace_index}:{MY_OBJECT}"])
                 children = await myobj.get_children()
                 
                 for node in children:
@@ -76,11 +187,47 @@ class ConfigHandler:
                     value = await node.read_value()
                     config[name] = value
                     
-                logger.info(f"Retrieved config: {config}")
+                logger.info("Retrieved config: %s", config)
                 return config
             except ua.UaError as e:
-                logger.warning(f"MyObject not found or empty: {str(e)}")
+                logger.warning("MyObject not found or empty: %s", e)
                 return config
         except Exception as e:
-            logger.error(f"Error getting config: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Error getting config: %s", e)
+            raise
+
+    async def add_tag_store_methods(self):
+        """Expose the tag store through a TagStore object with AddVariables and GetVariables methods.
+
+        The server process is the store's only writer; the backend provisions and
+        reads tags by calling these methods instead of touching the database.
+        """
+        try:
+            store_obj = await self.objects_node.add_object(self.namespace_index, TAG_STORE_OBJECT)
+            await store_obj.add_method(
+                self.namespace_index, "AddVariables", self._add_variables_method,
+                [ua.VariantType.String, ua.VariantType.String], [ua.VariantType.Int32]
+            )
+            await store_obj.add_method(
+                self.namespace_index, "GetVariables", self._get_variables_method,
+                [], [ua.VariantType.String]
+            )
+            logger.info("Tag store methods added")
+        except Exception as e:
+            logger.error("Error adding tag store methods: %s", e)
+            raise
+
+    async def _add_variables_method(self, parent, namespace_uri, variables):
+        """AddVariables(namespace_uri, variables as a JSON object) -> number of variables."""
+        variables = json.loads(variables.Value)
+        await self.add_namespace_and_variables(namespace_uri.Value or NAMESPACE_URI, variables)
+        return [ua.Variant(len(variables), ua.VariantType.Int32)]
+
+    async def _get_variables_method(self, parent):
+        """GetVariables() -> stored {namespace_uri: {name: value}} as JSON."""
+        tags = await asyncio.to_thread(self.store.load)
+        # Values stored with a non-default type load as Variants; JSON gets their plain value
+        return [ua.Variant(
+            json.dumps(tags, default=lambda value: value.Value if isinstance(value, ua.Variant) else str(value)),
+            ua.VariantType.String,
+        )]
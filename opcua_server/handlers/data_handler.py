@@ -1,9 +1,27 @@
 from asyncua import ua
+from common.monitoring import monitored_item_request
+from config.settings import SUBSCRIPTION_CONFIG, TAG_SUBSCRIPTION_CONFIG
 from utils.logger import get_logger
 import asyncio
 
 logger = get_logger(__name__)
 
+def tag_subscription_settings(tag_name=None):
+    """Subscription settings for a tag: the defaults merged with its overrides."""
+    return {**SUBSCRIPTION_CONFIG, **TAG_SUBSCRIPTION_CONFIG.get(tag_name, {})}
+
+def build_monitored_item_request(node_id, client_handle, tag_name=None):
+    """Build a Value monitored item request using the configured settings for tag_name."""
+    config = tag_subscription_settings(tag_name)
+    return monitored_item_request(
+        node_id, client_handle,
+        sampling_interval=config["sampling_interval"],
+        queue_size=config["queue_size"],
+        discard_oldest=config["discard_oldest"],
+        deadband_type=config["deadband_type"],
+        deadband_value=config["deadband_value"],
+    )
+
 class DataHandler:
     def __init__(self):
         self.data = {}
@@ -19,9 +37,9 @@ class DataHandler:
         try:
             node = self.server.get_node(node_id)
             await node.write_value(value)
-            logger.info(f"Updated {node_id} to value: {value}")
+            logger.debug("Updated %s to value: %s", node_id, value)
         except Exception as e:
-            logger.error(f"Error updating variable {node_id}: {str(e)}")
+            logger.error("Error updating variable %s: %s", node_id, e)
             raise
 
     async def get_variable(self, node_id):
@@ -29,29 +47,38 @@ class DataHandler:
         try:
             node = self.server.get_node(node_id)
             value = await node.read_value()
-            logger.info(f"Retrieved value for {node_id}: {value}")
+            logger.debug("Retrieved value for %s: %s", node_id, value)
             return value
         except Exception as e:
-            logger.error(f"Error getting variable {node_id}: {str(e)}")
+            logger.error("Error getting variable %s: %s", node_id, e)
             raise
 
-    async def subscribe_to_variable(self, node_id, callback):
-        """Subscribe to a variable for real-time updates."""
+    async def subscribe_to_variable(self, node_id, callback, tag_name=None):
+        """Subscribe to a variable for real-time updates.
+
+        Sampling interval, deadband, queue size and discard policy come from
+        SUBSCRIPTION_CONFIG, overridden per tag by TAG_SUBSCRIPTION_CONFIG.
+        """
         try:
             # Create subscription handler
             handler = SubscriptionHandler(callback)
             
             # Create subscription
-            subscription = await self.server.create_subscription(500, handler)
+            subscription = await self.server.create_subscription(
+                SUBSCRIPTION_CONFIG["publishing_interval"], handler
+            )
             
             # Subscribe to data changes for the given node
             node = self.server.get_node(node_id)
-            handle = await subscription.subscribe_data_change(node)
+            request = build_monitored_item_request(node.nodeid, 1, tag_name)
+            handle = (await subscription.create_monitored_items([request]))[0]
+            if isinstance(handle, ua.StatusCode):
+                handle.check()
             
-            logger.info(f"Subscribed to {node_id} for updates")
+            logger.info("Subscribed to %s for updates", node_id)
             return subscription, handle
         except Exception as e:
-            logger.error(f"Error subscribing to {node_id}: {str(e)}")
+            logger.error("Error subscribing to %s: %s", node_id, e)
             raise
             
 # Subscription handler class
@@ -65,4 +92,4 @@ class SubscriptionHandler:
             # Execute the callback with the new value
             await self.callback(node, val)
         except Exception as e:
-            logger.error(f"Error in subscription callback: {str(e)}")
\ No newline at end of file
+            logger.error("Error in subscription callback: %s", e)
\ No newline at end of file
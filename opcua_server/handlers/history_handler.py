@@ -0,0 +1,91 @@
+from asyncua import ua
+from utils.logger import get_logger
+import json
+
+logger = get_logger(__name__)
+
+# Object exposing historian queries to OPC UA clients such as the backend
+HISTORIAN_OBJECT = "Historian"
+
+def attribute_write(node_id, attribute, variant):
+    write = ua.WriteValue()
+    write.NodeId = node_id
+    write.AttributeId = attribute
+    write.Value = ua.DataValue(variant)
+    return write
+
+class HistoryHandler:
+    def __init__(self, historian):
+        self.historian = historian
+        self.server = None
+        self.tags = {}  # Variable name -> NodeId string of historized variables
+        self.handles = {}  # Data change callback handle -> historian node key
+
+    async def setup(self, server, namespace_index):
+        """Add the Historian object with its ReadAggregates method."""
+        self.server = server
+        try:
+            historian_obj = await server.nodes.objects.add_object(namespace_index, HISTORIAN_OBJECT)
+            await historian_obj.add_method(
+                namespace_index, "ReadAggregates", self._read_aggregates_method,
+                [ua.VariantType.String, ua.VariantType.DateTime, ua.VariantType.DateTime, ua.VariantType.Double],
+                [ua.VariantType.String]
+            )
+            logger.info("History handler initialized")
+        except Exception as e:
+            logger.error("Error adding historian methods: %s", e)
+            raise
+
+    def register(self, name, node_id):
+        self.tags[name] = node_id.to_string()
+
+    async def historize(self, nodes, period):
+        """Record every value change of nodes ({name: node}) in the historian.
+
+        Historizing and the HistoryRead access bits are set with one batched
+        Write, and value changes are taken straight from the address space's
+        data change callbacks. That costs a dictionary entry per node instead
+        of a monitored item, and records every write rather than one sample
+        per publishing interval.
+        """
+        aspace = self.server.iserver.aspace
+        keys = await self.historian.new_historized_nodes([node.nodeid for node in nodes.values()], period)
+        params = ua.WriteParameters()
+        for node in nodes.values():
+            params.NodesToWrite.append(attribute_write(node.nodeid, ua.AttributeIds.Historizing,
+                                                       ua.Variant(True, ua.VariantType.Boolean)))
+            for attribute in (ua.AttributeIds.AccessLevel, ua.AttributeIds.UserAccessLevel):
+                access = aspace.read_attribute_value(node.nodeid, attribute).Value.Value
+                params.NodesToWrite.append(attribute_write(
+                    node.nodeid, attribute, ua.Variant(access | ua.AccessLevel.HistoryRead.mask, ua.VariantType.Byte)
+                ))
+        for write, status in zip(params.NodesToWrite, await self.server.iserver.isession.write(params)):
+            if not status.is_good():
+                logger.error("Failed to enable history on %s: %s", write.NodeId.to_string(), status)
+        for (name, node), key in zip(nodes.items(), keys):
+            _, handle = aspace.add_datachange_callback(node.nodeid, ua.AttributeIds.Value, self._record)
+            self.handles[handle] = key
+            self.register(name, node.nodeid)
+            # Like a monitored item, start with the current value
+            self.historian.stage(key, aspace.read_attribute_value(node.nodeid, ua.AttributeIds.Value))
+        logger.info("Historizing %s variables", len(nodes))
+
+    async def _record(self, handle, datavalue):
+        self.historian.stage(self.handles[handle], datavalue)
+
+    async def read_aggregates(self, tags, start, end, bucket):
+        """Aggregate the history of the given tag names into {name: columns}."""
+        result = {}
+        for name in tags:
+            node_id = self.tags.get(name)
+            if node_id is None:
+                raise ua.UaStatusCodeError(ua.StatusCodes.BadNodeIdUnknown)
+            result[name] = await self.historian.read_aggregates(node_id, start, end, bucket)
+        return result
+
+    async def _read_aggregates_method(self, parent, tags, start, end, bucket):
+        """ReadAggregates(tag names as a JSON list, start, end, bucket seconds) -> {name: columns} as JSON."""
+        if bucket.Value <= 0:
+            raise ua.UaStatusCodeError(ua.StatusCodes.BadInvalidArgument)
+        result = await self.read_aggregates(json.loads(tags.Value), start.Value, end.Value, bucket.Value)
+        return [ua.Variant(json.dumps(result, default=str), ua.VariantType.String)]
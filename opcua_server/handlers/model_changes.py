@@ -0,0 +1,50 @@
+import asyncio
+from asyncua import ua
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class ModelChangeReporter:
+    """Publishes GeneralModelChangeEvents from the Server node for added and deleted nodes.
+
+    The node management service records changes synchronously while it
+    handles AddNodes and DeleteNodes. They are collected until the loop
+    runs again and then reported as one event, so provisioning a batch of
+    variables produces one event rather than one per node. Clients such as
+    the backend react to the event instead of polling the address space.
+    """
+    def __init__(self):
+        self.generator = None
+        self.pending = []
+        self._task = None
+
+    async def start(self, server):
+        self.generator = await server.get_event_generator(ua.ObjectIds.GeneralModelChangeEventType, ua.ObjectIds.Server)
+        # asyncua types the Changes field with the structure's DataType NodeId,
+        # which fails when the event is encoded for a subscriber
+        self.generator.event.data_types["Changes"] = ua.VariantType.ExtensionObject
+
+    def record(self, node_ids, verb: ua.ModelChangeStructureVerbMask):
+        if self.generator is None or not node_ids:
+            return
+        self.pending.extend((node_id, verb) for node_id in node_ids)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._publish())
+
+    async def _publish(self):
+        # Let the rest of the current request be recorded first
+        await asyncio.sleep(0)
+        while self.pending:
+            changes, self.pending = self.pending, []
+            self.generator.event.Changes = [
+                ua.ModelChangeStructureDataType(Affected=node_id, Verb=verb.value) for node_id, verb in changes
+            ]
+            try:
+                await self.generator.trigger(message=f"{len(changes)} nodes changed")
+            except Exception as e:
+                logger.error("Error reporting model change: %s", e)
+        logger.debug("Model change reported")
+
+    async def stop(self):
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+from asyncua import ua
+from asyncua.server.address_space import NodeManagementService
+from asyncua.crypto.permission_rules import User, UserRole
+
+HAS_PROPERTY = ua.NodeId(ua.ObjectIds.HasProperty)
+ADMIN = User(role=UserRole.Admin)
+
+class LinearNodeManagementService(NodeManagementService):
+    """AddNodes service whose cost does not grow with the parent's child count.
+
+    asyncua scans every reference of the parent for each added node: once for
+    a duplicate property name and once for an existing reference. For a
+    non-property child with a new NodeId the second scan cannot find
+    anything, and the first only needs the parent's property names, which
+    are collected once per request. Such nodes are added unparented and the
+    parent reference is appended directly. Everything else takes the regular
+    path. With thousands of variables below MyObject this turns provisioning
+    from quadratic into linear time, for in-process and client AddNodes
+    requests alike.
+
+    This relies on asyncua internals (_add_node, _add_ref_to_parent), so
+    asyncua is pinned in requirements.txt and tests/test_node_management.py
+    fails when they change upstream.
+
+    Added and deleted nodes are passed to the reporter, when one is set, so
+    clients get a GeneralModelChangeEvent.
+    """
+    reporter = None
+
+    def add_nodes(self, addnodeitems, user=ADMIN):
+        property_names = {}  # Parent NodeId -> BrowseNames of its properties
+        results = [self._add_item(item, user, property_names) for item in addnodeitems]
+        if self.reporter is not None:
+            self.reporter.record(
+                [result.AddedNodeId for result in results if result.StatusCode.is_good()],
+                ua.ModelChangeStructureVerbMask.NodeAdded,
+            )
+        return results
+
+    def delete_nodes(self, deletenodeitems, user=ADMIN):
+        results = super().delete_nodes(deletenodeitems, user)
+        if self.reporter is not None:
+            self.reporter.record(
+                [item.NodeId for item, result in zip(deletenodeitems.NodesToDelete, results) if result.is_good()],
+                ua.ModelChangeStructureVerbMask.NodeDeleted,
+            )
+        return results
+
+    def _add_item(self, item, user, property_names):
+        parent = self._aspace.get(item.ParentNodeId)
+        if parent is None or item.ReferenceTypeId == HAS_PROPERTY or user.role != UserRole.Admin \
+                or item.RequestedNewNodeId.has_null_identifier() or item.RequestedNewNodeId in self._aspace:
+            result = self._add_node(item, user)
+            if item.ParentNodeId in property_names and item.ReferenceTypeId == HAS_PROPERTY \
+                    and result.StatusCode.is_good():
+                property_names[item.ParentNodeId].add(item.BrowseName.Name)
+            return result
+
+        names = property_names.get(item.ParentNodeId)
+        if names is None:
+            names = property_names[item.ParentNodeId] = {
+                ref.BrowseName.Name for ref in parent.references if ref.ReferenceTypeId == HAS_PROPERTY
+            }
+        if item.BrowseName.Name in names:
+            result = ua.AddNodesResult()
+            result.StatusCode = ua.StatusCode(ua.StatusCodes.BadBrowseNameDuplicated)
+            return result
+
+        parent_id = item.ParentNodeId
+        item.ParentNodeId = ua.NodeId()
+        try:
+            result = self._add_node(item, user, check=False)
+        finally:
+            item.ParentNodeId = parent_id
+        if not result.StatusCode.is_good():
+            return result
+
+        nodedata = self._aspace[result.AddedNodeId]
+        value = nodedata.attributes.get(ua.AttributeIds.Value)
+        if value is not None:
+            # Unparented adds skip the timestamps a regular add sets on the value
+            now = datetime.now(timezone.utc)
+            value.value.SourceTimestamp = now
+            if self._aspace.force_server_timestamp:
+                value.value.ServerTimestamp = now
+        parent.references.append(ua.ReferenceDescription(
+            ReferenceTypeId=item.ReferenceTypeId, IsForward=True, NodeId=result.AddedNodeId,
+            BrowseName=item.BrowseName, DisplayName=item.NodeAttributes.DisplayName,
+            NodeClass=item.NodeClass, TypeDefinition=item.TypeDefinition,
+        ))
+        self._add_ref_to_parent(nodedata, item, parent)
+        return result
@@ -0,0 +1,64 @@
+from asyncua import ua
+from common.shards import SHARD_URI_MARK, shard_of
+from config.settings import SERVER_CONFIG, SHARD_CONFIG
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Object listing the shards in the supervisor's address space
+SHARDS_OBJECT = "Shards"
+
+def shard_endpoint(index: int) -> str:
+    return f"opc.tcp://{SHARD_CONFIG['host']}:{SHARD_CONFIG['base_port'] + index}"
+
+def shard_uri(index: int) -> str:
+    return f"{SERVER_CONFIG['uri']}{SHARD_URI_MARK}{index}"
+
+class ShardDirectory:
+    """The supervisor's discovery view of its shard workers.
+
+    Every worker is registered with the supervisor's server, so FindServers
+    on SERVER_URL lists one server per shard, each with its ApplicationUri
+    ending in ":shard:<index>" and its endpoint as DiscoveryUrl. A Shards
+    object holds ShardCount, one Shard<index> object per worker with its
+    Endpoint, Running and Restarts, and a Locate(name) method returning the
+    index and endpoint of the shard serving a tag.
+    """
+    def __init__(self, count: int):
+        self.count = count
+        self.state = []  # Per shard: (Running node, Restarts node)
+
+    async def setup(self, server, namespace_index: int):
+        for index in range(self.count):
+            registration = ua.RegisteredServer()
+            registration.ServerUri = shard_uri(index)
+            registration.ProductUri = SERVER_CONFIG["uri"]
+            registration.ServerNames = [ua.LocalizedText(f"{SERVER_CONFIG['name']} shard {index}")]
+            registration.ServerType = ua.ApplicationType.Server
+            registration.DiscoveryUrls = [shard_endpoint(index)]
+            registration.IsOnline = True
+            server.iserver.register_server(registration)
+
+        shards_obj = await server.nodes.objects.add_object(namespace_index, SHARDS_OBJECT)
+        await shards_obj.add_variable(namespace_index, "ShardCount", ua.Variant(self.count, ua.VariantType.Int32))
+        for index in range(self.count):
+            shard_obj = await shards_obj.add_object(namespace_index, f"Shard{index}")
+            await shard_obj.add_variable(namespace_index, "Endpoint", shard_endpoint(index))
+            running = await shard_obj.add_variable(namespace_index, "Running", False)
+            restarts = await shard_obj.add_variable(namespace_index, "Restarts", ua.Variant(0, ua.VariantType.UInt32))
+            self.state.append((running, restarts))
+        await shards_obj.add_method(
+            namespace_index, "Locate", self._locate_method,
+            [ua.VariantType.String], [ua.VariantType.Int32, ua.VariantType.String]
+        )
+        logger.info("Shard directory added for %d shards", self.count)
+
+    async def update(self, index: int, running: bool, restarts: int):
+        running_node, restarts_node = self.state[index]
+        await running_node.write_value(running)
+        await restarts_node.write_value(ua.Variant(restarts, ua.VariantType.UInt32))
+
+    async def _locate_method(self, parent, name):
+        """Locate(name) -> (shard index, endpoint) of the shard serving tag name."""
+        index = shard_of(name.Value, self.count)
+        return [ua.Variant(index, ua.VariantType.Int32), ua.Variant(shard_endpoint(index), ua.VariantType.String)]
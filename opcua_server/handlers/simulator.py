@@ -0,0 +1,186 @@
+import asyncio
+import math
+import random
+import time
+from datetime import datetime, timezone
+from asyncua import ua
+from config.namespaces import NAMESPACE_URI
+from handlers.config_handler import variable_node_id
+from utils.logger import get_logger
+from utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+SIMULATED_WRITES = REGISTRY.counter("simulator_writes_total", "Values written by the tag simulator")
+TICK_LAG = REGISTRY.histogram("simulator_tick_lag_seconds", "How late simulator ticks run behind schedule")
+
+# Periodic waveforms of the cycle phase (0..1), between -1 and 1
+WAVEFORMS = {
+    "sine": lambda phase: math.sin(2 * math.pi * phase),
+    "triangle": lambda phase: 1 - 4 * abs(phase - 0.5),
+    "sawtooth": lambda phase: 2 * phase - 1,
+    "square": lambda phase: 1.0 if phase < 0.5 else -1.0,
+}
+# Waveforms whose value depends on the previous one
+STATEFUL_WAVEFORMS = ("random", "counter")
+
+VARIANT_TYPES = {
+    "Double": ua.VariantType.Double,
+    "Float": ua.VariantType.Float,
+    "Int16": ua.VariantType.Int16,
+    "Int32": ua.VariantType.Int32,
+    "Int64": ua.VariantType.Int64,
+    "UInt16": ua.VariantType.UInt16,
+    "UInt32": ua.VariantType.UInt32,
+    "Boolean": ua.VariantType.Boolean,
+    "String": ua.VariantType.String,
+}
+# Value range of each integer type
+INTEGER_TYPES = {
+    ua.VariantType.Int16: (-2 ** 15, 2 ** 15 - 1),
+    ua.VariantType.Int32: (-2 ** 31, 2 ** 31 - 1),
+    ua.VariantType.Int64: (-2 ** 63, 2 ** 63 - 1),
+    ua.VariantType.UInt16: (0, 2 ** 16 - 1),
+    ua.VariantType.UInt32: (0, 2 ** 32 - 1),
+}
+
+DEFAULT_GROUP = {
+    "prefix": "sim",
+    "count": 100,
+    "waveform": "sine",
+    "type": "Double",
+    "rate": 10.0,  # Updates per second of every tag in the group
+    "period": 10.0,  # Seconds per waveform cycle
+    "amplitude": 100.0,
+    "offset": 0.0,
+}
+
+def convert(value: float, variant_type: ua.VariantType, wrap: bool = False):
+    """Cast a simulated float to the Python value of variant_type.
+
+    Integers outside the type's range are clamped to it, or wrapped around
+    like an integer register when wrap is set (counters).
+    """
+    if variant_type in INTEGER_TYPES:
+        value = round(value)
+        low, high = INTEGER_TYPES[variant_type]
+        if wrap:
+            return low + (value - low) % (high - low + 1)
+        return min(max(value, low), high)
+    if variant_type == ua.VariantType.Boolean:
+        return value > 0
+    if variant_type == ua.VariantType.String:
+        return f"{value:.3f}"
+    return value
+
+class SimulatedGroup:
+    """Tags sharing one waveform, type and update rate, written together on each tick.
+
+    select(name), if given, picks the tags of the group this server simulates.
+    """
+    def __init__(self, spec: dict, select=None):
+        spec = {**DEFAULT_GROUP, **spec}
+        if spec["waveform"] not in WAVEFORMS and spec["waveform"] not in STATEFUL_WAVEFORMS:
+            raise ValueError(f"Unknown waveform {spec['waveform']!r}")
+        if spec["type"] not in VARIANT_TYPES:
+            raise ValueError(f"Unknown tag type {spec['type']!r}")
+        if spec["rate"] <= 0:
+            raise ValueError("Simulator rate must be positive")
+        self.names = [f"{spec['prefix']}_{i}" for i in range(spec["count"])]
+        if select is not None:
+            self.names = [name for name in self.names if select(name)]
+        self.waveform = spec["waveform"]
+        self.variant_type = VARIANT_TYPES[spec["type"]]
+        self.wrap = spec["waveform"] == "counter"
+        self.rate = float(spec["rate"])
+        self.period = float(spec["period"])
+        self.amplitude = float(spec["amplitude"])
+        self.offset = float(spec["offset"])
+        self.node_ids = []
+        self.state = [0.0] * len(self.names)
+
+    def values(self, now: float) -> list:
+        """Float values of every tag at time now; tags are spread evenly over the cycle."""
+        count = len(self.names)
+        if self.waveform == "random":
+            step = self.amplitude * 0.05
+            self.state = [max(-self.amplitude, min(self.amplitude, v + random.uniform(-step, step)))
+                          for v in self.state]
+            return [self.offset + v for v in self.state]
+        if self.waveform == "counter":
+            self.state = [v + 1 for v in self.state]
+            return [self.offset + v for v in self.state]
+        wave = WAVEFORMS[self.waveform]
+        cycle = now / self.period
+        return [self.offset + self.amplitude * wave((cycle + i / count) % 1.0) for i in range(count)]
+
+    def initial_variables(self) -> dict:
+        return {
+            name: ua.Variant(convert(value, self.variant_type, self.wrap), self.variant_type)
+            for name, value in zip(self.names, self.values(time.time()))
+        }
+
+class TagSimulator:
+    """Drives MyObject variables with synthetic waveforms for load testing.
+
+    Each group gets one task ticking at its rate. A tick writes every tag of
+    the group straight into the address space with write_attribute_value,
+    which skips the Write service and session checks but still runs the data
+    change callbacks. Monitored items, the historian and persistence see
+    the changes like any client write.
+    """
+    def __init__(self, groups, select=None):
+        self.groups = [group for group in (SimulatedGroup(spec, select) for spec in groups) if group.names]
+        self.aspace = None
+        self.tasks = []
+
+    @property
+    def tag_count(self) -> int:
+        return sum(len(group.names) for group in self.groups)
+
+    @property
+    def aggregate_rate(self) -> float:
+        """Values written per second across all groups."""
+        return sum(len(group.names) * group.rate for group in self.groups)
+
+    async def start(self, server, config_handler):
+        """Create the simulated variables (not stored in the tag store) and start ticking."""
+        self.aspace = server.iserver.aspace
+        for group in self.groups:
+            await config_handler.add_namespace_and_variables(NAMESPACE_URI, group.initial_variables(), persist=False)
+            group.node_ids = [variable_node_id(name, config_handler.namespace_index) for name in group.names]
+        self.tasks = [asyncio.create_task(self._run(group)) for group in self.groups]
+        logger.info("Simulating %d tags at %.0f values/s", self.tag_count, self.aggregate_rate)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _run(self, group: SimulatedGroup):
+        interval = 1.0 / group.rate
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            await self._tick(group)
+            next_tick += interval
+            delay = next_tick - loop.time()
+            if delay < 0:
+                TICK_LAG.observe(-delay)
+                if delay < -1.0:
+                    # Too far behind to catch up; skip the missed ticks
+                    next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    async def _tick(self, group: SimulatedGroup):
+        now = datetime.now(timezone.utc)
+        variant_type = group.variant_type
+        wrap = group.wrap
+        for node_id, value in zip(group.node_ids, group.values(now.timestamp())):
+            datavalue = ua.DataValue(
+                ua.Variant(convert(value, variant_type, wrap), variant_type), SourceTimestamp=now, ServerTimestamp=now
+            )
+            await self.aspace.write_attribute_value(node_id, ua.AttributeIds.Value, datavalue)
+        SIMULATED_WRITES.inc(len(group.node_ids))
@@ -1,15 +1,48 @@
+import argparse
 import asyncio
+import itertools
+import os
 import random
+import signal
+import sys
+import time
+from datetime import datetime, timedelta, timezone
 from asyncua import Server, ua
-from config.settings import SERVER_URL, NAMESPACE_URI, VARIABLES, SERVER_CONFIG
+
+# The common package at the repository root is shared with the backend
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import (
+    SERVER_URL, NAMESPACE_URI, VARIABLES, SERVER_CONFIG, SUBSCRIPTION_CONFIG, TAG_STORE_PATH, LEGACY_VARIABLES_FILE,
+    VALUE_FLUSH_INTERVAL, VALUE_FLUSH_MAX_PENDING, HISTORY_CONFIG, SNAPSHOT_CONFIG, PROVISION_BATCH_SIZE, METRICS_CONFIG,
+    SIMULATOR_CONFIG
+)
+from handlers.config_handler import ConfigHandler
+from handlers.data_handler import build_monitored_item_request
+from handlers.history_handler import HistoryHandler
+from handlers.model_changes import ModelChangeReporter
+from handlers.node_management import LinearNodeManagementService
+from handlers.shards import shard_of, shard_endpoint, shard_uri
+from handlers.simulator import TagSimulator, WAVEFORMS, STATEFUL_WAVEFORMS, VARIANT_TYPES
+from storage import TagStore, LastValueWriter, Historian, AddressSpaceSnapshot, config_hash
+from supervisor import run_supervisor
 from utils.logger import get_logger
+from utils.metrics import REGISTRY, start_metrics_server
 from asyncua.ua import SecurityPolicyType
-import json
-import os
-from pathlib import Path
 
 logger = get_logger(__name__)
 
+NOTIFICATIONS = REGISTRY.counter(
+    "opcua_server_datachange_notifications_total", "Data changes received by the persistence subscription"
+)
+NOTIFICATION_DELAY = REGISTRY.histogram(
+    "opcua_server_notification_delay_seconds", "Delay from a value's source timestamp to its persistence notification"
+)
+STARTUP_SECONDS = REGISTRY.gauge("opcua_server_startup_seconds", "Time the last server start took")
+MONITORED_ITEMS = REGISTRY.gauge("opcua_server_monitored_items", "Variables monitored for persistence")
+PENDING_VALUES = REGISTRY.gauge("tag_store_pending_values", "Tag values staged and not yet persisted")
+HISTORY_BUFFER = REGISTRY.gauge("historian_buffered_samples", "History samples buffered and not yet written")
+
 # Add UserManager class
 class MyUserManager:
     def __init__(self):
@@ -22,49 +55,74 @@ class MyUserManager:
 
 # Add this class at the top level, after the MyUserManager class
 class SubHandler:
-    """Subscription Handler for monitoring variable changes"""
+    """Subscription Handler persisting variable changes through the last-value writer"""
+    def __init__(self, writer):
+        self.writer = writer
+        self.names = {}  # Monitored item client handle -> (namespace URI, variable name)
+
     def datachange_notification(self, node, val, data):
-        logger.info(f"Variable changed - Node: {node}, Value: {val}")
+        NOTIFICATIONS.inc()
+        key = self.names.get(data.monitored_item.ClientHandle)
+        if key is not None:
+            # The Variant, so the tag store keeps the value's VariantType
+            self.writer.stage(key, data.monitored_item.Value.Value)
+        timestamp = data.monitored_item.Value.SourceTimestamp
+        if timestamp is not None:
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            NOTIFICATION_DELAY.observe((datetime.now(timezone.utc) - timestamp).total_seconds())
+        logger.debug("Variable changed - Node: %s, Value: %s", node, val)
 
     def event_notification(self, event):
-        logger.info(f"Event received: {event}")
+        logger.info("Event received: %s", event)
 
 
 
 class OPCUAServer:
-    def __init__(self):
+    def __init__(self, simulator_groups=None, shard=None):
+        """simulator_groups overrides SIMULATOR_CONFIG's groups and enables the simulator.
+
+        shard is (index, count) for a worker of the shard supervisor: the server
+        then listens on its shard endpoint and only serves the default and
+        simulated tags hashing to it (its tag store is partitioned already).
+        """
+        self.shard = shard
+        self.url = shard_endpoint(shard[0]) if shard else SERVER_URL
         self.server = Server()
         self.namespace = None
         self.subscription = None
         self.handler = None
-        self.variables_file = Path("variables_store.json")
-        self.stored_variables = self.load_variables()
+        self.store = TagStore(TAG_STORE_PATH, NAMESPACE_URI)
+        self.store.open()
+        self.store.migrate_json(LEGACY_VARIABLES_FILE)
+        self.writer = LastValueWriter(self.store, VALUE_FLUSH_INTERVAL, VALUE_FLUSH_MAX_PENDING)
+        self.config_handler = ConfigHandler(self.store)
+        self.historian = create_historian() if HISTORY_CONFIG["enabled"] else None
+        self.history_handler = HistoryHandler(self.historian) if self.historian else None
+        self.snapshot = AddressSpaceSnapshot(SNAPSHOT_CONFIG["path"]) if SNAPSHOT_CONFIG["enabled"] else None
+        self.model_changes = ModelChangeReporter()
+        self.monitor_task = None
+        self.metrics_server = None
+        if simulator_groups is None and SIMULATOR_CONFIG["enabled"]:
+            simulator_groups = SIMULATOR_CONFIG["groups"]
+        self.simulator = TagSimulator(simulator_groups, select=self.serves) if simulator_groups else None
+        self.next_handle = itertools.count(1)  # Client handles of persistence monitored items
 
-    def load_variables(self):
-        """Load variables from storage file"""
-        if self.variables_file.exists():
-            try:
-                with open(self.variables_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error loading variables: {e}")
-        return {}
-
-    def save_variables(self, variables):
-        """Save variables to storage file"""
-        try:
-            with open(self.variables_file, 'w') as f:
-                json.dump(variables, f)
-            logger.info("Variables saved to storage")
-        except Exception as e:
-            logger.error(f"Error saving variables: {e}")
+    def serves(self, name: str) -> bool:
+        """Whether tag name belongs to this server's shard (always, when not sharded)."""
+        return self.shard is None or shard_of(name, self.shard[1]) == self.shard[0]
 
     async def setup(self):
         try:
+            started = time.perf_counter()
             # Server setup
             await self.server.init()
-            self.server.set_endpoint(SERVER_URL)
-            self.server.set_server_name(SERVER_CONFIG["name"])
+            self.server.set_endpoint(self.url)
+            if self.shard:
+                self.server.set_server_name(f"{SERVER_CONFIG['name']} shard {self.shard[0]}")
+                await self.server.set_application_uri(shard_uri(self.shard[0]))
+            else:
+                self.server.set_server_name(SERVER_CONFIG["name"])
 
             # Set up security policies and user authentication
             self.server.set_security_policy([
@@ -77,71 +135,221 @@ class OPCUAServer:
             self.server.user_manager = MyUserManager()
             self.server.set_security_IDs(["Anonymous", "Username"])  # Support both anonymous and username auth
 
+            # AddNodes in time independent of the number of existing siblings
+            self.server.iserver.node_mgt_service = LinearNodeManagementService(self.server.iserver.aspace)
+
+            # Replace the default in-memory history with the on-disk historian
+            if self.historian:
+                self.server.iserver.history_manager.set_storage(self.historian)
+                await self.historian.init()
+
             # Register namespace
             self.namespace = await self.server.register_namespace(NAMESPACE_URI)
-            logger.info(f"Namespace {NAMESPACE_URI} registered with index {self.namespace}")
+            logger.info("Namespace %s registered with index %s", NAMESPACE_URI, self.namespace)
 
-            # Create object node
-            objects = self.server.nodes.objects
-
-            # Check if MyObject exists, if not create it
-            try:
-                myobj = await objects.get_child([f"{self.namespace}:MyObject"])
-                logger.info("MyObject node already exists")
-            except Exception as e:
-                myobj = await objects.add_object(self.namespace, "MyObject")
-                logger.info("Created MyObject node")
-
-            # Load and add stored variables
-            for var_name, initial_value in self.stored_variables.items():
-                var = await myobj.add_variable(self.namespace, var_name, initial_value)
-                await var.set_writable()
-                logger.info(f"Restored variable {var_name} with value {initial_value}")
-
-            # Add new variables to MyObject
-            for var_name, initial_value in VARIABLES.items():
-                if var_name not in self.stored_variables:
-                    var = await myobj.add_variable(self.namespace, var_name, initial_value)
-                    await var.set_writable()
-                    logger.info(f"Added variable {var_name} with value {initial_value}")
-                    self.stored_variables[var_name] = initial_value
-
-            # Save the updated variables
-            self.save_variables(self.stored_variables)
-
-            # Set up monitoring with persistence
-            self.handler = SubHandler()
+            # Set up monitoring with persistence of every value change
+            self.handler = SubHandler(self.writer)
             self.subscription = await self.server.create_subscription(
-                period=500,
+                period=SUBSCRIPTION_CONFIG["publishing_interval"],
                 handler=self.handler
             )
+            self.writer.start()
+
+            # Add default variables that are not stored yet
+            stored_tags = self.store.load()
+            stored_names = stored_tags.get(NAMESPACE_URI, {})
+            new_variables = {
+                name: value for name, value in VARIABLES.items() if name not in stored_names and self.serves(name)
+            }
+            if new_variables:
+                self.store.upsert(new_variables, NAMESPACE_URI)
+                stored_tags.setdefault(NAMESPACE_URI, {}).update(new_variables)
 
-            # Subscribe to all variables
-            for node in await myobj.get_children():
-                await self.subscription.subscribe_data_change(node)
-                logger.info(f"Monitoring variable: {await node.read_browse_name()}")
+            # Restore stored variables with their last known values
+            stored_tags.setdefault(NAMESPACE_URI, {})
+            await self.config_handler.setup(self.server)
+            nodes, source = await self.restore_variables(stored_tags)
+            await self.config_handler.add_tag_store_methods()
+            if self.history_handler:
+                await self.history_handler.setup(self.server, self.namespace)
+                await self.historize_variables(nodes)
+            # Variables provisioned from now on are monitored and historized as they are added
+            self.config_handler.on_variables_added = self.monitor_variables
+            # and reported to clients with a GeneralModelChangeEvent
+            await self.model_changes.start(self.server)
+            self.server.iserver.node_mgt_service.reporter = self.model_changes
 
             # Start the server
             await self.server.start()
-            logger.info(f"Server started at {SERVER_URL}")
+            # Persistence subscriptions are created while the server already serves clients;
+            # their initial notifications catch any value written in the meantime
+            self.monitor_task = asyncio.create_task(self.subscribe_variables(nodes))
+            if METRICS_CONFIG["enabled"]:
+                # The supervisor serves METRICS_CONFIG["port"] in sharded mode
+                port = METRICS_CONFIG["port"] + 1 + self.shard[0] if self.shard else METRICS_CONFIG["port"]
+                self.metrics_server = await start_metrics_server(METRICS_CONFIG["host"], port, self.update_metrics)
+            STARTUP_SECONDS.set(time.perf_counter() - started)
+            if self.simulator:
+                await self.simulator.start(self.server, self.config_handler)
+            logger.info(
+                "Server started at %s in %.2fs with %d variables (%s)",
+                self.url, time.perf_counter() - started, len(nodes), source
+            )
 
         except Exception as e:
-            logger.error(f"Error setting up OPCUA server: {str(e)}")
+            logger.error("Error setting up OPCUA server: %s", e)
             raise
 
 
+    async def restore_variables(self, stored_tags):
+        """Create the stored variables, from the address space snapshot when it is current.
+
+        Returns ({name: node}, how they were restored).
+        """
+        # Namespaces are registered in stored order so snapshot NodeIds keep their indices
+        for namespace_uri in stored_tags:
+            await self.server.register_namespace(namespace_uri)
+        digest = config_hash(stored_tags, list(self.config_handler.namespace_indices()))
+        snapshot_nodes = await asyncio.to_thread(self.snapshot.load, digest) if self.snapshot else None
+        if snapshot_nodes is not None:
+            return self.config_handler.restore_snapshot(snapshot_nodes, stored_tags), "snapshot"
+
+        nodes = {}
+        for namespace_uri, variables in stored_tags.items():
+            nodes.update(await self.config_handler.add_namespace_and_variables(namespace_uri, variables, persist=False))
+            logger.info("Restored %s variables in %s", len(variables), namespace_uri)
+        if self.snapshot:
+            try:
+                # Copied on the loop, pickled and written in a thread
+                await asyncio.to_thread(self.snapshot.save, digest, self.config_handler.snapshot_nodes())
+            except Exception as e:
+                logger.error("Error saving address space snapshot: %s", e)
+        return nodes, "rebuilt" if self.snapshot else "built"
+
+    async def monitor_variables(self, nodes):
+        """Subscribe to and historize new variable nodes ({name: node})."""
+        await self.subscribe_variables(nodes)
+        if self.historian:
+            await self.historize_variables(nodes)
+
+    async def subscribe_variables(self, nodes):
+        """Subscribe to data changes of variable nodes ({name: node}) with their configured settings."""
+        items = list(nodes.items())
+        namespaces = {idx: uri for uri, idx in self.config_handler.namespace_indices().items()}
+        for start in range(0, len(items), PROVISION_BATCH_SIZE):
+            batch = items[start:start + PROVISION_BATCH_SIZE]
+            handles = [next(self.next_handle) for _ in batch]
+            requests = [
+                build_monitored_item_request(node.nodeid, handle, name)
+                for handle, (name, node) in zip(handles, batch)
+            ]
+            results = await self.subscription.create_monitored_items(requests)
+            for handle, (name, node), result in zip(handles, batch, results):
+                if isinstance(result, ua.StatusCode):
+                    logger.error("Failed to monitor variable %s: %s", name, result)
+                else:
+                    self.handler.names[handle] = (namespaces[node.nodeid.NamespaceIndex], name)
+                    logger.debug("Monitoring variable: %s", name)
+            await asyncio.sleep(0)
+        logger.info("Monitoring %s variables", len(nodes))
+
+    async def historize_variables(self, nodes):
+        """Enable HistoryRead on the configured variables among nodes ({name: node})."""
+        tags = HISTORY_CONFIG["tags"]
+        selected = {name: node for name, node in nodes.items() if tags is None or name in tags}
+        if not selected:
+            return
+        try:
+            await self.history_handler.historize(selected, period=timedelta(days=HISTORY_CONFIG["retention_days"]))
+        except Exception as e:
+            logger.error("Error enabling history: %s", e)
+
+    def update_metrics(self):
+        """Refresh queue depth gauges, called before the metrics are rendered."""
+        MONITORED_ITEMS.set(len(self.handler.names) if self.handler else 0)
+        PENDING_VALUES.set(len(self.writer.pending))
+        if self.historian:
+            HISTORY_BUFFER.set(len(self.historian.buffer))
+
     async def stop(self):
+        if self.simulator:
+            await self.simulator.stop()
+        if self.monitor_task:
+            self.monitor_task.cancel()
+            try:
+                await self.monitor_task
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger.error("Error monitoring variables: %s", e)
+        if self.metrics_server:
+            self.metrics_server.close()
+            await self.metrics_server.wait_closed()
+        await self.model_changes.stop()
         if self.subscription:
             await self.subscription.delete()
             logger.info("Subscription deleted")
+        await self.writer.stop()
         if self.server:
             await self.server.stop()
             logger.info("Server stopped")
+        self.store.close()
+
+def create_historian():
+    downsample_after = HISTORY_CONFIG["downsample_after_hours"]
+    return Historian(
+        HISTORY_CONFIG["path"],
+        retention=timedelta(days=HISTORY_CONFIG["retention_days"]),
+        downsample_after=timedelta(hours=downsample_after) if downsample_after else None,
+        downsample_interval=timedelta(seconds=HISTORY_CONFIG["downsample_interval_seconds"]),
+        flush_interval=HISTORY_CONFIG["flush_interval"],
+        max_buffer=HISTORY_CONFIG["max_buffer"],
+        maintenance_interval=HISTORY_CONFIG["maintenance_interval"],
+        rollup_levels=HISTORY_CONFIG["rollup_levels"],
+    )
 
-async def main():
-    server = OPCUAServer()
+def simulator_groups_from_args(args):
+    """Simulator group from the command line, or None to use SIMULATOR_CONFIG."""
+    if not args.simulate:
+        return None
+    return [{
+        "prefix": args.sim_prefix,
+        "count": args.simulate,
+        "waveform": args.sim_waveform,
+        "type": args.sim_type,
+        "rate": args.sim_rate,
+        "period": args.sim_period,
+    }]
+
+def simulator_args(args) -> list:
+    """The simulator options of args, passed on to shard workers."""
+    if not args.simulate:
+        return []
+    return [
+        "--simulate", str(args.simulate), "--sim-rate", str(args.sim_rate), "--sim-waveform", args.sim_waveform,
+        "--sim-type", args.sim_type, "--sim-period", str(args.sim_period), "--sim-prefix", args.sim_prefix,
+    ]
+
+def parse_shard(text: str):
+    """"<index>/<count>" as (index, count)."""
+    index, _, count = text.partition("/")
+    shard = int(index), int(count)
+    if not 0 <= shard[0] < shard[1]:
+        raise ValueError(f"Invalid shard {text!r}")
+    return shard
+
+async def main(args):
+    # SIGTERM (systemd, the shard supervisor) shuts down as cleanly as Ctrl+C
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    if args.workers > 1:
+        try:
+            await run_supervisor(args.workers, simulator_args(args))
+        except asyncio.CancelledError:
+            logger.info("Shutdown requested")
+        return
+    server = OPCUAServer(simulator_groups=simulator_groups_from_args(args), shard=args.shard)
     try:
-        logger.info(f"Starting OPCUA server at {SERVER_URL}")
+        logger.info("Starting OPCUA server at %s", server.url)
         await server.setup()
 
         while True:
@@ -149,11 +357,24 @@ async def main():
 
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received")
+    except asyncio.CancelledError:
+        logger.info("Shutdown requested")
     except Exception as e:
-        logger.error(f"Server error: {str(e)}")
+        logger.error("Server error: %s", e)
     finally:
         logger.info("Stopping OPCUA server")
         await server.stop()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="OPC UA server for MyObject tags")
+    parser.add_argument("--simulate", type=int, metavar="N", help="simulate N changing tags (see SIMULATOR_CONFIG)")
+    parser.add_argument("--sim-rate", type=float, default=10.0, help="updates per second of each simulated tag")
+    parser.add_argument("--sim-waveform", default="sine", choices=[*WAVEFORMS, *STATEFUL_WAVEFORMS])
+    parser.add_argument("--sim-type", default="Double", choices=list(VARIANT_TYPES))
+    parser.add_argument("--sim-period", type=float, default=10.0, help="seconds per waveform cycle")
+    parser.add_argument("--sim-prefix", default="sim", help="simulated tags are named <prefix>_<i>")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="partition the tags across N server processes (see SHARD_CONFIG)")
+    parser.add_argument("--shard", type=parse_shard, metavar="INDEX/COUNT",
+                        help="serve one shard; set by the supervisor for its workers")
+    asyncio.run(main(parser.parse_args()))
\ No newline at end of file
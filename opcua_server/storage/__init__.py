@@ -0,0 +1,6 @@
+from .tag_store import TagStore
+from .value_writer import LastValueWriter
+from .historian import Historian
+from .snapshot import AddressSpaceSnapshot, config_hash
+
+__all__ = ["TagStore", "LastValueWriter", "Historian", "AddressSpaceSnapshot", "config_hash"]
@@ -0,0 +1,63 @@
+import numpy as np
+
+def rollup_rows(nodes: np.ndarray, timestamps: np.ndarray, values: list, level: int) -> list:
+    """Summarize a batch of samples per (node, level-wide interval).
+
+    nodes and timestamps (microseconds) are int64 arrays and values the
+    matching sample values. Returns (node, interval start, count, min, max,
+    sum, last timestamp, last value) rows; min/max/sum are None for intervals
+    without numeric samples.
+    """
+    numeric = np.fromiter(
+        (v if isinstance(v, (int, float)) else np.nan for v in values), dtype=np.float64, count=len(values)
+    )
+    intervals = timestamps // level * level
+    order = np.lexsort((timestamps, intervals, nodes))
+    nodes, intervals, timestamps, numeric = nodes[order], intervals[order], timestamps[order], numeric[order]
+    boundaries = np.flatnonzero((np.diff(nodes) != 0) | (np.diff(intervals) != 0)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.append(boundaries, len(nodes))
+    has_numeric = np.add.reduceat(~np.isnan(numeric), starts) > 0
+    mins = np.where(has_numeric, np.fmin.reduceat(numeric, starts), np.nan)
+    maxs = np.where(has_numeric, np.fmax.reduceat(numeric, starts), np.nan)
+    sums = np.where(has_numeric, np.add.reduceat(np.nan_to_num(numeric), starts), np.nan)
+    return list(zip(
+        nodes[starts].tolist(),
+        intervals[starts].tolist(),
+        (ends - starts).tolist(),
+        nan_to_none(mins),
+        nan_to_none(maxs),
+        nan_to_none(sums),
+        timestamps[ends - 1].tolist(),
+        [values[i] for i in order[ends - 1].tolist()],
+    ))
+
+def merge_rollups(timestamps: np.ndarray, counts: np.ndarray, mins: np.ndarray, maxs: np.ndarray,
+                  sums: np.ndarray, lasts: list, start: float, bucket: float) -> dict:
+    """Combine time-ordered rollup rows (epoch seconds, NaN for missing numbers) into buckets.
+
+    bucket must be a multiple of the rollup interval so no row straddles two
+    buckets. Returns the same columns as bucket_aggregates.
+    """
+    if len(timestamps) == 0:
+        return {"start": [], "count": [], "min": None, "max": None, "avg": None, "last": []}
+    index = np.floor((timestamps - start) / bucket).astype(np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(index)) + 1))
+    ends = np.append(starts[1:], len(index))
+    count = np.add.reduceat(counts, starts)
+    result = {
+        "start": (start + index[starts] * bucket).tolist(),
+        "count": count.tolist(),
+        "min": None,
+        "max": None,
+        "avg": None,
+        "last": [lasts[i] for i in (ends - 1).tolist()],
+    }
+    if not np.all(np.isnan(sums)):
+        result["min"] = nan_to_none(np.fmin.reduceat(mins, starts))
+        result["max"] = nan_to_none(np.fmax.reduceat(maxs, starts))
+        result["avg"] = nan_to_none(np.add.reduceat(np.nan_to_num(sums), starts) / count)
+    return result
+
+def nan_to_none(column: np.ndarray) -> list:
+    return [None if value != value else value for value in column.tolist()]
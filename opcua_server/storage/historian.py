@@ -0,0 +1,478 @@
+import asyncio
+import sqlite3
+import threading
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from asyncua import ua
+from asyncua.common.utils import Buffer
+from asyncua.server.history import HistoryStorageInterface
+from asyncua.ua.ua_binary import variant_from_binary, variant_to_binary
+from common.aggregation import bucket_aggregates
+from .aggregation import rollup_rows, merge_rollups
+from utils.logger import get_logger
+from utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+WRITE_SECONDS = REGISTRY.histogram("historian_write_seconds", "Time to write one batch of history samples")
+SAMPLES_WRITTEN = REGISTRY.counter("historian_samples_written_total", "History samples written to the database")
+DUPLICATE_SAMPLES = REGISTRY.counter(
+    "historian_duplicate_samples_total", "History samples rejected for repeating a stored sample's timestamp"
+)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS nodes (
+        id INTEGER PRIMARY KEY,
+        node_id TEXT NOT NULL UNIQUE,
+        period REAL,
+        count INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    # Clustered on (node, ts): each tag's samples are stored contiguously in time order
+    """
+    CREATE TABLE IF NOT EXISTS samples (
+        node INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        status INTEGER NOT NULL,
+        vtype INTEGER,
+        value,
+        PRIMARY KEY (node, ts)
+    ) WITHOUT ROWID
+    """,
+    # Per-interval summaries at each rollup level, kept up to date as samples are written
+    """
+    CREATE TABLE IF NOT EXISTS rollups (
+        level INTEGER NOT NULL,
+        node INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        min REAL,
+        max REAL,
+        sum REAL,
+        last_ts INTEGER NOT NULL,
+        last,
+        PRIMARY KEY (level, node, ts)
+    ) WITHOUT ROWID
+    """,
+]
+
+MERGE_ROLLUP = """
+INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (level, node, ts) DO UPDATE SET
+    count = count + excluded.count,
+    min = MIN(COALESCE(min, excluded.min), COALESCE(excluded.min, min)),
+    max = MAX(COALESCE(max, excluded.max), COALESCE(excluded.max, max)),
+    sum = CASE WHEN sum IS NULL AND excluded.sum IS NULL THEN NULL
+               ELSE IFNULL(sum, 0) + IFNULL(excluded.sum, 0) END,
+    last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END,
+    last_ts = MAX(last_ts, excluded.last_ts)
+"""
+
+# Scalars of these types are stored as native SQLite values; anything else as a binary Variant
+NATIVE_TYPES = {
+    ua.VariantType.Boolean, ua.VariantType.SByte, ua.VariantType.Byte, ua.VariantType.Int16,
+    ua.VariantType.UInt16, ua.VariantType.Int32, ua.VariantType.UInt32, ua.VariantType.Int64,
+    ua.VariantType.UInt64, ua.VariantType.Float, ua.VariantType.Double, ua.VariantType.String,
+}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def to_micros(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return round(dt.timestamp() * 1e6)
+
+def from_micros(ts: int) -> datetime:
+    return EPOCH + timedelta(microseconds=ts)
+
+class Historian(HistoryStorageInterface):
+    """Embedded time-series store behind asyncua's HistoryRead service.
+
+    Samples are appended to an in-memory buffer by save_node_value and written
+    to SQLite (WAL mode) in large batches from a worker thread, so the event
+    loop never waits for disk I/O. A maintenance pass applies retention (the
+    per-node period/count passed to historize_node_data_change, capped by
+    retention) and downsamples samples older than downsample_after to the last
+    value per downsample_interval.
+
+    A node has at most one sample per timestamp. A sample with the timestamp
+    of one already stored (or earlier in the same batch) is rejected and
+    counted in historian_duplicate_samples_total; the first one stays.
+
+    Each write also updates count/min/max/sum/last rollups per
+    rollup_levels-second interval from the samples it inserted, so aggregate
+    queries over long ranges read a few rows per bucket instead of every raw
+    sample. Retention removes rollups along with the samples.
+    """
+    def __init__(self, path, retention: timedelta = timedelta(days=30),
+                 downsample_after: timedelta = None, downsample_interval: timedelta = timedelta(minutes=1),
+                 flush_interval: float = 1.0, max_buffer: int = 100000, maintenance_interval: float = 300.0,
+                 rollup_levels=(60, 300, 3600), max_history_data_response_size: int = 10000):
+        super().__init__(max_history_data_response_size)
+        self.path = path
+        self.rollup_levels = sorted(rollup_levels)
+        self.retention = retention
+        self.downsample_after = downsample_after
+        self.downsample_interval = downsample_interval
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.maintenance_interval = maintenance_interval
+        self.nodes = {}  # NodeId string -> integer key
+        self.buffer = []
+        self.samples_written = 0
+        self._write_conn = None
+        self._read_conn = None
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._wakeup = None
+        self._tasks = []
+        self._warned_events = False
+
+    async def init(self):
+        await asyncio.to_thread(self._open)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._flush_loop()), asyncio.create_task(self._maintenance_loop())]
+        logger.info("Historian opened at %s with %s historized nodes", self.path, len(self.nodes))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush()
+        await asyncio.to_thread(self._close)
+        logger.info("Historian stopped after writing %s samples", self.samples_written)
+
+    async def new_historized_node(self, node_id, period, count=0):
+        key = await asyncio.to_thread(self._register_node, node_id.to_string(), period, count)
+        self.nodes[node_id.to_string()] = key
+
+    async def new_historized_nodes(self, node_ids, period, count=0):
+        """Register many nodes with one database transaction. Returns their integer keys, in order."""
+        names = [node_id.to_string() for node_id in node_ids]
+        keys = await asyncio.to_thread(self._register_nodes, names, period, count)
+        self.nodes.update(zip(names, keys))
+        return keys
+
+    async def save_node_value(self, node_id, datavalue):
+        key = self.nodes.get(node_id.to_string())
+        if key is None:
+            return
+        self.stage(key, datavalue)
+
+    def stage(self, key: int, datavalue: ua.DataValue):
+        """Buffer one sample; cheap enough to call 100k times per second from the event loop."""
+        timestamp = datavalue.SourceTimestamp or datavalue.ServerTimestamp or datetime.now(timezone.utc)
+        variant = datavalue.Value
+        if variant is None:
+            vtype, value = None, None
+        elif variant.VariantType in NATIVE_TYPES and not variant.is_array:
+            vtype, value = variant.VariantType.value, variant.Value
+        else:
+            vtype, value = None, variant_to_binary(variant)
+        status = datavalue.StatusCode.value if datavalue.StatusCode is not None else 0
+        self.buffer.append((key, to_micros(timestamp), status, vtype, value))
+        if len(self.buffer) >= self.max_buffer:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Write all buffered samples in one transaction off the event loop."""
+        if not self.buffer:
+            return
+        rows, self.buffer = self.buffer, []
+        try:
+            with WRITE_SECONDS.time():
+                written = await asyncio.to_thread(self._write, rows)
+            self.samples_written += written
+            SAMPLES_WRITTEN.inc(written)
+            if written < len(rows):
+                DUPLICATE_SAMPLES.inc(len(rows) - written)
+                logger.warning("Rejected %s history samples repeating the timestamp of a stored sample",
+                               len(rows) - written)
+        except Exception as e:
+            logger.error("Error writing %s history samples: %s", len(rows), e)
+
+    async def read_node_history(self, node_id, start, end, nb_values):
+        key = self.nodes.get(node_id.to_string())
+        if key is None:
+            return [], None
+        # Make buffered samples visible to the read
+        await self.flush()
+        # Same bounds semantics as asyncua's SQLite backend: a missing start reads newest first
+        order = "ASC"
+        if start is None or start == ua.get_win_epoch():
+            order = "DESC"
+            start = EPOCH
+        if end is None or end == ua.get_win_epoch():
+            end = datetime.now(timezone.utc) + timedelta(days=1)
+        start, end = to_micros(start), to_micros(end)
+        if start > end:
+            order = "DESC"
+            start, end = end, start
+        limit = self.max_history_data_response_size + 1
+        if nb_values:
+            limit = min(nb_values, limit)
+        rows = await asyncio.to_thread(self._read, key, start, end, order, limit)
+        results = [self._to_datavalue(row) for row in rows]
+        cont = None
+        if len(results) > self.max_history_data_response_size:
+            cont = results[self.max_history_data_response_size].SourceTimestamp
+            results = results[:self.max_history_data_response_size]
+        return results, cont
+
+    async def read_aggregates(self, node_id: str, start: datetime, end: datetime, bucket: float) -> dict:
+        """Min/max/avg/last/count per bucket of bucket seconds for one node, computed with NumPy.
+
+        Buckets of at least one rollup interval are built from the coarsest
+        fitting rollup level; the bucket is then rounded to a multiple of that
+        interval and returned as "bucket". Returns columns as lists: start
+        (epoch seconds), count, min, max, avg (None for non-numeric tags) and
+        last.
+        """
+        key = self.nodes.get(node_id)
+        if key is None:
+            raise KeyError(f"{node_id} is not historized")
+        await self.flush()
+        return await asyncio.to_thread(self._aggregate, key, to_micros(start), to_micros(end), bucket)
+
+    # Events are not recorded: registering a source logs once, and event reads return no events
+
+    async def new_historized_event(self, source_id, evtypes, period, count=0):
+        if not self._warned_events:
+            self._warned_events = True
+            logger.warning("Event history is not supported; events of %s and other sources are not recorded",
+                           source_id)
+
+    async def save_event(self, event):
+        pass
+
+    async def read_event_history(self, source_id, start, end, nb_values, evfilter):
+        return [], None
+
+    async def maintain(self):
+        """Apply retention and downsampling once."""
+        try:
+            removed = await asyncio.to_thread(self._maintain)
+            if removed:
+                logger.info("Historian maintenance removed %s samples", removed)
+        except Exception as e:
+            logger.error("Error during historian maintenance: %s", e)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            await self.maintain()
+
+    @staticmethod
+    def _to_datavalue(row) -> ua.DataValue:
+        ts, status, vtype, value = row
+        if vtype is not None:
+            variant = ua.Variant(value, ua.VariantType(vtype))
+        elif value is not None:
+            variant = variant_from_binary(Buffer(value))
+        else:
+            variant = ua.Variant()
+        timestamp = from_micros(ts)
+        return ua.DataValue(variant, StatusCode=ua.StatusCode(status), SourceTimestamp=timestamp,
+                            ServerTimestamp=timestamp)
+
+    # The methods below run in worker threads
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _open(self):
+        self._write_conn = self._connect()
+        for statement in SCHEMA:
+            self._write_conn.execute(statement)
+        self._read_conn = self._connect()
+        for key, node_id in self._write_conn.execute("SELECT id, node_id FROM nodes"):
+            self.nodes[node_id] = key
+
+    def _close(self):
+        with self._write_lock:
+            self._write_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._write_conn.close()
+        with self._read_lock:
+            self._read_conn.close()
+
+    def _register_node(self, node_id: str, period, count: int) -> int:
+        seconds = period.total_seconds() if period else None
+        with self._write_lock:
+            self._write_conn.execute(
+                "INSERT INTO nodes (node_id, period, count) VALUES (?, ?, ?) "
+                "ON CONFLICT(node_id) DO UPDATE SET period = excluded.period, count = excluded.count",
+                (node_id, seconds, count),
+            )
+            return self._write_conn.execute("SELECT id FROM nodes WHERE node_id = ?", (node_id,)).fetchone()[0]
+
+    def _register_nodes(self, node_ids, period, count: int) -> list:
+        seconds = period.total_seconds() if period else None
+        with self._write_lock:
+            self._write_conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_conn.executemany(
+                    "INSERT INTO nodes (node_id, period, count) VALUES (?, ?, ?) "
+                    "ON CONFLICT(node_id) DO UPDATE SET period = excluded.period, count = excluded.count",
+                    [(node_id, seconds, count) for node_id in node_ids],
+                )
+            except Exception:
+                self._write_conn.execute("ROLLBACK")
+                raise
+            self._write_conn.execute("COMMIT")
+            keys = dict(self._write_conn.execute("SELECT node_id, id FROM nodes"))
+        return [keys[node_id] for node_id in node_ids]
+
+    def _write(self, rows) -> int:
+        """Insert the samples that are not duplicates. Returns the number inserted."""
+        with self._write_lock:
+            self._write_conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._new_samples(rows)
+                self._write_conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", rows)
+                if self.rollup_levels and rows:
+                    self._write_rollups(rows)
+            except Exception:
+                self._write_conn.execute("ROLLBACK")
+                raise
+            self._write_conn.execute("COMMIT")
+        return len(rows)
+
+    def _new_samples(self, rows) -> list:
+        """rows without those whose (node, ts) is already stored or repeats an earlier row."""
+        spans = {}  # Node -> (first, last) timestamp in this batch
+        for row in rows:
+            first, last = spans.get(row[0], (row[1], row[1]))
+            spans[row[0]] = (min(first, row[1]), max(last, row[1]))
+        # New samples are normally newer than anything stored, so these lookups find nothing
+        taken = set()
+        for key, (first, last) in spans.items():
+            taken.update((key, row[0]) for row in self._write_conn.execute(
+                "SELECT ts FROM samples WHERE node = ? AND ts BETWEEN ? AND ?", (key, first, last)
+            ))
+        new = []
+        for row in rows:
+            if (row[0], row[1]) not in taken:
+                taken.add((row[0], row[1]))
+                new.append(row)
+        return new
+
+    def _read(self, key: int, start: int, end: int, order: str, limit: int):
+        with self._read_lock:
+            return self._read_conn.execute(
+                f"SELECT ts, status, vtype, value FROM samples WHERE node = ? AND ts BETWEEN ? AND ? "
+                f"ORDER BY ts {order} LIMIT ?",
+                (key, start, end, limit),
+            ).fetchall()
+
+    def _write_rollups(self, rows):
+        nodes = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        timestamps = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        # Binary Variants are not summarized
+        values = [row[4] if row[3] is not None else None for row in rows]
+        for level in self.rollup_levels:
+            summaries = rollup_rows(nodes, timestamps, values, level * 1000000)
+            self._write_conn.executemany(MERGE_ROLLUP, [(level, *summary) for summary in summaries])
+
+    def _aggregate(self, key: int, start: int, end: int, bucket: float) -> dict:
+        levels = [level for level in self.rollup_levels if level <= bucket]
+        if levels:
+            return self._aggregate_rollups(key, start, end, bucket, levels[-1])
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT ts, vtype, value FROM samples WHERE node = ? AND ts BETWEEN ? AND ? AND value IS NOT NULL "
+                "ORDER BY ts",
+                (key, start, end),
+            ).fetchall()
+        timestamps = np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows)) / 1e6
+        try:
+            values = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        except (TypeError, ValueError):
+            # Strings and binary Variants only get count and last
+            values = np.array([row[2] if row[1] is not None else None for row in rows], dtype=object)
+        aggregates = bucket_aggregates(timestamps, values, start / 1e6, bucket)
+        result = {
+            name: column.tolist() if hasattr(column, "tolist") else column
+            for name, column in aggregates.items()
+        }
+        result["bucket"] = bucket
+        return result
+
+    def _aggregate_rollups(self, key: int, start: int, end: int, bucket: float, level: int) -> dict:
+        bucket = round(bucket / level) * level
+        start = start // (level * 1000000) * level * 1000000
+        with self._read_lock:
+            rows = self._read_conn.execute(
+                "SELECT ts, count, min, max, sum, last FROM rollups WHERE level = ? AND node = ? AND ts BETWEEN ? AND ? "
+                "ORDER BY ts",
+                (level, key, start, end),
+            ).fetchall()
+        columns = list(zip(*rows)) if rows else [()] * 6
+        result = merge_rollups(
+            np.array(columns[0], dtype=np.float64) / 1e6,
+            np.array(columns[1], dtype=np.int64),
+            np.array(columns[2], dtype=np.float64),
+            np.array(columns[3], dtype=np.float64),
+            np.array(columns[4], dtype=np.float64),
+            columns[5],
+            start / 1e6,
+            bucket,
+        )
+        result["bucket"] = bucket
+        return result
+
+    def _maintain(self) -> int:
+        now = to_micros(datetime.now(timezone.utc))
+        max_age = self.retention.total_seconds() if self.retention else None
+        removed = 0
+        with self._write_lock:
+            nodes = self._write_conn.execute("SELECT id, period, count FROM nodes").fetchall()
+            self._write_conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key, period, count in nodes:
+                    ages = [age for age in (period, max_age) if age]
+                    if ages:
+                        cutoff = now - int(min(ages) * 1e6)
+                        removed += self._write_conn.execute(
+                            "DELETE FROM samples WHERE node = ? AND ts < ?", (key, cutoff)
+                        ).rowcount
+                        self._write_conn.execute("DELETE FROM rollups WHERE node = ? AND ts < ?", (key, cutoff))
+                    if count:
+                        removed += self._write_conn.execute(
+                            "DELETE FROM samples WHERE node = ? AND ts < ("
+                            "SELECT ts FROM samples WHERE node = ? ORDER BY ts DESC LIMIT 1 OFFSET ?)",
+                            (key, key, count - 1),
+                        ).rowcount
+                        # Rollups go with the samples they summarize, once their interval is entirely older
+                        self._write_conn.execute(
+                            "DELETE FROM rollups WHERE node = ? AND ts + level * 1000000 <= ("
+                            "SELECT MIN(ts) FROM samples WHERE node = ?)",
+                            (key, key),
+                        )
+                    if self.downsample_after:
+                        # Keep only the last sample of each interval older than downsample_after
+                        cutoff = now - int(self.downsample_after.total_seconds() * 1e6)
+                        bucket = int(self.downsample_interval.total_seconds() * 1e6)
+                        removed += self._write_conn.execute(
+                            "DELETE FROM samples WHERE node = ? AND ts < ? AND ts NOT IN ("
+                            "SELECT MAX(ts) FROM samples WHERE node = ? AND ts < ? GROUP BY ts / ?)",
+                            (key, cutoff, key, cutoff, bucket),
+                        ).rowcount
+            except Exception:
+                self._write_conn.execute("ROLLBACK")
+                raise
+            self._write_conn.execute("COMMIT")
+        return removed
@@ -0,0 +1,196 @@
+import gc
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+import asyncua
+from asyncua import ua
+from asyncua.server.address_space import AttributeValue, NodeData
+from common.nodes import as_variant
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when the snapshot layout changes; old files are then rebuilt
+SNAPSHOT_FORMAT = 1
+
+# Enum members by value; calling the enum classes dominates unpacking time
+ATTRIBUTE_IDS = {member.value: member for member in ua.AttributeIds}
+NODE_ID_TYPES = {member.value: member for member in ua.NodeIdType}
+NODE_CLASSES = {member.value: member for member in ua.NodeClass}
+VARIANT_TYPES = {member.value: member for member in ua.VariantType}
+
+def type_signature(value) -> str:
+    """VariantType a tag value is created with, plus [] for arrays."""
+    variant = as_variant(value)
+    return variant.VariantType.name + ("[]" if variant.is_array else "")
+
+def config_hash(tags: dict, namespaces: list) -> str:
+    """Content hash of the tag configuration a snapshot was built from.
+
+    Covers the namespace array and every tag's namespace, name and value
+    type, but not the values themselves, which are restored from the tag
+    store on every start.
+    """
+    content = {
+        "format": SNAPSHOT_FORMAT,
+        "asyncua": asyncua.__version__,
+        "namespaces": namespaces,
+        "tags": {uri: {name: type_signature(value) for name, value in sorted(variables.items())}
+                 for uri, variables in sorted(tags.items())},
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+class AddressSpaceSnapshot:
+    """Saved copy of part of the server's address space, keyed by a config hash.
+
+    Restoring inserts the saved NodeData straight into the address space in
+    one pass, instead of creating every node through AddNodes. A snapshot
+    whose hash does not match the current tag configuration is ignored and
+    rebuilt by the caller.
+
+    Unpickling thousands of asyncua dataclasses is slower than creating the
+    nodes, so each node is stored as plain tuples: its NodeId, names, Value
+    and references. Attribute values that are the same on many nodes
+    (DataType, AccessLevel, ...) are stored once and shared.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def load(self, digest: str):
+        """Return the saved nodes as NodeData, or None when missing, stale or unreadable."""
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+            if snapshot.get("format") != SNAPSHOT_FORMAT or snapshot.get("hash") != digest:
+                logger.info("Tag configuration changed, address space snapshot is stale")
+                return None
+            # Collections over the growing heap would cost more than the unpacking itself.
+            # The nodes live as long as the server, so they are frozen out of later collections.
+            gc.disable()
+            try:
+                nodes = [unpack_node(node, snapshot["shared"]) for node in snapshot["nodes"]]
+                gc.freeze()
+            finally:
+                gc.enable()
+            return nodes
+        except Exception as e:
+            logger.warning("Ignoring unreadable address space snapshot %s: %s", self.path, e)
+            return None
+
+    def save(self, digest: str, nodes: list):
+        """Atomically replace the snapshot with nodes from capture_nodes."""
+        shared = SharedValues()
+        snapshot = {
+            "format": SNAPSHOT_FORMAT,
+            "hash": digest,
+            "nodes": [pack_node(node, shared) for node in nodes],
+            "shared": shared.values,
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        logger.info("Saved address space snapshot of %s nodes to %s", len(nodes), self.path)
+
+    def delete(self):
+        self.path.unlink(missing_ok=True)
+
+class SharedValues:
+    """Table of distinct attribute values, referenced by index from packed nodes."""
+    def __init__(self):
+        self.values = []
+        self.indices = {}
+
+    def index(self, value) -> int:
+        key = repr(value)
+        if key not in self.indices:
+            self.indices[key] = len(self.values)
+            self.values.append(value)
+        return self.indices[key]
+
+def capture_nodes(aspace, node_ids) -> list:
+    """Current (nodeid, {attribute: DataValue}, references) of node_ids, for AddressSpaceSnapshot.save.
+
+    Only references are taken here, so this is cheap to run on the event loop;
+    attribute values are replaced rather than modified on write.
+    """
+    nodes = []
+    for node_id in node_ids:
+        source = aspace[node_id]
+        attributes = {attr: value.value for attr, value in source.attributes.items() if value.value is not None}
+        nodes.append((source.nodeid, attributes, list(source.references)))
+    return nodes
+
+def insert_nodes(aspace, nodes):
+    """Insert loaded NodeData into the address space as they are."""
+    for nodedata in nodes:
+        aspace[nodedata.nodeid] = nodedata
+
+def pack_node_id(node_id) -> tuple:
+    return node_id.Identifier, node_id.NamespaceIndex, node_id.NodeIdType.value
+
+def unpack_node_id(packed) -> ua.NodeId:
+    identifier, namespace_index, node_id_type = packed
+    return ua.NodeId(identifier, namespace_index, NODE_ID_TYPES[node_id_type])
+
+def pack_node(node, shared: SharedValues) -> tuple:
+    node_id, attributes, references = node
+    names = {}
+    value = None
+    others = []
+    for attr, datavalue in attributes.items():
+        if attr == ua.AttributeIds.NodeId:
+            continue
+        if attr == ua.AttributeIds.BrowseName:
+            names[int(attr)] = (datavalue.Value.Value.Name, datavalue.Value.Value.NamespaceIndex)
+        elif attr in (ua.AttributeIds.DisplayName, ua.AttributeIds.Description):
+            names[int(attr)] = (datavalue.Value.Value.Text, datavalue.Value.Value.Locale)
+        elif attr == ua.AttributeIds.Value:
+            variant = datavalue.Value
+            value = (variant.Value, variant.VariantType.value, variant.Dimensions, variant.is_array)
+        else:
+            others.append((int(attr), shared.index(datavalue)))
+    refs = [
+        (shared.index(ref.ReferenceTypeId), ref.IsForward, pack_node_id(ref.NodeId),
+         ref.BrowseName.Name, ref.BrowseName.NamespaceIndex, ref.DisplayName.Text,
+         ref.NodeClass.value, shared.index(ref.TypeDefinition))
+        for ref in references
+    ]
+    return pack_node_id(node_id), names, value, others, refs
+
+def unpack_node(packed, shared: list) -> NodeData:
+    node_id, names, value, others, refs = packed
+    nodedata = NodeData(unpack_node_id(node_id))
+    attributes = nodedata.attributes
+    attributes[ua.AttributeIds.NodeId] = AttributeValue(
+        ua.DataValue(ua.Variant(nodedata.nodeid, ua.VariantType.NodeId))
+    )
+    for attr, (name, extra) in names.items():
+        if attr == ua.AttributeIds.BrowseName:
+            variant = ua.Variant(ua.QualifiedName(name, extra), ua.VariantType.QualifiedName)
+        else:
+            variant = ua.Variant(ua.LocalizedText(name, extra), ua.VariantType.LocalizedText)
+        attributes[ATTRIBUTE_IDS[attr]] = AttributeValue(ua.DataValue(variant))
+    if value is not None:
+        data, variant_type, dimensions, is_array = value
+        attributes[ua.AttributeIds.Value] = AttributeValue(
+            ua.DataValue(ua.Variant(data, VARIANT_TYPES[variant_type], dimensions, is_array))
+        )
+    for attr, index in others:
+        # Shared DataValues are safe: writes replace an attribute's DataValue
+        attributes[ATTRIBUTE_IDS[attr]] = AttributeValue(shared[index])
+    nodedata.references = [
+        ua.ReferenceDescription(
+            ReferenceTypeId=shared[ref_type], IsForward=is_forward, NodeId=unpack_node_id(target),
+            BrowseName=ua.QualifiedName(name, namespace_index), DisplayName=ua.LocalizedText(display_name),
+            NodeClass=NODE_CLASSES[node_class], TypeDefinition=shared[type_definition],
+        )
+        for ref_type, is_forward, target, name, namespace_index, display_name, node_class, type_definition in refs
+    ]
+    return nodedata
@@ -0,0 +1,221 @@
+import base64
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from asyncua import ua
+from common.nodes import as_variant
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# A tag is identified by its namespace and name; the same name may exist in several namespaces
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    name TEXT NOT NULL,
+    namespace_uri TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace_uri, name)
+)
+"""
+
+# Every value is stored as {"$type": VariantType name, "value": JSON value}, so
+# Float, UInt32, DateTime etc. come back with the same VariantType on restart.
+# Types JSON has no representation for go through these codecs, item by item
+# for arrays.
+TYPE_KEY = "$type"
+VALUE_CODECS = {
+    "DateTime": (datetime.isoformat, datetime.fromisoformat),
+    "ByteString": (lambda value: base64.b64encode(value).decode("ascii"), base64.b64decode),
+    "Guid": (str, uuid.UUID),
+}
+
+def _convert(value, convert):
+    if isinstance(value, list):
+        return [_convert(item, convert) for item in value]
+    return None if value is None else convert(value)
+
+def _unstorable(value):
+    raise TypeError(f"{type(value).__name__} values cannot be stored")
+
+def _inferred_type(value):
+    """VariantType ua.Variant(value) picks, None where it cannot tell (empty lists)."""
+    try:
+        return ua.Variant(value).VariantType
+    except ua.UaError:
+        return None
+
+def _decode_typed(obj):
+    if obj.keys() != {TYPE_KEY, "value"} or obj[TYPE_KEY] not in ua.VariantType.__members__:
+        return obj
+    variant_type = ua.VariantType[obj[TYPE_KEY]]
+    value = obj["value"]
+    if variant_type.name in VALUE_CODECS:
+        value = _convert(value, VALUE_CODECS[variant_type.name][1])
+    # Plain values where they infer to the stored type, Variants for the rest (Float, UInt32, ...)
+    return value if _inferred_type(value) == variant_type else ua.Variant(value, variant_type)
+
+def encode_value(value) -> str:
+    """JSON text of a tag value (a ua.Variant or a plain value) with its VariantType.
+
+    Plain values without an inferable type (empty lists) are stored as plain
+    JSON. Raises TypeError or ValueError for values that cannot be stored.
+    """
+    if not isinstance(value, ua.Variant) and _inferred_type(value) is None:
+        return json.dumps(value, default=_unstorable)
+    variant = as_variant(value)
+    stored = variant.Value
+    if variant.VariantType.name in VALUE_CODECS:
+        stored = _convert(stored, VALUE_CODECS[variant.VariantType.name][0])
+    return json.dumps({TYPE_KEY: variant.VariantType.name, "value": stored}, default=_unstorable)
+
+def decode_value(text: str):
+    """Tag value of encode_value text; plain JSON from older stores is returned as is."""
+    return json.loads(text, object_hook=_decode_typed)
+
+class TagStore:
+    """Crash-safe store for tag definitions and their last values.
+
+    Backed by SQLite in WAL mode: every change is a small transaction touching
+    only the changed rows, and an interrupted write is rolled back on the next
+    open instead of corrupting the file. The OPC UA server process is the only
+    writer; other processes read through the server (see the TagStore object's
+    GetVariables method).
+    """
+    def __init__(self, path, default_namespace_uri: str):
+        self.path = Path(path)
+        self.default_namespace_uri = default_namespace_uri
+        self.conn = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Open the database, creating the schema on first use."""
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is crash-safe in WAL mode; a power cut can only lose the last commits
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA.format(table="tags"))
+        self._migrate_key()
+        logger.info("Tag store opened at %s", self.path)
+
+    def _migrate_key(self):
+        """Rebuild a tags table keyed by name alone (older stores) with the (namespace_uri, name) key."""
+        # table_info rows are (cid, name, type, notnull, default, pk position)
+        columns = self.conn.execute("PRAGMA table_info(tags)").fetchall()
+        key = [column[1] for column in sorted(columns, key=lambda column: column[5]) if column[5]]
+        if key == ["namespace_uri", "name"]:
+            return
+        with self._transaction():
+            self.conn.execute(SCHEMA.format(table="tags_keyed"))
+            self.conn.execute(
+                "INSERT INTO tags_keyed (name, namespace_uri, value, updated_at) "
+                "SELECT name, namespace_uri, value, updated_at FROM tags ORDER BY rowid"
+            )
+            self.conn.execute("DROP TABLE tags")
+            self.conn.execute("ALTER TABLE tags_keyed RENAME TO tags")
+        logger.info("Tag store rekeyed by namespace and name")
+
+    def _key(self, key) -> tuple:
+        """(namespace_uri, name) of a tag key; a bare name is in the default namespace."""
+        return key if isinstance(key, tuple) else (self.default_namespace_uri, key)
+
+    def close(self):
+        if self.conn is None:
+            return
+        with self._lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.conn.close()
+            self.conn = None
+        logger.info("Tag store closed")
+
+    def migrate_json(self, json_path) -> int:
+        """Import a legacy variables_store.json into an empty store. Returns the number of imported tags."""
+        json_path = Path(json_path)
+        if not json_path.exists() or self.count():
+            return 0
+        try:
+            with open(json_path, 'r') as f:
+                variables = json.load(f)
+        except Exception as e:
+            logger.error("Error reading legacy variables store %s: %s", json_path, e)
+            return 0
+        self.upsert(variables)
+        logger.info("Migrated %s variables from %s", len(variables), json_path)
+        return len(variables)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tags").fetchone()[0]
+
+    def load(self) -> dict:
+        """Return {namespace_uri: {name: value}} for every stored tag."""
+        with self._lock:
+            rows = self.conn.execute("SELECT name, namespace_uri, value FROM tags ORDER BY rowid").fetchall()
+        tags = {}
+        for name, namespace_uri, value in rows:
+            tags.setdefault(namespace_uri, {})[name] = decode_value(value)
+        return tags
+
+    def load_values(self) -> dict:
+        """Return {name: value} for every stored tag regardless of namespace."""
+        return {name: value for variables in self.load().values() for name, value in variables.items()}
+
+    def upsert(self, variables: dict, namespace_uri: str = None):
+        """Insert or update the given tags in a single transaction."""
+        namespace_uri = namespace_uri or self.default_namespace_uri
+        now = time.time()
+        rows = [(name, namespace_uri, encode_value(value), now) for name, value in variables.items()]
+        with self._lock:
+            with self._transaction():
+                self.conn.executemany(
+                    "INSERT INTO tags (name, namespace_uri, value, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(namespace_uri, name) DO UPDATE SET "
+                    "value = excluded.value, updated_at = excluded.updated_at",
+                    rows,
+                )
+
+    def update_values(self, values: dict):
+        """Update the values of existing tags in a single transaction.
+
+        values is keyed by (namespace_uri, name), or by name for tags in the
+        default namespace. Values that cannot be stored keep the tag's
+        previous value.
+        """
+        now = time.time()
+        rows = []
+        for key, value in values.items():
+            namespace_uri, name = self._key(key)
+            try:
+                rows.append((encode_value(value), now, namespace_uri, name))
+            except (TypeError, ValueError) as e:
+                logger.warning("Not persisting value of %s: %s", name, e)
+        with self._lock:
+            with self._transaction():
+                self.conn.executemany(
+                    "UPDATE tags SET value = ?, updated_at = ? WHERE namespace_uri = ? AND name = ?", rows
+                )
+
+    def delete(self, keys) -> int:
+        """Remove tags, keyed like update_values, in a single transaction. Returns the number removed."""
+        with self._lock:
+            with self._transaction():
+                cursor = self.conn.executemany(
+                    "DELETE FROM tags WHERE namespace_uri = ? AND name = ?", [self._key(key) for key in keys]
+                )
+        return cursor.rowcount
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolling back if the block raises."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
@@ -0,0 +1,67 @@
+import asyncio
+from utils.logger import get_logger
+from utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+FLUSH_SECONDS = REGISTRY.histogram("tag_store_flush_seconds", "Time to persist one batch of tag values")
+PERSISTED = REGISTRY.counter("tag_store_values_persisted_total", "Tag values written to the tag store")
+
+class LastValueWriter:
+    """Write-through persistence of runtime tag values with coalesced flushes.
+
+    Values are staged in memory keyed by (namespace URI, tag name), so
+    repeated writes to one tag collapse into a single row update. Staged
+    values are flushed to the tag store every flush_interval seconds, or as
+    soon as max_pending distinct tags are waiting, in one transaction run off
+    the event loop.
+    """
+    def __init__(self, store, flush_interval: float = 1.0, max_pending: int = 5000):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = {}
+        self.flushes = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out anything still staged."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stage(self, key, value):
+        """Record the latest value of a tag; never blocks."""
+        self.pending[key] = value
+        if len(self.pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        values, self.pending = self.pending, {}
+        try:
+            with FLUSH_SECONDS.time():
+                await asyncio.to_thread(self.store.update_values, values)
+            self.flushes += 1
+            PERSISTED.inc(len(values))
+            logger.debug("Persisted %s tag values", len(values))
+        except Exception as e:
+            # Keep the values so the next flush retries them, unless newer ones arrived
+            self.pending = {**values, **self.pending}
+            logger.error("Error persisting tag values: %s", e)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
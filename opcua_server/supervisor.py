@@ -0,0 +1,198 @@
+import asyncio
+import json
+import os
+import sys
+from asyncua import Server
+from asyncua.ua import SecurityPolicyType
+from config.settings import (
+    SERVER_URL, SERVER_CONFIG, NAMESPACE_URI, SHARD_CONFIG, SHARD_ENV, TAG_STORE_PATH, LEGACY_VARIABLES_FILE,
+    METRICS_CONFIG
+)
+from handlers.shards import ShardDirectory, shard_of
+from storage import TagStore
+from utils.logger import get_logger
+from utils.metrics import REGISTRY, start_metrics_server
+
+logger = get_logger(__name__)
+
+WORKERS_RUNNING = REGISTRY.gauge("shard_workers_running", "Shard worker processes running")
+WORKER_RESTARTS = REGISTRY.counter("shard_worker_restarts_total", "Shard worker restarts", ["shard"])
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+# Shard count the tag stores in SHARD_CONFIG["data_dir"] are partitioned for
+PARTITION_FILE = "partition.json"
+
+def shard_dir(index: int) -> str:
+    return os.path.abspath(os.path.join(SHARD_CONFIG["data_dir"], str(index)))
+
+def partition_tag_stores(count: int) -> bool:
+    """Split the tag definitions into one tag store per shard, if not done for count shards yet.
+
+    Tags are gathered from the single-process tag store and every existing
+    shard store, whose values are newer, and each shard store is rewritten
+    with the tags hashing to it. Changing the shard count moves tags between
+    shards; their history stays with the shard that recorded it. Returns
+    whether the stores were partitioned.
+    """
+    data_dir = SHARD_CONFIG["data_dir"]
+    marker = os.path.join(data_dir, PARTITION_FILE)
+    try:
+        with open(marker) as f:
+            if json.load(f)["count"] == count:
+                return False
+    except (OSError, ValueError, KeyError):
+        pass
+
+    os.makedirs(data_dir, exist_ok=True)
+    existing = sorted(int(entry) for entry in os.listdir(data_dir) if entry.isdigit())
+    tags = {}  # (namespace_uri, name) -> value
+    store = TagStore(TAG_STORE_PATH, NAMESPACE_URI)
+    store.open()
+    store.migrate_json(LEGACY_VARIABLES_FILE)
+    sources = [store] + [TagStore(os.path.join(shard_dir(index), TAG_STORE_PATH), NAMESPACE_URI) for index in existing]
+    for source in sources:
+        if source is not store:
+            source.open()
+        try:
+            for namespace_uri, variables in source.load().items():
+                for name, value in variables.items():
+                    tags[namespace_uri, name] = value
+        finally:
+            source.close()
+
+    for index in sorted(set(existing) | set(range(count))):
+        os.makedirs(shard_dir(index), exist_ok=True)
+        shard_store = TagStore(os.path.join(shard_dir(index), TAG_STORE_PATH), NAMESPACE_URI)
+        shard_store.open()
+        try:
+            owned = {key: value for key, value in tags.items() if index < count and shard_of(key[1], count) == index}
+            stale = [
+                (namespace_uri, name) for namespace_uri, variables in shard_store.load().items()
+                for name in variables if (namespace_uri, name) not in owned
+            ]
+            if stale:
+                shard_store.delete(stale)
+            by_namespace = {}
+            for (namespace_uri, name), value in owned.items():
+                by_namespace.setdefault(namespace_uri, {})[name] = value
+            for namespace_uri, variables in by_namespace.items():
+                shard_store.upsert(variables, namespace_uri)
+        finally:
+            shard_store.close()
+
+    with open(marker, "w") as f:
+        json.dump({"count": count}, f)
+    logger.info("Partitioned %d tags across %d shards", len(tags), count)
+    return True
+
+class ShardWorker:
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+class ShardSupervisor:
+    """Runs the shard workers as child processes and serves their discovery view.
+
+    A single asyncua server is bound to one event loop, so one process uses one
+    core no matter how many the Pi has. The supervisor partitions the tags
+    with shard_of and starts `server.py --shard <index>/<count>` per shard in
+    its own directory, so every worker has its own endpoint, tag store,
+    historian and snapshot and only serves its slice of MyObject. Workers
+    that exit are restarted with exponential backoff. The supervisor's own
+    server at SERVER_URL only answers discovery and the Shards directory;
+    it carries no tag traffic.
+    """
+    def __init__(self, count: int, worker_args=()):
+        self.count = count
+        self.worker_args = list(worker_args)
+        self.workers = [ShardWorker(index) for index in range(count)]
+        self.directory = ShardDirectory(count)
+        self.server = None
+        self.tasks = []
+        self.metrics_server = None
+
+    async def start(self):
+        await asyncio.to_thread(partition_tag_stores, self.count)
+        self.server = Server()
+        await self.server.init()
+        self.server.set_endpoint(SERVER_URL)
+        self.server.set_server_name(f"{SERVER_CONFIG['name']} supervisor")
+        self.server.set_security_policy([SecurityPolicyType.NoSecurity])
+        namespace_index = await self.server.register_namespace(NAMESPACE_URI)
+        await self.directory.setup(self.server, namespace_index)
+        await self.server.start()
+        self.tasks = [asyncio.create_task(self._run(worker)) for worker in self.workers]
+        if METRICS_CONFIG["enabled"]:
+            self.metrics_server = await start_metrics_server(
+                METRICS_CONFIG["host"], METRICS_CONFIG["port"], self.update_metrics
+            )
+        logger.info("Supervisor started %d shard workers, discovery at %s", self.count, SERVER_URL)
+
+    async def stop(self):
+        """Ask every worker to shut down cleanly, killing those that do not exit in time."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        running = [worker for worker in self.workers if worker.running]
+        for worker in running:
+            # Workers shut down on SIGTERM as on Ctrl+C, flushing their tag store and historian
+            worker.process.terminate()
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(worker.process.wait() for worker in running)), SHARD_CONFIG["stop_timeout"]
+            )
+        except asyncio.TimeoutError:
+            for worker in self.workers:
+                if worker.running:
+                    logger.warning("Shard %d did not stop in time, killing it", worker.index)
+                    worker.process.kill()
+                    await worker.process.wait()
+        if self.metrics_server:
+            self.metrics_server.close()
+            await self.metrics_server.wait_closed()
+        if self.server:
+            await self.server.stop()
+        logger.info("Supervisor stopped")
+
+    def update_metrics(self):
+        WORKERS_RUNNING.set(sum(1 for worker in self.workers if worker.running))
+
+    async def _run(self, worker: ShardWorker):
+        """Start worker and restart it whenever it exits, until the supervisor stops."""
+        loop = asyncio.get_running_loop()
+        delay = SHARD_CONFIG["restart_min_delay"]
+        while True:
+            started = loop.time()
+            worker.process = await asyncio.create_subprocess_exec(
+                sys.executable, SERVER_SCRIPT, "--shard", f"{worker.index}/{self.count}", *self.worker_args,
+                cwd=shard_dir(worker.index),
+                env={**os.environ, SHARD_ENV: str(worker.index)},
+                # Out of the terminal's process group: Ctrl+C reaches the supervisor, which stops the workers
+                start_new_session=True,
+            )
+            await self.directory.update(worker.index, True, worker.restarts)
+            code = await worker.process.wait()
+            await self.directory.update(worker.index, False, worker.restarts)
+            if loop.time() - started > SHARD_CONFIG["restart_max_delay"]:
+                # It ran for a while, so this is a new failure rather than a crash loop
+                delay = SHARD_CONFIG["restart_min_delay"]
+            logger.warning("Shard %d exited with code %s, restarting in %.1fs", worker.index, code, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, SHARD_CONFIG["restart_max_delay"])
+            worker.restarts += 1
+            WORKER_RESTARTS.labels(str(worker.index)).inc()
+
+async def run_supervisor(count: int, worker_args=()):
+    supervisor = ShardSupervisor(count, worker_args)
+    try:
+        await supervisor.start()
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        logger.info("Stopping shard supervisor")
+        await supervisor.stop()
@@ -0,0 +1,38 @@
+import os
+import sys
+import pytest_asyncio
+from asyncua import Server
+
+# The common package at the repository root is shared with the backend
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from config.namespaces import NAMESPACE_URI
+from handlers.config_handler import ConfigHandler
+from handlers.node_management import LinearNodeManagementService
+
+@pytest_asyncio.fixture
+async def start_handler():
+    """Factory of in-memory servers with MyObject set up; returns their ConfigHandler.
+
+    Servers are initialized but not listening, and are stopped after the test.
+    """
+    servers = []
+
+    async def start():
+        server = Server()
+        await server.init()
+        servers.append(server)
+        server.iserver.node_mgt_service = LinearNodeManagementService(server.iserver.aspace)
+        await server.register_namespace(NAMESPACE_URI)
+        config_handler = ConfigHandler()
+        await config_handler.setup(server)
+        return config_handler
+
+    yield start
+    for server in servers:
+        await server.stop()
+
+@pytest_asyncio.fixture
+async def handler(start_handler):
+    """ConfigHandler of one in-memory server."""
+    return await start_handler()
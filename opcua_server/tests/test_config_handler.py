@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from asyncua import ua
+from config.namespaces import NAMESPACE_URI
+from handlers.model_changes import ModelChangeReporter
+
+@pytest.mark.asyncio
+async def test_bulk_add_creates_writable_linked_variables(handler):
+    """Bulk-created variables are browsable below MyObject, writable and know their parent."""
+    variables = {f"tag{i}": float(i) for i in range(2500)}
+    await handler.add_namespace_and_variables(NAMESPACE_URI, variables)
+
+    myobj = await handler.objects_node.get_child([f"{handler.namespace_index}:MyObject"])
+    children = await myobj.get_children_descriptions(nodeclassmask=ua.NodeClass.Variable)
+    assert sorted(ref.BrowseName.Name for ref in children) == sorted(variables)
+    node = await myobj.get_child([f"{handler.namespace_index}:tag7"])
+    assert node.nodeid == ua.NodeId("MyObject.tag7", handler.namespace_index)
+    assert (await node.get_parent()).nodeid == myobj.nodeid
+    assert await node.read_value() == 7.0
+    assert ua.AccessLevel.CurrentWrite in await node.get_access_level()
+    assert (await node.read_data_value()).SourceTimestamp is not None
+
+@pytest.mark.asyncio
+async def test_existing_variables_are_updated_not_duplicated(handler):
+    added = []
+    async def on_added(nodes):
+        added.append(sorted(nodes))
+    handler.on_variables_added = on_added
+    await handler.add_namespace_and_variables(NAMESPACE_URI, {"a": 1, "b": "x"})
+    await handler.add_namespace_and_variables(NAMESPACE_URI, {"a": 2, "c": True})
+
+    assert added == [["a", "b"], ["c"]]
+    myobj = await handler.objects_node.get_child([f"{handler.namespace_index}:MyObject"])
+    children = await myobj.get_children_descriptions(nodeclassmask=ua.NodeClass.Variable)
+    assert sorted(ref.BrowseName.Name for ref in children) == ["a", "b", "c"]
+    assert await (await myobj.get_child([f"{handler.namespace_index}:a"])).read_value() == 2
+
+@pytest.mark.asyncio
+async def test_added_variables_are_reported_in_one_model_change_event(handler):
+    """A batch of AddNodes is published as one GeneralModelChangeEvent listing every new node."""
+    events = []
+    class EventHandler:
+        def event_notification(self, event):
+            events.append(event)
+    reporter = ModelChangeReporter()
+    await reporter.start(handler.server)
+    handler.server.iserver.node_mgt_service.reporter = reporter
+    subscription = await handler.server.create_subscription(50, EventHandler())
+    await subscription.subscribe_events(ua.ObjectIds.Server, ua.ObjectIds.GeneralModelChangeEventType)
+
+    added = await handler.add_namespace_and_variables(NAMESPACE_URI, {"a": 1, "b": 2})
+    await reporter.stop()
+    await asyncio.sleep(0.2)
+
+    assert len(events) == 1
+    assert {change.Affected for change in events[0].Changes} >= {node.nodeid for node in added.values()}
+    assert {change.Verb for change in events[0].Changes} == {ua.ModelChangeStructureVerbMask.NodeAdded.value}
@@ -0,0 +1,135 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from asyncua import ua
+from storage import Historian
+
+def sample(value, timestamp):
+    return ua.DataValue(ua.Variant(value, ua.VariantType.Double), SourceTimestamp=timestamp)
+
+@pytest.mark.asyncio
+async def test_read_history_in_time_order(tmp_path):
+    """Buffered samples are readable through read_node_history, oldest first, with paging."""
+    historian = Historian(tmp_path / "history.db", max_history_data_response_size=10)
+    await historian.init()
+    node_id = ua.NodeId("MyObject.t0", 2)
+    await historian.new_historized_node(node_id, timedelta(days=1))
+    start = datetime.now(timezone.utc) - timedelta(minutes=1)
+    for i in range(15):
+        await historian.save_node_value(node_id, sample(float(i), start + timedelta(seconds=i)))
+
+    values, cont = await historian.read_node_history(node_id, start, datetime.now(timezone.utc), 0)
+    assert [dv.Value.Value for dv in values] == [float(i) for i in range(10)]
+    assert cont == start + timedelta(seconds=10)
+    values, cont = await historian.read_node_history(node_id, cont, datetime.now(timezone.utc), 0)
+    assert [dv.Value.Value for dv in values] == [float(i) for i in range(10, 15)]
+    assert cont is None
+    await historian.stop()
+
+@pytest.mark.asyncio
+async def test_retention_and_downsampling(tmp_path):
+    historian = Historian(
+        tmp_path / "history.db",
+        retention=timedelta(hours=2),
+        downsample_after=timedelta(hours=1),
+        downsample_interval=timedelta(minutes=10),
+    )
+    await historian.init()
+    node_id = ua.NodeId("MyObject.t0", 2)
+    await historian.new_historized_node(node_id, None)
+    now = datetime.now(timezone.utc)
+    for minutes in range(0, 180):
+        await historian.save_node_value(node_id, sample(float(minutes), now - timedelta(minutes=minutes)))
+    await historian.flush()
+    await historian.maintain()
+
+    values, _ = await historian.read_node_history(node_id, now - timedelta(hours=3), now, 0)
+    timestamps = [dv.SourceTimestamp for dv in values]
+    assert min(timestamps) > now - timedelta(hours=2)
+    old = [ts for ts in timestamps if ts < now - timedelta(hours=1)]
+    recent = [ts for ts in timestamps if ts >= now - timedelta(hours=1)]
+    assert len(recent) == 61
+    assert 6 <= len(old) <= 7
+    # At most one sample per 10-minute interval survives downsampling
+    assert len({int(ts.timestamp()) // 600 for ts in old}) == len(old)
+    await historian.stop()
+
+@pytest.mark.asyncio
+async def test_aggregates_use_rollups(tmp_path):
+    """Aggregates from rollups match the raw samples and round the bucket to the rollup interval."""
+    historian = Historian(tmp_path / "history.db", rollup_levels=[60])
+    await historian.init()
+    node_id = ua.NodeId("MyObject.t0", 2)
+    await historian.new_historized_node(node_id, None)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for second in range(600):
+        await historian.save_node_value(node_id, sample(float(second), start + timedelta(seconds=second)))
+
+    result = await historian.read_aggregates(node_id.to_string(), start, start + timedelta(minutes=10), 290)
+    assert result["bucket"] == 300
+    assert result["count"] == [300, 300]
+    assert result["min"] == [0.0, 300.0]
+    assert result["max"] == [299.0, 599.0]
+    assert result["avg"] == [149.5, 449.5]
+    assert result["last"] == [299.0, 599.0]
+
+    raw = await historian.read_aggregates(node_id.to_string(), start, start + timedelta(minutes=1), 30)
+    assert raw["bucket"] == 30
+    assert raw["count"] == [30, 30, 1]  # end is inclusive
+    await historian.stop()
+
+@pytest.mark.asyncio
+async def test_samples_repeating_a_timestamp_are_rejected(tmp_path):
+    """The first sample at a timestamp is kept, whether the repeat is in the same batch or a later one."""
+    historian = Historian(tmp_path / "history.db")
+    await historian.init()
+    node_id = ua.NodeId("MyObject.t0", 2)
+    await historian.new_historized_node(node_id, None)
+    start = datetime.now(timezone.utc) - timedelta(minutes=1)
+    await historian.save_node_value(node_id, sample(1.0, start))
+    await historian.save_node_value(node_id, sample(2.0, start))
+    await historian.save_node_value(node_id, sample(3.0, start + timedelta(seconds=1)))
+    await historian.flush()
+    await historian.save_node_value(node_id, sample(4.0, start + timedelta(seconds=1)))
+    await historian.save_node_value(node_id, sample(5.0, start + timedelta(seconds=2)))
+    await historian.flush()
+
+    values, _ = await historian.read_node_history(node_id, start, datetime.now(timezone.utc), 0)
+    assert [dv.Value.Value for dv in values] == [1.0, 3.0, 5.0]
+    assert historian.samples_written == 3
+    await historian.stop()
+
+@pytest.mark.asyncio
+async def test_rollups_count_inserted_samples_and_follow_retention(tmp_path):
+    historian = Historian(tmp_path / "history.db", retention=None, rollup_levels=[60])
+    await historian.init()
+    node_id = ua.NodeId("MyObject.t0", 2)
+    await historian.new_historized_node(node_id, None, count=30)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for second in range(120):
+        await historian.save_node_value(node_id, sample(1.0, start + timedelta(seconds=second)))
+    await historian.flush()
+    # Repeated timestamps are rejected and must not be counted again
+    for second in range(60):
+        await historian.save_node_value(node_id, sample(100.0, start + timedelta(seconds=second)))
+    await historian.flush()
+
+    end = start + timedelta(minutes=2) - timedelta(microseconds=1)
+    result = await historian.read_aggregates(node_id.to_string(), start, end, 60)
+    assert result["count"] == [60, 60]
+    assert result["max"] == [1.0, 1.0]
+
+    # Keeping the last 30 samples drops the first minute's rollup with its samples
+    await historian.maintain()
+    result = await historian.read_aggregates(node_id.to_string(), start, end, 60)
+    assert result["count"] == [60]
+    assert result["start"] == [(start + timedelta(minutes=1)).timestamp()]
+    await historian.stop()
+
+@pytest.mark.asyncio
+async def test_event_history_is_empty(tmp_path):
+    historian = Historian(tmp_path / "history.db")
+    await historian.init()
+    await historian.new_historized_event(ua.NodeId(ua.ObjectIds.Server), [], None)
+    await historian.save_event(None)
+    assert await historian.read_event_history(ua.NodeId(ua.ObjectIds.Server), None, None, 0, None) == ([], None)
+    await historian.stop()
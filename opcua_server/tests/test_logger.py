@@ -0,0 +1,36 @@
+import logging
+import queue
+from common.logger import SamplingQueueHandler
+
+def make_record(msg, *args, created=0.0):
+    record = logging.LogRecord("storage.historian", logging.INFO, "", 0, msg, args, None)
+    record.created = created
+    return record
+
+def test_repeated_messages_are_sampled_and_summarized():
+    """Only sample_limit records per template pass; the rest are reported when the interval ends."""
+    log_queue = queue.Queue()
+    handler = SamplingQueueHandler(log_queue, sample_limit=2, sample_interval=10.0)
+    for i in range(5):
+        handler.emit(make_record("Value %s", i, created=1.0))
+    handler.emit(make_record("Other", created=2.0))
+    handler.emit(make_record("Value %s", 99, created=12.0))
+
+    messages = [log_queue.get_nowait().getMessage() for _ in range(log_queue.qsize())]
+    assert messages == [
+        "Value 0", "Value 1", "Other",
+        "Suppressed 3 more messages like: Value %s",
+        "Value 99",
+    ]
+
+def test_full_queue_drops_instead_of_blocking():
+    log_queue = queue.Queue(1)
+    handler = SamplingQueueHandler(log_queue)
+    handler.emit(make_record("first"))
+    handler.emit(make_record("second"))
+    handler.emit(make_record("third"))
+    assert handler.dropped == 2
+
+    assert log_queue.get_nowait().getMessage() == "first"
+    handler.emit(make_record("fourth"))
+    assert log_queue.get_nowait().getMessage() == "(2 log records dropped, queue full) fourth"
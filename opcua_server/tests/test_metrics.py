@@ -0,0 +1,27 @@
+import asyncio
+import pytest
+from utils.metrics import REGISTRY, start_metrics_server
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.decode()
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_serves_prometheus_text():
+    """GET /metrics refreshes gauges through collect and renders the registry."""
+    queue_depth = REGISTRY.gauge("test_queue_depth", "Queue depth")
+    server = await start_metrics_server("127.0.0.1", 0, collect=lambda: queue_depth.set(7))
+    port = server.sockets[0].getsockname()[1]
+    try:
+        response = await fetch(port, "/metrics")
+        assert response.startswith("HTTP/1.1 200 OK")
+        assert "text/plain; version=0.0.4" in response
+        assert "\ntest_queue_depth 7\n" in response
+        assert (await fetch(port, "/other")).startswith("HTTP/1.1 404")
+    finally:
+        server.close()
+        await server.wait_closed()
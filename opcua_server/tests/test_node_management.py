@@ -0,0 +1,34 @@
+import hashlib
+import inspect
+import pytest
+from asyncua import ua
+from asyncua.server.address_space import NodeManagementService
+from config.namespaces import NAMESPACE_URI
+from handlers.config_handler import build_variable_item
+
+# sha256 of the asyncua 2.1.0 sources LinearNodeManagementService builds on
+UPSTREAM_SOURCES = {
+    "add_nodes": "7b24f18a8c6b6957",
+    "_add_node": "6abfea3019376a04",
+    "_add_ref_to_parent": "b363eaf3105d579e",
+}
+
+def test_asyncua_internals_are_unchanged():
+    """Fails when an asyncua upgrade changes the AddNodes internals the linear service relies on."""
+    for name, digest in UPSTREAM_SOURCES.items():
+        source = inspect.getsource(getattr(NodeManagementService, name))
+        assert hashlib.sha256(source.encode()).hexdigest()[:16] == digest, \
+            f"NodeManagementService.{name} changed upstream; re-check LinearNodeManagementService"
+
+@pytest.mark.asyncio
+async def test_children_named_like_a_property_are_rejected(handler):
+    await handler.add_namespace_and_variables(NAMESPACE_URI, {"a": 1.0}, persist=False)
+    myobj = await handler.objects_node.get_child([f"{handler.namespace_index}:MyObject"])
+    await myobj.add_property(handler.namespace_index, "limit", 10)
+    service = handler.server.iserver.node_mgt_service
+    results = service.add_nodes([
+        build_variable_item(myobj.nodeid, handler.namespace_index, name, 1.0) for name in ("limit", "speed")
+    ])
+    assert [result.StatusCode.value for result in results] == [
+        ua.StatusCodes.BadBrowseNameDuplicated, ua.StatusCodes.Good
+    ]
@@ -0,0 +1,73 @@
+import pytest
+from asyncua import Server, ua
+from config.settings import NAMESPACE_URI, SHARD_CONFIG, TAG_STORE_PATH
+from handlers.shards import ShardDirectory, shard_of, shard_endpoint, SHARD_URI_MARK
+from storage import TagStore
+from supervisor import partition_tag_stores, shard_dir
+
+def shard_tags(index):
+    store = TagStore(f"{shard_dir(index)}/{TAG_STORE_PATH}", NAMESPACE_URI)
+    store.open()
+    try:
+        return store.load_values()
+    finally:
+        store.close()
+
+def test_tags_are_spread_over_the_shards():
+    names = [f"tag{i}" for i in range(1000)]
+    counts = [0] * 4
+    for name in names:
+        counts[shard_of(name, 4)] += 1
+    assert all(200 < count < 300 for count in counts)
+    assert shard_of("tag7", 4) == shard_of("tag7", 4)
+    assert shard_of("tag7", 1) == 0
+
+def test_partition_moves_tags_when_the_shard_count_changes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = TagStore(TAG_STORE_PATH, NAMESPACE_URI)
+    store.open()
+    store.upsert({f"tag{i}": i for i in range(20)})
+    store.close()
+
+    assert partition_tag_stores(2)
+    assert not partition_tag_stores(2)
+    shards = [shard_tags(index) for index in range(2)]
+    assert sorted(name for tags in shards for name in tags) == sorted(f"tag{i}" for i in range(20))
+    assert all(shard_of(name, 2) == index for index, tags in enumerate(shards) for name in tags)
+
+    # Values written by a shard win over the single-process store's
+    store = TagStore(f"{shard_dir(shard_of('tag3', 2))}/{TAG_STORE_PATH}", NAMESPACE_URI)
+    store.open()
+    store.update_values({"tag3": 300})
+    store.close()
+    assert partition_tag_stores(3)
+    shards = [shard_tags(index) for index in range(3)]
+    assert sum(len(tags) for tags in shards) == 20
+    assert shards[shard_of("tag3", 3)]["tag3"] == 300
+    assert all(shard_of(name, 3) == index for index, tags in enumerate(shards) for name in tags)
+
+    # Shrinking empties the stores of shards that no longer exist
+    assert partition_tag_stores(2)
+    assert shard_tags(2) == {}
+    assert sum(len(shard_tags(index)) for index in range(2)) == 20
+
+@pytest.mark.asyncio
+async def test_directory_lists_the_shards_for_discovery():
+    server = Server()
+    await server.init()
+    directory = ShardDirectory(3)
+    await directory.setup(server, await server.register_namespace(NAMESPACE_URI))
+    await directory.update(1, True, 2)
+
+    servers = server.iserver.find_servers(ua.FindServersParameters())
+    shards = {s.ApplicationUri.rpartition(SHARD_URI_MARK)[2]: s.DiscoveryUrls[0] for s in servers
+              if SHARD_URI_MARK in s.ApplicationUri}
+    assert shards == {str(index): shard_endpoint(index) for index in range(3)}
+    assert shard_endpoint(1).endswith(f":{SHARD_CONFIG['base_port'] + 1}")
+
+    shards_obj = await server.nodes.objects.get_child(["2:Shards"])
+    shard1 = await shards_obj.get_child(["2:Shard1"])
+    assert await (await shard1.get_child(["2:Running"])).read_value() is True
+    assert await (await shard1.get_child(["2:Restarts"])).read_value() == 2
+    index, endpoint = await shards_obj.call_method("2:Locate", "tag7")
+    assert (index, endpoint) == (shard_of("tag7", 3), shard_endpoint(shard_of("tag7", 3)))
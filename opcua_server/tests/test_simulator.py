@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from asyncua import ua
+from handlers.simulator import SimulatedGroup, TagSimulator, convert
+
+def test_waveforms_are_spread_over_the_cycle():
+    group = SimulatedGroup({"count": 4, "waveform": "square", "amplitude": 2.0, "offset": 1.0, "period": 1.0})
+    assert group.values(0.0) == [3.0, 3.0, -1.0, -1.0]
+    counter = SimulatedGroup({"count": 2, "waveform": "counter"})
+    counter.values(0.0)
+    assert counter.values(0.0) == [2.0, 2.0]
+    # A shard only simulates its own tags of the group
+    selected = SimulatedGroup({"count": 4}, select=lambda name: name in ("sim_1", "sim_3"))
+    assert selected.names == ["sim_1", "sim_3"]
+    assert TagSimulator([{"count": 2}], select=lambda name: False).groups == []
+
+def test_values_are_converted_to_the_tag_type():
+    assert convert(2.6, ua.VariantType.Int32) == 3
+    assert convert(-2.0, ua.VariantType.UInt16) == 0
+    assert convert(-0.4, ua.VariantType.UInt32) == 0
+    assert convert(0.5, ua.VariantType.Boolean) is True
+    assert convert(1.23456, ua.VariantType.String) == "1.235"
+    with pytest.raises(ValueError):
+        SimulatedGroup({"waveform": "noise"})
+
+def test_integer_values_stay_in_the_type_range():
+    """Counters wrap like an integer register; other waveforms are clamped to the type's limits."""
+    assert convert(32768.0, ua.VariantType.Int16, wrap=True) == -32768
+    assert convert(65536.0, ua.VariantType.UInt16, wrap=True) == 0
+    assert convert(40000.0, ua.VariantType.Int16) == 32767
+    assert convert(-40000.0, ua.VariantType.Int16) == -32768
+    assert convert(1e12, ua.VariantType.UInt32) == 2 ** 32 - 1
+
+    counter = SimulatedGroup({"count": 1, "waveform": "counter", "type": "Int16", "offset": 32766.0})
+    values = [convert(counter.values(0.0)[0], counter.variant_type, counter.wrap) for _ in range(3)]
+    assert values == [32767, -32768, -32767]
+    # Every value can be encoded for its type
+    for value in values:
+        ua.ua_binary.variant_to_binary(ua.Variant(value, ua.VariantType.Int16))
+
+@pytest.mark.asyncio
+async def test_simulator_writes_typed_values_through_the_address_space(handler):
+    """Simulated tags are created below MyObject and change at their rate, firing data change callbacks."""
+    simulator = TagSimulator([{"prefix": "load", "count": 3, "type": "Int32", "waveform": "counter", "rate": 100.0}])
+    try:
+        await simulator.start(handler.server, handler)
+        node_id = ua.NodeId("MyObject.load_1", handler.namespace_index)
+        changes = []
+        async def on_change(handle, datavalue):
+            changes.append(datavalue.Value)
+        handler.server.iserver.aspace.add_datachange_callback(node_id, ua.AttributeIds.Value, on_change)
+        await asyncio.sleep(0.2)
+    finally:
+        await simulator.stop()
+
+    assert simulator.aggregate_rate == 300.0
+    assert len(changes) >= 5
+    assert all(variant.VariantType == ua.VariantType.Int32 for variant in changes)
+    assert [variant.Value for variant in changes] == sorted(variant.Value for variant in changes)
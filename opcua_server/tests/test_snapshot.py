@@ -0,0 +1,40 @@
+import pytest
+from asyncua import ua
+from config.namespaces import NAMESPACE_URI
+from storage import AddressSpaceSnapshot, config_hash
+
+@pytest.mark.asyncio
+async def test_snapshot_restores_browsable_writable_variables(tmp_path, start_handler):
+    """A snapshot saved after building MyObject restores it with the stored values."""
+    tags = {NAMESPACE_URI: {"a": 1.5, "b": "x", "c": [1, 2, 3]}}
+    snapshot = AddressSpaceSnapshot(tmp_path / "address_space.snapshot")
+    handler = await start_handler()
+    await handler.add_namespace_and_variables(NAMESPACE_URI, tags[NAMESPACE_URI], persist=False)
+    digest = config_hash(tags, list(handler.namespace_indices()))
+    snapshot.save(digest, handler.snapshot_nodes())
+
+    handler = await start_handler()
+    assert config_hash(tags, list(handler.namespace_indices())) == digest
+    tags[NAMESPACE_URI]["a"] = 2.5  # Values come from the tag store, not the snapshot
+    nodes = handler.restore_snapshot(snapshot.load(digest), tags)
+    assert sorted(nodes) == ["a", "b", "c"]
+
+    myobj = await handler.objects_node.get_child([f"{handler.namespace_index}:MyObject"])
+    children = await myobj.get_children_descriptions(nodeclassmask=ua.NodeClass.Variable)
+    assert sorted(ref.BrowseName.Name for ref in children) == ["a", "b", "c"]
+    assert await nodes["a"].read_value() == 2.5
+    assert await nodes["c"].read_value() == [1, 2, 3]
+    await handler.write_values([(nodes["b"].nodeid, "y")])
+    assert await nodes["b"].read_value() == "y"
+
+def test_snapshot_is_stale_when_tag_types_change(tmp_path):
+    snapshot = AddressSpaceSnapshot(tmp_path / "address_space.snapshot")
+    namespaces = ["http://opcfoundation.org/UA/", NAMESPACE_URI]
+    digest = config_hash({NAMESPACE_URI: {"a": 1.0}}, namespaces)
+    snapshot.save(digest, [])
+
+    assert snapshot.load(digest) == []
+    assert config_hash({NAMESPACE_URI: {"a": 7.0}}, namespaces) == digest
+    changed = config_hash({NAMESPACE_URI: {"a": "text"}}, namespaces)
+    assert changed != digest
+    assert snapshot.load(changed) is None
@@ -0,0 +1,107 @@
+import json
+import sqlite3
+from datetime import datetime, timezone
+import pytest
+from asyncua import ua
+from storage import TagStore
+from config.settings import NAMESPACE_URI
+
+def test_upsert_and_reload(tmp_path):
+    """Tags written in one session are restored with their types in the next."""
+    path = tmp_path / "tags.db"
+    store = TagStore(path, NAMESPACE_URI)
+    store.open()
+    store.upsert({"temperature": 21.5, "state": "running"})
+    store.upsert({"temperature": 22.0})
+    store.upsert({"count": 3}, "http://example.com/other")
+    store.close()
+
+    store = TagStore(path, NAMESPACE_URI)
+    store.open()
+    assert store.load() == {
+        NAMESPACE_URI: {"temperature": 22.0, "state": "running"},
+        "http://example.com/other": {"count": 3},
+    }
+    assert store.delete(["state"]) == 1
+    assert store.load_values() == {"temperature": 22.0, "count": 3}
+    store.close()
+
+def test_same_name_in_two_namespaces(tmp_path):
+    """Tags are keyed by namespace and name, so namespaces do not overwrite each other."""
+    other = "http://example.com/other"
+    store = TagStore(tmp_path / "tags.db", NAMESPACE_URI)
+    store.open()
+    store.upsert({"speed": 1.0})
+    store.upsert({"speed": 2.0}, other)
+    store.update_values({(other, "speed"): 3.0})
+    assert store.load() == {NAMESPACE_URI: {"speed": 1.0}, other: {"speed": 3.0}}
+    assert store.delete(["speed"]) == 1
+    assert store.load() == {other: {"speed": 3.0}}
+    store.close()
+
+def test_name_keyed_stores_are_migrated(tmp_path):
+    """Stores created with name as the primary key are rebuilt with the (namespace_uri, name) key."""
+    path = tmp_path / "tags.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE tags (name TEXT PRIMARY KEY, namespace_uri TEXT NOT NULL, "
+                 "value TEXT NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute("INSERT INTO tags VALUES ('speed', ?, '1.0', 0)", (NAMESPACE_URI,))
+    conn.commit()
+    conn.close()
+
+    store = TagStore(path, NAMESPACE_URI)
+    store.open()
+    store.upsert({"speed": 2.0}, "http://example.com/other")
+    assert store.load() == {NAMESPACE_URI: {"speed": 1.0}, "http://example.com/other": {"speed": 2.0}}
+    store.close()
+
+@pytest.mark.asyncio
+async def test_runtime_values_keep_their_type_across_restarts(tmp_path, start_handler):
+    """Values written at runtime come back with their VariantType, not as a string, Double or Int64."""
+    path = tmp_path / "tags.db"
+    stamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    level = ua.Variant(1.5, ua.VariantType.Float)
+    counter = ua.Variant(7, ua.VariantType.UInt32)
+    offsets = ua.Variant([-1, 2], ua.VariantType.Int16)
+    store = TagStore(path, NAMESPACE_URI)
+    store.open()
+    store.upsert({"stamp": "", "blob": "", "other": 1, "level": 0.0, "counter": 0, "offsets": []})
+    store.update_values({
+        "stamp": stamp, "blob": b"\x00\xff", "other": ua.LocalizedText("not storable"),
+        "level": level, "counter": counter, "offsets": offsets,
+    })
+    store.close()
+
+    store = TagStore(path, NAMESPACE_URI)
+    store.open()
+    tags = store.load()
+    store.close()
+    assert tags == {NAMESPACE_URI: {
+        "stamp": stamp, "blob": b"\x00\xff", "other": 1, "level": level, "counter": counter, "offsets": offsets,
+    }}
+
+    handler = await start_handler()
+    await handler.add_namespace_and_variables(NAMESPACE_URI, tags[NAMESPACE_URI], persist=False)
+    myobj = await handler.objects_node.get_child([f"{handler.namespace_index}:MyObject"])
+    node = await myobj.get_child([f"{handler.namespace_index}:stamp"])
+    assert await node.read_data_type() == ua.NodeId(ua.ObjectIds.DateTime)
+    assert await node.read_value() == stamp
+    node = await myobj.get_child([f"{handler.namespace_index}:counter"])
+    assert await node.read_data_type() == ua.NodeId(ua.ObjectIds.UInt32)
+
+def test_migrates_legacy_json_once(tmp_path):
+    """A legacy variables_store.json is imported only into an empty store."""
+    legacy = tmp_path / "variables_store.json"
+    legacy.write_text(json.dumps({"variable1": 0, "variable2": "initial_state"}))
+    store = TagStore(tmp_path / "tags.db", NAMESPACE_URI)
+    store.open()
+    assert store.migrate_json(legacy) == 2
+    assert store.migrate_json(legacy) == 0
+    assert store.load_values() == {"variable1": 0, "variable2": "initial_state"}
+    store.close()
+
+def test_uses_wal_journal(tmp_path):
+    store = TagStore(tmp_path / "tags.db", NAMESPACE_URI)
+    store.open()
+    store.close()
+    assert sqlite3.connect(tmp_path / "tags.db").execute("PRAGMA journal_mode").fetchone()[0] == "wal"
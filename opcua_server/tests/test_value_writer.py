@@ -0,0 +1,38 @@
+import asyncio
+import pytest
+from storage import TagStore, LastValueWriter
+from config.settings import NAMESPACE_URI
+
+@pytest.mark.asyncio
+async def test_bursts_are_coalesced(tmp_path):
+    """Many writes to the same tags end up as one flush holding the latest values."""
+    store = TagStore(tmp_path / "tags.db", NAMESPACE_URI)
+    store.open()
+    store.upsert({"a": 0, "b": 0})
+    writer = LastValueWriter(store, flush_interval=60, max_pending=100)
+    writer.start()
+    for i in range(10000):
+        writer.stage("a", i)
+        writer.stage("b", -i)
+    await writer.stop()
+    assert writer.flushes == 1
+    assert store.load_values() == {"a": 9999, "b": -9999}
+    store.close()
+
+@pytest.mark.asyncio
+async def test_size_threshold_triggers_flush(tmp_path):
+    store = TagStore(tmp_path / "tags.db", NAMESPACE_URI)
+    store.open()
+    store.upsert({f"t{i}": 0 for i in range(10)})
+    writer = LastValueWriter(store, flush_interval=60, max_pending=10)
+    writer.start()
+    for i in range(10):
+        writer.stage(f"t{i}", i)
+    for _ in range(100):
+        if writer.flushes:
+            break
+        await asyncio.sleep(0.01)
+    assert writer.flushes == 1
+    assert store.load_values()["t9"] == 9
+    await writer.stop()
+    store.close()
@@ -1,31 +1,35 @@
-import os
-from datetime import datetime
 import logging
-import sys  # Add missing import for sys
+import os
+from common.logger import configure_logging
+from config.settings import LOG_CONFIG, SHARD_ENV
 
-def get_logger(name):
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.DEBUG)
+def logging_options() -> dict:
+    """configure_logging arguments from LOG_CONFIG.
 
-    # Create logs directory if it doesn't exist
-    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
-    os.makedirs(log_dir, exist_ok=True)
+    A relative directory is taken relative to opcua_server/, and shard
+    workers rotate their own files rather than sharing one.
+    """
+    log_dir = LOG_CONFIG["directory"]
+    if not os.path.isabs(log_dir):
+        log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), log_dir)
+    log_file = LOG_CONFIG["file"]
+    shard = os.environ.get(SHARD_ENV)
+    if shard is not None:
+        stem, ext = os.path.splitext(log_file)
+        log_file = f"{stem}.shard{shard}{ext}"
+    return {
+        "path": os.path.join(log_dir, log_file),
+        "level": LOG_CONFIG["level"],
+        "levels": LOG_CONFIG["levels"],
+        "max_bytes": LOG_CONFIG["max_bytes"],
+        "backup_count": LOG_CONFIG["backup_count"],
+        "console": LOG_CONFIG["console"],
+        "queue_size": LOG_CONFIG["queue_size"],
+        "sample_limit": LOG_CONFIG["sample_limit"],
+        "sample_interval": LOG_CONFIG["sample_interval"],
+    }
 
-    # Use absolute path for log file
-    log_file = os.path.join(log_dir, f"opcua_server_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-    file_handler = logging.FileHandler(log_file)
-    
-    console_handler = logging.StreamHandler(sys.stdout)
-    
-    # Create formatter
-    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
-    # Add formatter to handlers
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+def get_logger(name):
+    """Return a logger whose records go through the shared queue."""
+    configure_logging(**logging_options())
+    return logging.getLogger(name)
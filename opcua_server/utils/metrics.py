@@ -0,0 +1,35 @@
+import asyncio
+from common.metrics import CONTENT_TYPE, MetricsRegistry
+
+# Metrics of this process, served by start_metrics_server
+REGISTRY = MetricsRegistry()
+
+async def start_metrics_server(host: str, port: int, collect=None):
+    """Serve GET /metrics over plain HTTP; collect() runs before each render to refresh gauges.
+
+    The OPC UA server process has no web framework, and a scrape is a single
+    short request, so this answers HTTP/1.0-style and closes the connection.
+    """
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5.0)
+            while (await asyncio.wait_for(reader.readline(), 5.0)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                if collect is not None:
+                    collect()
+                status, content_type, body = "200 OK", CONTENT_TYPE, REGISTRY.render().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)